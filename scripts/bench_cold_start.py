@@ -0,0 +1,107 @@
+# Measure the import time of each Lambda handler with `python -X importtime`
+# and fail when one goes over its budget or loads a module it must not load,
+# e.g. /health pulling in qdrant_client or openai.
+#
+# Run it with the server's dependencies installed, e.g. from server/:
+#   uv run python ../scripts/bench_cold_start.py
+import argparse
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+SERVER_SRC = Path(__file__).resolve().parents[1] / "server" / "src"
+
+
+@dataclass
+class HandlerBudget:
+    budget_ms: float
+    forbidden: list[str] = field(default_factory=list)
+
+
+HANDLERS = {
+    "health.handler": HandlerBudget(
+        budget_ms=300, forbidden=["qdrant_client", "openai", "boto3", "numpy"]
+    ),
+    "core.auth": HandlerBudget(
+        budget_ms=300, forbidden=["qdrant_client", "openai", "boto3", "numpy"]
+    ),
+    # Nothing may be fetched over the network at import time, which would
+    # show up as a much larger number here.
+    "messages.handler": HandlerBudget(budget_ms=4000, forbidden=["boto3"]),
+}
+
+
+def import_profile(module: str) -> tuple[float, set[str]]:
+    """
+    Cumulative import time of the module in ms, and every module it loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SERVER_SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total_us = None
+    loaded: set[str] = set()
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.strip()
+        loaded.add(name)
+        if name == module:
+            total_us = int(cumulative)
+
+    if total_us is None:
+        raise RuntimeError(f"{module} not found in the import time output")
+
+    return total_us / 1000, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiply every budget, e.g. for slower CI machines.",
+    )
+    args = parser.parse_args()
+
+    failures: list[str] = []
+    print(f"{'handler':<18} {'median (ms)':>12} {'budget (ms)':>12}")
+
+    for module, budget in HANDLERS.items():
+        # The first run compiles bytecode and fills the OS file cache
+        import_profile(module)
+        runs = [import_profile(module) for _ in range(args.runs)]
+
+        median_ms = statistics.median(ms for ms, _ in runs)
+        budget_ms = budget.budget_ms * args.scale
+        print(f"{module:<18} {median_ms:12.1f} {budget_ms:12.0f}")
+
+        if median_ms > budget_ms:
+            failures.append(f"{module} took {median_ms:.1f} ms (> {budget_ms:.0f})")
+
+        loaded = runs[0][1]
+        for name in budget.forbidden:
+            if name in loaded:
+                failures.append(f"{module} imports {name}")
+
+    if failures:
+        print("\nFailed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
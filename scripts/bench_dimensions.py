@@ -0,0 +1,143 @@
+# ruff: noqa: E402
+
+# Measure what shortened embeddings cost: recall@k of the server's local
+# retrieval at several vector sizes against the full-size baseline on
+# questions.json, with the size of the vector matrix and the query latency.
+#
+# A text-embedding-3 vector requested with `dimensions=d` is its first d
+# components, renormalized, so the points are taken from the exported local
+# index (init_qdrant.py --export-index, at full size) and truncated instead of
+# embedding the dataset once per size. Only the questions are embedded, once,
+# and kept in the embedding store.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Load environment variables instead of using secrets manager
+from dotenv import load_dotenv
+
+load_dotenv(".env.localstack")
+
+import argparse
+import json
+import time
+import numpy as np
+from openai import OpenAI
+from embedding_store import EmbeddingStore
+from init_qdrant import EMBED_MODEL, EMBEDDING_STORE_PATH
+from server.src.core.intent import extract_intent_local
+from server.src.core.local_index import LOCAL_INDEX_DIR, LocalIndex
+from server.src.core.qdrant import build_filter
+
+QUESTIONS_PATH = Path(__file__).resolve().parent / "questions.json"
+
+
+def truncate(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    shortened = np.array(vectors[:, :dimensions], dtype=np.float32)
+    shortened /= np.linalg.norm(shortened, axis=1, keepdims=True)
+    return shortened
+
+
+def embed_questions(questions: list[str], dimensions: int) -> np.ndarray:
+    store = EmbeddingStore(EMBEDDING_STORE_PATH, EMBED_MODEL, dimensions)
+    vectors, missing = store.get(questions)
+    if missing:
+        response = OpenAI().embeddings.create(
+            input=[questions[i] for i in missing],
+            model=EMBED_MODEL,
+            dimensions=dimensions,
+        )
+        embedded = np.array([item.embedding for item in response.data], np.float32)
+        vectors[missing] = embedded
+        store.put([questions[i] for i in missing], embedded)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=Path, default=QUESTIONS_PATH)
+    parser.add_argument(
+        "--dimensions", type=int, nargs="+", default=[256, 512, 768, 1536]
+    )
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Timed runs of every question"
+    )
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions: list[str] = json.load(f)
+
+    full = LocalIndex.load(LOCAL_INDEX_DIR)
+    baseline_dimensions = full.vectors.shape[1]
+    if max(args.dimensions) > baseline_dimensions:
+        parser.error(f"The local index only holds {baseline_dimensions}-d vectors")
+
+    query_vectors = embed_questions(questions, baseline_dimensions)
+    # The filters the server would apply, without calling the LLM
+    filters = [build_filter(extract_intent_local(q)[0]) for q in questions]
+
+    def search(index: LocalIndex, queries: np.ndarray, filtered: bool) -> list[set]:
+        return [
+            {
+                hit.id
+                for hit in index.query(
+                    query.tolist(), filters[i] if filtered else None, args.limit
+                )
+            }
+            for i, query in enumerate(queries)
+        ]
+
+    print(
+        f"Baseline: {len(full)} points at {baseline_dimensions} dimensions, "
+        f"{len(questions)} questions"
+    )
+    print(
+        f"{'dims':>6} {'recall@' + str(args.limit):>9} {'unfiltered':>11} "
+        f"{'vectors (MB)':>13} {'p50 (ms)':>9} {'p99 (ms)':>9}"
+    )
+
+    baseline_vectors = np.array(full.vectors, dtype=np.float32)
+    baseline = LocalIndex(ids=full.ids, vectors=baseline_vectors, columns=full.columns)
+    expected = {
+        filtered: search(baseline, query_vectors, filtered)
+        for filtered in (True, False)
+    }
+
+    for dimensions in sorted(args.dimensions):
+        index = LocalIndex(
+            ids=full.ids,
+            vectors=truncate(baseline_vectors, dimensions),
+            columns=full.columns,
+        )
+        queries = truncate(query_vectors, dimensions)
+
+        recalls = {}
+        for filtered in (True, False):
+            found = search(index, queries, filtered)
+            recalls[filtered] = np.mean(
+                [
+                    len(hits & wanted) / len(wanted)
+                    for hits, wanted in zip(found, expected[filtered])
+                    if wanted
+                ]
+            )
+
+        latencies: list[float] = []
+        for _ in range(args.repeat):
+            for i, query in enumerate(queries.tolist()):
+                start = time.perf_counter()
+                index.query(query, filters[i], args.limit)
+                latencies.append(time.perf_counter() - start)
+
+        print(
+            f"{dimensions:>6} {recalls[True]:9.3f} {recalls[False]:11.3f} "
+            f"{index.vectors.nbytes / 1024 / 1024:13.2f} "
+            f"{np.percentile(latencies, 50) * 1000:9.3f} "
+            f"{np.percentile(latencies, 99) * 1000:9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# ruff: noqa: E402
+
+# Compare the rule-based intent extractor against the LLM extractor on the
+# question corpus: how often they agree, and how long each takes.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Load environment variables instead of using secrets manager
+from dotenv import load_dotenv
+
+load_dotenv(".env.localstack")
+
+import json
+import time
+import numpy as np
+from server.src.core.intent import extract_intent_local
+from server.src.core.openai import LOCAL_INTENT_MIN_CONFIDENCE, extract_intent_llm
+
+QUESTIONS_PATH = Path(__file__).resolve().parent / "questions.json"
+LOCAL_REPEAT = 100
+
+FIELDS = [
+    "ward",
+    "station",
+    "usage",
+    "time_to_station_max",
+    "require_max_price",
+    "require_min_price",
+    "require_top_1_percent_price",
+    "require_bottom_1_percent_price",
+    "require_max_change_rate",
+    "require_min_change_rate",
+    "require_top_1_percent_change_rate",
+    "require_bottom_1_percent_change_rate",
+]
+
+
+def normalize_intent(intent: dict) -> dict:
+    # The LLM sometimes returns explicit false/null values for absent fields.
+    return {k: v for k, v in intent.items() if k in FIELDS and v not in (None, False)}
+
+
+def percentile_ms(samples: list[float], q: float) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def main():
+    with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+
+    local_times: list[float] = []
+    llm_times: list[float] = []
+    rows = []
+
+    for question in questions:
+        start = time.perf_counter()
+        for _ in range(LOCAL_REPEAT):
+            local_intent, confidence = extract_intent_local(question)
+        local_times.append((time.perf_counter() - start) / LOCAL_REPEAT)
+
+        start = time.perf_counter()
+        llm_intent = extract_intent_llm(question)
+        llm_times.append(time.perf_counter() - start)
+
+        rows.append(
+            {
+                "question": question,
+                "local": normalize_intent(local_intent),
+                "llm": normalize_intent(llm_intent),
+                "confidence": confidence,
+            }
+        )
+
+    confident = [r for r in rows if r["confidence"] >= LOCAL_INTENT_MIN_CONFIDENCE]
+
+    def agreement(subset: list[dict]) -> float:
+        if not subset:
+            return 0.0
+        return sum(r["local"] == r["llm"] for r in subset) / len(subset)
+
+    print(f"Questions: {len(rows)}")
+    print(
+        f"Handled locally (confidence >= {LOCAL_INTENT_MIN_CONFIDENCE}): "
+        f"{len(confident)} ({len(confident) / len(rows):.0%})"
+    )
+    print(f"Exact agreement (all): {agreement(rows):.0%}")
+    print(f"Exact agreement (handled locally): {agreement(confident):.0%}")
+
+    print("\nPer-field agreement (handled locally):")
+    for field in FIELDS:
+        relevant = [r for r in confident if field in r["local"] or field in r["llm"]]
+        if not relevant:
+            continue
+        agreed = sum(r["local"].get(field) == r["llm"].get(field) for r in relevant)
+        print(f"  {field}: {agreed}/{len(relevant)}")
+
+    print("\nLatency (ms):")
+    print(
+        f"  local p50={percentile_ms(local_times, 50)} "
+        f"p95={percentile_ms(local_times, 95)}"
+    )
+    print(
+        f"  llm   p50={percentile_ms(llm_times, 50)} p95={percentile_ms(llm_times, 95)}"
+    )
+
+    print("\nDisagreements (handled locally):")
+    for r in confident:
+        if r["local"] != r["llm"]:
+            print(f"  {r['question']}\n    local={r['local']}\n    llm={r['llm']}")
+
+
+if __name__ == "__main__":
+    main()
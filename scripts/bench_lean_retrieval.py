@@ -0,0 +1,189 @@
+# ruff: noqa: E402
+
+# Compare retrieval as it was (whole payload of every hit, one log line with
+# the payload per hit) with lean retrieval (only the payload fields the
+# contexts are rendered from, one sampled summary event): bytes per request
+# and the time the handler spends retrieving, rendering and logging. Query
+# vectors are perturbed copies of indexed vectors, so no OpenAI calls are
+# made; the local index is required for them either way
+# (init_qdrant.py --export-index).
+import sys
+from pathlib import Path
+
+SERVER_SRC = Path(__file__).resolve().parents[1] / "server" / "src"
+sys.path.insert(0, str(SERVER_SRC))
+
+# Load environment variables instead of using secrets manager
+from dotenv import load_dotenv
+
+load_dotenv(".env.localstack")
+
+import argparse
+import json
+import os
+import time
+import urllib.request
+import numpy as np
+
+
+class CountingStream:
+    """
+    Stands in for stdout in the logger, to count the bytes logged.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text: str) -> int:
+        self.bytes += len(text.encode("utf-8"))
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def response_bytes(url: str, collection: str, body: dict) -> int:
+    request = urllib.request.Request(
+        f"{url}/collections/{collection}/points/query",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request) as response:
+        return len(response.read())
+
+
+def query_body(
+    query: list[float], query_filter, payload_fields: list[str] | None
+) -> dict:
+    # The request retrieve_contexts() sends, over REST
+    return {
+        "query": query,
+        "filter": query_filter.model_dump(mode="json", exclude_none=True)
+        if query_filter is not None
+        else None,
+        "limit": 5,
+        "with_payload": payload_fields if payload_fields is not None else True,
+        "with_vector": False,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument(
+        "--backend",
+        choices=["local", "qdrant"],
+        default="local",
+        help="qdrant: the local Qdrant container, which also reports the bytes "
+        "of every REST response",
+    )
+    parser.add_argument(
+        "--grpc", action="store_true", help="Query Qdrant over gRPC (timings only)"
+    )
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--url", default="http://localhost:6333")
+    args = parser.parse_args()
+
+    # The server reads its settings at import time
+    os.environ["RETRIEVAL_BACKEND"] = args.backend
+    os.environ["QDRANT_PREFER_GRPC"] = "true" if args.grpc else "false"
+    os.environ["HIT_LOG_SAMPLE_RATE"] = str(args.sample_rate)
+    os.environ["TELEMETRY"] = "off"
+
+    from core.local_index import LOCAL_INDEX_DIR, LocalIndex
+    from core.logger import logger
+    from core.qdrant import (
+        COLLECTION_NAME,
+        SEARCH_PAYLOAD,
+        build_filter,
+        build_geo_filter,
+        retrieve_contexts,
+    )
+    from messages.service import log_hits
+
+    stream = CountingStream()
+    logger.registered_handler.setStream(stream)
+
+    def log_hits_before(result) -> None:
+        for hit in result.hits:
+            logger.info(
+                {
+                    "event": "retrieved_relevant_information",
+                    "score": hit.score,
+                    "payload": hit.payload,
+                }
+            )
+
+    index = LocalIndex.load(LOCAL_INDEX_DIR)
+    sample = index.payload(0)
+    location = sample["location"]
+    filters = [
+        build_filter({}),
+        build_filter({"ward": sample["ward"]}),
+        build_filter({"usage": sample["usage"], "time_to_station_max": 10}),
+        build_filter({"require_top_1_percent_price": True}),
+        build_geo_filter(location["lat"], location["lon"], 500),
+    ]
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(index), size=args.queries)
+    queries = index.vectors[rows] + rng.normal(
+        0, 0.02, (args.queries, index.vectors.shape[1])
+    )
+
+    modes = {
+        "before": (None, log_hits_before),
+        "lean": (SEARCH_PAYLOAD, log_hits),
+    }
+
+    # Connect, load the index and warm up both paths
+    for payload_fields, log in modes.values():
+        log(retrieve_contexts(queries[0].tolist(), None, 5, payload_fields))
+
+    print(
+        f"{args.backend}{' (gRPC)' if args.grpc else ''}, {args.queries} queries, "
+        f"hit log sample rate {args.sample_rate}"
+    )
+    print(
+        f"{'mode':>7} {'payload B':>10} {'response B':>11} {'log B':>8} "
+        f"{'p50 (ms)':>9} {'p99 (ms)':>9}"
+    )
+
+    for mode, (payload_fields, log) in modes.items():
+        timings: list[float] = []
+        payload_bytes: list[int] = []
+        response_sizes: list[int] = []
+        stream.bytes = 0
+
+        for i, query in enumerate(queries.tolist()):
+            query_filter = filters[i % len(filters)]
+
+            start = time.perf_counter()
+            result = retrieve_contexts(query, query_filter, 5, payload_fields)
+            log(result)
+            timings.append(time.perf_counter() - start)
+
+            payload_bytes.append(
+                len(json.dumps([hit.payload for hit in result.hits]).encode("utf-8"))
+            )
+            if args.backend == "qdrant":
+                response_sizes.append(
+                    response_bytes(
+                        args.url,
+                        COLLECTION_NAME,
+                        query_body(query, query_filter, payload_fields),
+                    )
+                )
+
+        transferred = f"{np.mean(response_sizes):.0f}" if response_sizes else "n/a"
+
+        print(
+            f"{mode:>7} {np.mean(payload_bytes):10.0f} {transferred:>11} "
+            f"{stream.bytes / args.queries:8.0f} "
+            f"{np.percentile(timings, 50) * 1000:9.3f} "
+            f"{np.percentile(timings, 99) * 1000:9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# ruff: noqa: E402
+
+# Replay the question corpus through the server's post_message_service at
+# several concurrency levels, against local stand-ins: the fake OpenAI API
+# (optionally replaying a recorded cassette) and either the in-process index
+# or the local Qdrant container. Reports throughput and per-stage
+# p50/p95/p99 from the server's traces, and saves the results as JSON so that
+# runs on different commits can be compared with --baseline.
+import sys
+from pathlib import Path
+
+SERVER_SRC = Path(__file__).resolve().parents[1] / "server" / "src"
+sys.path.insert(0, str(SERVER_SRC))
+
+# Load environment variables instead of using secrets manager
+from dotenv import load_dotenv
+
+load_dotenv(".env.localstack")
+
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from fake_openai import DEFAULT_ANSWER_TOKENS, Cassette, start_fake_server
+
+QUESTIONS_PATH = Path(__file__).resolve().parent / "questions.json"
+RESULTS_DIR = Path(__file__).resolve().parent / "data" / "bench"
+PERCENTILES = [50, 95, 99]
+
+
+def percentiles_ms(samples: list[float]) -> dict[str, float]:
+    return {f"p{q}": round(float(np.percentile(samples, q)), 1) for q in PERCENTILES}
+
+
+def git_commit() -> str:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    )
+    return result.stdout.strip() or "unknown"
+
+
+def configure_server(args: argparse.Namespace, base_url: str) -> None:
+    """
+    The server reads its settings at import time, so this runs before it is
+    imported.
+    """
+    os.environ["OPENAI_BASE_URL"] = base_url
+    # Only used by the fake API, unless recording
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ["RETRIEVAL_BACKEND"] = args.backend
+    os.environ["TELEMETRY"] = "on"
+    os.environ["POWERTOOLS_METRICS_DISABLED"] = "true"
+
+    # Every request runs the whole pipeline unless --caches is set
+    if not args.caches:
+        os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+        os.environ["ANSWER_CACHE_BACKEND"] = "none"
+        os.environ["SINGLEFLIGHT_BACKEND"] = "none"
+
+
+def run_level(
+    post_message_service, questions: list[str], concurrency: int, traces: list
+) -> dict:
+    from aws_lambda_powertools.utilities.parser.models import (
+        APIGatewayProxyEventModel,
+    )
+
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def request(question: str) -> None:
+        nonlocal errors
+        # post_message_service only reads the body
+        event = APIGatewayProxyEventModel.model_construct(
+            body=json.dumps({"message": question})
+        )
+        start = time.perf_counter()
+        try:
+            post_message_service(event)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    traces.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(request, questions))
+    wall_seconds = time.perf_counter() - start
+
+    stages: dict[str, list[float]] = {}
+    tokens: dict[str, int] = {}
+    for trace in traces:
+        for span in trace.spans:
+            if span.duration_ms is not None:
+                stages.setdefault(span.name, []).append(span.duration_ms)
+            for key in ("prompt_tokens", "completion_tokens"):
+                tokens[key] = tokens.get(key, 0) + span.attributes.get(key, 0)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(questions),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall_seconds, 2),
+        "latency_ms": percentiles_ms(latencies) if latencies else None,
+        "stages_ms": {
+            name: {"count": len(samples), **percentiles_ms(samples)}
+            for name, samples in stages.items()
+        },
+        "tokens": tokens,
+    }
+
+
+def print_level(level: dict) -> None:
+    print(
+        f"\nconcurrency={level['concurrency']} requests={level['requests']} "
+        f"errors={level['errors']} throughput={level['throughput_rps']} req/s"
+    )
+    print(f"  {'stage':<20} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = {"total": {"count": level["requests"], **(level["latency_ms"] or {})}}
+    rows.update(level["stages_ms"])
+    for name, row in rows.items():
+        print(
+            f"  {name:<20} {row['count']:>6} "
+            + " ".join(f"{row.get(f'p{q}', float('nan')):>9.1f}" for q in PERCENTILES)
+        )
+
+
+def print_comparison(results: dict, baseline: dict) -> None:
+    print(f"\nCompared with {baseline['commit']} (negative is faster):")
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+
+    for level in results["levels"]:
+        old = baseline_levels.get(level["concurrency"])
+        if old is None or not old["latency_ms"] or not level["latency_ms"]:
+            continue
+
+        def change(new: float, previous: float) -> str:
+            return f"{(new - previous) / previous:+.1%}" if previous else "n/a"
+
+        new_ms, old_ms = level["latency_ms"], old["latency_ms"]
+        print(
+            f"  concurrency={level['concurrency']}: "
+            f"throughput {change(level['throughput_rps'], old['throughput_rps'])}, "
+            + ", ".join(
+                f"p{q} {change(new_ms[f'p{q}'], old_ms[f'p{q}'])}" for q in PERCENTILES
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=Path, default=QUESTIONS_PATH)
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=200,
+        help="Requests per concurrency level; the corpus is repeated as needed",
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument(
+        "--backend",
+        choices=["local", "qdrant"],
+        default="local",
+        help="local: the index exported by init_qdrant.py --export-index; "
+        "qdrant: the local Qdrant container",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Mean embedding latency (s)"
+    )
+    parser.add_argument(
+        "--chat-latency", type=float, default=0.8, help="Mean chat latency (s)"
+    )
+    parser.add_argument("--answer-tokens", type=int, default=DEFAULT_ANSWER_TOKENS)
+    parser.add_argument(
+        "--cassette",
+        type=Path,
+        default=None,
+        help="Replay OpenAI responses recorded with fake_openai.py --record",
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Call the real OpenAI API and save its responses to --cassette",
+    )
+    parser.add_argument(
+        "--recorded-latency",
+        action="store_true",
+        help="Replay cassette entries with the latency they were recorded with",
+    )
+    parser.add_argument(
+        "--caches",
+        action="store_true",
+        help="Keep the embedding cache, answer cache and request coalescing on",
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument(
+        "--baseline", type=Path, default=None, help="Results of an earlier run"
+    )
+    args = parser.parse_args()
+
+    if args.record and args.cassette is None:
+        parser.error("--record requires --cassette")
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        corpus: list[str] = json.load(f)
+    questions = [corpus[i % len(corpus)] for i in range(args.requests)]
+
+    cassette = Cassette(args.cassette) if args.cassette else None
+    server, base_url = start_fake_server(
+        latency=args.latency,
+        chat_latency=args.chat_latency,
+        answer_tokens=args.answer_tokens,
+        cassette=cassette,
+        record=args.record,
+        recorded_latency=args.recorded_latency,
+    )
+    configure_server(args, base_url)
+
+    from core.logger import logger
+    from core.telemetry import add_listener
+    from messages.service import post_message_service
+
+    logger.setLevel("WARNING")
+
+    traces: list = []
+    add_listener(traces.append)
+
+    # Load the index, create the clients and open connections
+    run_level(post_message_service, corpus[:1], 1, traces)
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            "backend": args.backend,
+            "latency": args.latency,
+            "chat_latency": args.chat_latency,
+            "answer_tokens": args.answer_tokens,
+            "cassette": str(args.cassette) if args.cassette else None,
+            "recorded_latency": args.recorded_latency,
+            "caches": args.caches,
+            "questions": len(corpus),
+        },
+        "levels": [],
+    }
+
+    for concurrency in args.concurrency:
+        level = run_level(post_message_service, questions, concurrency, traces)
+        results["levels"].append(level)
+        print_level(level)
+
+    if cassette is not None:
+        results["cassette"] = {"hits": cassette.hits, "misses": cassette.misses}
+        print(f"\nCassette: {cassette.hits} hits, {cassette.misses} misses")
+
+    server.shutdown()
+
+    output = args.output or RESULTS_DIR / f"pipeline-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
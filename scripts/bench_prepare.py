@@ -0,0 +1,80 @@
+# Micro-benchmark for the payload preparation stage of init_qdrant.py on
+# synthetic features, comparing the old per-feature percentile scan with the
+# sort/searchsorted implementation.
+import argparse
+import time
+import numpy as np
+from init_qdrant import percentile_rank, prepare_payloads, scan_features
+
+SIZES = [3_000, 30_000, 300_000]
+
+
+def synthetic_features(n: int, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    prices = rng.lognormal(mean=13, sigma=1, size=n).astype(int)
+    change_rates = rng.normal(loc=3, scale=3, size=n).round(1)
+    distances = rng.integers(0, 3000, size=n)
+    lons = rng.uniform(138.9, 139.9, size=n)
+    lats = rng.uniform(35.5, 35.9, size=n)
+
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lons[i], lats[i]]},
+            "properties": {
+                "L01_008": int(prices[i]),
+                "L01_009": float(change_rates[i]),
+                "L01_024": f"区{i % 62}",
+                "L01_025": f"東京都　区{i % 62}{i}丁目{i}番",
+                "L01_028": "住宅",
+                "L01_029": "住宅",
+                "L01_047": "一般住宅が建ち並ぶ住宅地域",
+                "L01_048": f"駅{i % 700}",
+                "L01_050": int(distances[i]),
+            },
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_percentiles(values: np.ndarray) -> list[float]:
+    return [float((values < v).sum() / len(values) * 100) for v in values]
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--max-legacy",
+        type=int,
+        default=30_000,
+        help="Largest size to run the quadratic percentile scan on.",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'features':>10} {'legacy pct (s)':>15} {'sorted pct (s)':>15} {'prepare (s)':>12}"
+    )
+
+    for n in SIZES:
+        features = synthetic_features(n)
+        prices = np.array([f["properties"]["L01_008"] for f in features])
+
+        legacy = (
+            f"{timed(legacy_percentiles, prices):15.3f}"
+            if n <= args.max_legacy
+            else f"{'skipped':>15}"
+        )
+        vectorized = timed(lambda v: percentile_rank(np.sort(v), v), prices)
+        prepare = timed(lambda f: prepare_payloads(f, scan_features(f)), features)
+
+        print(f"{n:>10} {legacy} {vectorized:15.4f} {prepare:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# Compare the collection profiles of init_qdrant.py on a local Qdrant container
+# (docker compose up qdrant): filtered query latency, recall@k against exact
+# search, and the resident memory of the Qdrant process.
+#
+# Quantization, on-disk storage and HNSW only exist on a real server, so this
+# does not run against the local (path=...) client.
+import argparse
+import time
+import urllib.request
+import numpy as np
+from qdrant_client import models, QdrantClient
+from bench_prepare import synthetic_features
+from init_qdrant import (
+    COLLECTION_PROFILES,
+    EMBED_DIMENSIONS,
+    create_collection,
+    create_payload_indexes,
+    prepare_payloads,
+    scan_features,
+)
+
+COLLECTION_PREFIX = "bench_profiles"
+UPLOAD_BATCH_SIZE = 1024
+
+
+def synthetic_vectors(n: int, seed: int, clusters: int = 64) -> np.ndarray:
+    # Clustered rather than uniform, so that nearest neighbours are meaningful
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((clusters, EMBED_DIMENSIONS))
+    rng = np.random.default_rng(seed)
+    vectors = centers[rng.integers(0, clusters, size=n)]
+    vectors = vectors + rng.standard_normal((n, EMBED_DIMENSIONS)) * 0.7
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def query_filters(payloads: list[dict]) -> list[models.Filter | None]:
+    # The shapes build_filter() and build_geo_filter() produce
+    sample = payloads[0]
+    location = sample["location"]
+    return [
+        None,
+        models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="ward", match=models.MatchValue(value=sample["ward"])
+                )
+            ]
+        ),
+        models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="usage", match=models.MatchValue(value=sample["usage"])
+                ),
+                models.FieldCondition(
+                    key="time_to_station", range=models.Range(lte=10)
+                ),
+            ]
+        ),
+        models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="is_top_1_percent_price", match=models.MatchValue(value=True)
+                )
+            ]
+        ),
+        models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="location",
+                    geo_radius=models.GeoRadius(
+                        center=models.GeoPoint(**location), radius=5000
+                    ),
+                )
+            ]
+        ),
+    ]
+
+
+def resident_memory_mb(url: str) -> float | None:
+    with urllib.request.urlopen(f"{url}/metrics") as response:
+        for line in response.read().decode().splitlines():
+            if line.startswith("memory_resident_bytes"):
+                return float(line.split()[-1]) / 1024 / 1024
+    return None
+
+
+def wait_until_indexed(client: QdrantClient, collection_name: str) -> None:
+    while (
+        client.get_collection(collection_name=collection_name).status
+        != models.CollectionStatus.GREEN
+    ):
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6333)
+    parser.add_argument("--size", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--oversampling", type=float, default=2.0)
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        choices=list(COLLECTION_PROFILES),
+        default=list(COLLECTION_PROFILES),
+    )
+    args = parser.parse_args()
+
+    client = QdrantClient(host=args.host, port=args.port)
+    url = f"http://{args.host}:{args.port}"
+
+    features = synthetic_features(args.size)
+    payloads = prepare_payloads(features, scan_features(features))
+    vectors = synthetic_vectors(args.size, seed=1)
+    queries = synthetic_vectors(args.queries, seed=2)
+    filters = query_filters(payloads)
+
+    search_params = models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=True, oversampling=args.oversampling
+        )
+    )
+    exact_params = models.SearchParams(exact=True)
+
+    print(
+        f"{'profile':>10} {'load (s)':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+        f"{'recall@' + str(args.limit):>9} {'mem (MB)':>9}"
+    )
+
+    for name in args.profiles:
+        profile = COLLECTION_PROFILES[name]
+        collection_name = f"{COLLECTION_PREFIX}_{name}"
+        if client.collection_exists(collection_name=collection_name):
+            client.delete_collection(collection_name=collection_name)
+
+        memory_before = resident_memory_mb(url)
+        start = time.perf_counter()
+
+        create_collection(client, profile, collection_name)
+        if profile.payload_indexes:
+            create_payload_indexes(client, collection_name)
+        client.upload_points(
+            collection_name=collection_name,
+            points=[
+                models.PointStruct(id=i, vector=vector.tolist(), payload=payload)
+                for i, (vector, payload) in enumerate(zip(vectors, payloads))
+            ],
+            batch_size=UPLOAD_BATCH_SIZE,
+            wait=True,
+        )
+        wait_until_indexed(client, collection_name)
+
+        load_time = time.perf_counter() - start
+        memory_after = resident_memory_mb(url)
+
+        latencies: list[float] = []
+        recalls: list[float] = []
+
+        for i, query in enumerate(queries):
+            query_filter = filters[i % len(filters)]
+
+            start = time.perf_counter()
+            hits = client.query_points(
+                collection_name=collection_name,
+                query=query.tolist(),
+                query_filter=query_filter,
+                search_params=search_params,
+                limit=args.limit,
+            ).points
+            latencies.append(time.perf_counter() - start)
+
+            expected = client.query_points(
+                collection_name=collection_name,
+                query=query.tolist(),
+                query_filter=query_filter,
+                search_params=exact_params,
+                limit=args.limit,
+            ).points
+            if expected:
+                found = {hit.id for hit in hits}
+                recalls.append(sum(hit.id in found for hit in expected) / len(expected))
+
+        memory = (
+            f"{memory_after - memory_before:9.1f}"
+            if memory_before is not None and memory_after is not None
+            else f"{'n/a':>9}"
+        )
+        print(
+            f"{name:>10} {load_time:9.1f} "
+            f"{np.percentile(latencies, 50) * 1000:9.2f} "
+            f"{np.percentile(latencies, 99) * 1000:9.2f} "
+            f"{np.mean(recalls):9.3f} {memory}"
+        )
+
+        client.delete_collection(collection_name=collection_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# ruff: noqa: E402
+
+# Compare query latency of the local retrieval backend (the index exported by
+# init_qdrant.py --export-index) with the Qdrant collection, on the filter
+# shapes the server produces. Query vectors are perturbed copies of indexed
+# vectors, so no OpenAI calls are made.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Load environment variables instead of using secrets manager
+from dotenv import load_dotenv
+
+load_dotenv(".env.localstack")
+
+import argparse
+import time
+import numpy as np
+from init_qdrant import COLLECTION_NAME, create_clients
+from server.src.core.local_index import LOCAL_INDEX_DIR, LocalIndex
+from server.src.core.qdrant import SEARCH_PARAMS, build_filter, build_geo_filter
+
+
+def percentile_ms(samples: list[float], q: float) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", choices=["localstack", "prod"], default="localstack")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    _, client = create_clients(args.env)
+
+    start = time.perf_counter()
+    index = LocalIndex.load(LOCAL_INDEX_DIR)
+    print(
+        f"Loaded {len(index)} points in {(time.perf_counter() - start) * 1000:.1f} ms"
+    )
+
+    rng = np.random.default_rng(0)
+    sample = index.payload(0)
+    location = sample["location"]
+    filters = [
+        build_filter({}),
+        build_filter({"ward": sample["ward"]}),
+        build_filter({"usage": sample["usage"], "time_to_station_max": 10}),
+        build_filter({"require_top_1_percent_price": True}),
+        build_geo_filter(location["lat"], location["lon"], 500),
+    ]
+
+    rows = rng.integers(0, len(index), size=args.queries)
+    queries = index.vectors[rows] + rng.normal(
+        0, 0.02, (args.queries, index.vectors.shape[1])
+    )
+
+    timings: dict[str, list[float]] = {"local": [], "qdrant": []}
+    agreed = 0
+
+    for i, query in enumerate(queries.tolist()):
+        query_filter = filters[i % len(filters)]
+
+        start = time.perf_counter()
+        local_hits = index.query(query, query_filter, args.limit)
+        timings["local"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        remote_hits = client.query_points(
+            collection_name=COLLECTION_NAME,
+            query=query,
+            query_filter=query_filter,
+            search_params=SEARCH_PARAMS,
+            limit=args.limit,
+        ).points
+        timings["qdrant"].append(time.perf_counter() - start)
+
+        agreed += [hit.id for hit in local_hits] == [hit.id for hit in remote_hits]
+
+    print(f"Same top-{args.limit} ids: {agreed}/{args.queries}")
+    print("Latency (ms):")
+    for backend, samples in timings.items():
+        print(
+            f"  {backend:<6} p50={percentile_ms(samples, 50)} "
+            f"p99={percentile_ms(samples, 99)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import numpy as np
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+RETRYABLE_ERRORS = (
+    RateLimitError,
+    APITimeoutError,
+    APIConnectionError,
+    InternalServerError,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # cl100k encodes most Japanese characters as one token or more, so the
+    # character count is a reasonable upper-side estimate without a tokenizer.
+    return len(text) + 1
+
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute. acquire() blocks until
+    both budgets allow the request.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.capacities = {
+            "requests": float(requests_per_minute),
+            "tokens": float(tokens_per_minute),
+        }
+        self.available = dict(self.capacities)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        needed = {
+            "requests": 1.0,
+            "tokens": float(min(tokens, self.capacities["tokens"])),
+        }
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self.updated_at
+                self.updated_at = now
+
+                for key, capacity in self.capacities.items():
+                    self.available[key] = min(
+                        capacity, self.available[key] + elapsed * capacity / 60
+                    )
+
+                wait = max(
+                    (needed[key] - self.available[key]) * 60 / self.capacities[key]
+                    for key in self.capacities
+                )
+                if wait <= 0:
+                    for key in self.capacities:
+                        self.available[key] -= needed[key]
+                    return
+
+            time.sleep(wait)
+
+
+class EmbeddingScheduler:
+    """
+    Embeds texts in batches with bounded concurrency, staying within the
+    request and token budgets and retrying transient failures with
+    exponential backoff and full jitter. Results keep the input order.
+    """
+
+    def __init__(
+        self,
+        openai: OpenAI,
+        model: str,
+        dimensions: int,
+        batch_size: int,
+        max_batch_tokens: int = 250_000,
+        max_concurrency: int = 4,
+        requests_per_minute: int = 3_000,
+        tokens_per_minute: int = 1_000_000,
+        max_retries: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        # Retries are handled here so that they also go through the limiter
+        self.openai = openai.with_options(max_retries=0)
+        self.model = model
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.retries = 0
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        futures = [
+            self.executor.submit(self._embed_batch, batch)
+            for batch in self._split(texts)
+        ]
+        return np.concatenate([future.result() for future in futures])
+
+    def _split(self, texts: list[str]) -> list[list[str]]:
+        batches: list[list[str]] = []
+        batch: list[str] = []
+        batch_tokens = 0
+
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if batch and (
+                len(batch) >= self.batch_size
+                or batch_tokens + tokens > self.max_batch_tokens
+            ):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+
+        if batch:
+            batches.append(batch)
+
+        return batches
+
+    def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        tokens = sum(estimate_tokens(text) for text in texts)
+        attempt = 0
+
+        while True:
+            self.limiter.acquire(tokens)
+            try:
+                response = self.openai.embeddings.create(
+                    input=texts, model=self.model, dimensions=self.dimensions
+                )
+                # The API does not promise the order of data
+                data = sorted(response.data, key=lambda item: item.index)
+                return np.array([item.embedding for item in data], dtype=np.float32)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+
+    def close(self) -> None:
+        self.executor.shutdown()
@@ -0,0 +1,116 @@
+import hashlib
+from pathlib import Path
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Content-addressed, append-only store of embeddings on disk.
+
+    Each (model, dimensions) pair has its own directory holding
+    - vectors.f32: a raw float32 matrix with one row per entry, read through
+      a memory map
+    - keys.bin: the 32-byte sha256 key of every row, in row order
+
+    A key is the hash of (model, dimensions, text), so a text is embedded at
+    most once per model and size, no matter how often it is ingested.
+    """
+
+    KEY_SIZE = 32
+
+    def __init__(self, root: str | Path, model: str, dimensions: int):
+        self.model = model
+        self.dimensions = dimensions
+        self.dir = Path(root) / f"{model}-{dimensions}"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.keys_path = self.dir / "keys.bin"
+        self.vectors_path = self.dir / "vectors.f32"
+        self.keys_path.touch()
+        self.vectors_path.touch()
+
+        keys = self.keys_path.read_bytes()
+        row_size = self.dimensions * 4
+        # Vectors are written before keys, so a crash mid-append can leave
+        # trailing vectors without a key, or a partially written row or key.
+        # Both files are cut back to the complete rows, so that the next put()
+        # appends right after them and new keys point at their own vectors.
+        rows = min(
+            len(keys) // self.KEY_SIZE,
+            self.vectors_path.stat().st_size // row_size,
+        )
+        with open(self.keys_path, "r+b") as f:
+            f.truncate(rows * self.KEY_SIZE)
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(rows * row_size)
+        self.index = {
+            keys[i * self.KEY_SIZE : (i + 1) * self.KEY_SIZE]: i for i in range(rows)
+        }
+        self._vectors = None
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> bytes:
+        content = f"{self.model}\n{self.dimensions}\n{text}"
+        return hashlib.sha256(content.encode("utf-8")).digest()
+
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) != len(self.index):
+            self._vectors = (
+                np.memmap(
+                    self.vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(len(self.index), self.dimensions),
+                )
+                if self.index
+                else np.empty((0, self.dimensions), dtype=np.float32)
+            )
+        return self._vectors
+
+    def get(self, texts: list[str]) -> tuple[np.ndarray, list[int]]:
+        """
+        Return a matrix with the stored vector of every text, and the
+        positions of the texts that are not in the store (left as zeros).
+        """
+        result = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        rows = [self.index.get(self.key(text)) for text in texts]
+
+        found = [i for i, row in enumerate(rows) if row is not None]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if found:
+            result[found] = self.vectors()[[rows[i] for i in found]]
+
+        self.hits += len(found)
+        self.misses += len(missing)
+        return result, missing
+
+    def count_missing(self, texts: list[str]) -> int:
+        return sum(self.key(text) not in self.index for text in texts)
+
+    def put(self, texts: list[str], vectors: np.ndarray) -> None:
+        # Insertion-ordered, so that the keys are written in row order
+        new_keys: dict[bytes, None] = {}
+        new_rows: list[int] = []
+
+        for i, text in enumerate(texts):
+            key = self.key(text)
+            if key in self.index or key in new_keys:
+                continue
+            new_keys[key] = None
+            new_rows.append(i)
+
+        if not new_keys:
+            return
+
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors[new_rows], dtype=np.float32).tobytes())
+        with open(self.keys_path, "ab") as f:
+            f.write(b"".join(new_keys))
+
+        for key in new_keys:
+            self.index[key] = len(self.index)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
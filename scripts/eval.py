@@ -12,14 +12,24 @@ from dotenv import load_dotenv
 
 load_dotenv(".env.localstack")
 
+import argparse
+import json
 from ragas import evaluate as ragas_evaluate
 from ragas.metrics import _faithfulness, _answer_relevancy
 from ragas import EvaluationDataset, SingleTurnSample
 from ragas.llms import LangchainLLMWrapper
 from ragas.embeddings import LangchainEmbeddingsWrapper
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from server.src.core.openai import embed, extract_intent, generate_with_llm
+from qdrant_client.http.models import ScoredPoint
+from server.src.core.context import estimate_tokens, render_contexts
+from server.src.core.openai import (
+    build_answer_prompt,
+    embed,
+    extract_intent,
+    generate_with_llm,
+)
 from server.src.core.qdrant import build_filter, retrieve_contexts
+from server.src.core.telemetry import start_trace
 from typing import TypedDict
 
 # Configuration
@@ -32,54 +42,118 @@ TEST_QUESTIONS = [
     "Which areas in Tokyo have the highest land prices?",
     "Where are good residential areas near Shibuya?",
 ]
+QUESTIONS_PATH = Path(__file__).resolve().parent / "questions.json"
+
+# The same hits are rendered in every format, so that only the contexts differ
+CONTEXT_FORMATS = ["text", "table"]
 
 
 class PipelineResult(TypedDict):
     question: str
     contexts: list[str]
     response: str
+    prompt_tokens: int
 
 
-def run_pipeline(question: str) -> PipelineResult:
+def retrieve(question: str) -> list[ScoredPoint]:
     intent = extract_intent(question)
     query_filter = build_filter(intent)
     vector = embed(question)
-    result = retrieve_contexts(vector, query_filter)
-    response = generate_with_llm(question, result.contexts)
+    # Every field, so that the hits can be rendered in every format
+    return retrieve_contexts(vector, query_filter, payload_fields=None).hits
+
+
+def run_pipeline(
+    question: str, hits: list[ScoredPoint], context_format: str
+) -> PipelineResult:
+    contexts = render_contexts(hits, context_format)
+
+    # generate_with_llm records the token usage on the current span
+    with start_trace("eval").span("generate_with_llm") as span:
+        response = generate_with_llm(question, contexts)
+    prompt_tokens = span.attributes.get("prompt_tokens") or estimate_tokens(
+        build_answer_prompt(question, contexts)
+    )
 
     return {
         "question": question,
-        "contexts": result.contexts,
+        "contexts": contexts,
         "response": response,
+        "prompt_tokens": prompt_tokens,
     }
 
 
-def evaluate():
-    samples = []
-
-    for question in TEST_QUESTIONS:
-        result = run_pipeline(question)
-        sample = SingleTurnSample(
-            user_input=result["question"],
-            response=result["response"],
-            retrieved_contexts=result["contexts"],
+def evaluate(questions: list[str]) -> dict[str, dict[str, float]]:
+    results: dict[str, list[PipelineResult]] = {fmt: [] for fmt in CONTEXT_FORMATS}
+
+    for question in questions:
+        hits = retrieve(question)
+        for context_format in CONTEXT_FORMATS:
+            results[context_format].append(run_pipeline(question, hits, context_format))
+
+    scores: dict[str, dict[str, float]] = {}
+
+    for context_format, pipeline_results in results.items():
+        samples = [
+            SingleTurnSample(
+                user_input=result["question"],
+                response=result["response"],
+                retrieved_contexts=result["contexts"],
+            )
+            for result in pipeline_results
+        ]
+
+        dataset = EvaluationDataset(samples=samples)
+        evaluation = ragas_evaluate(
+            dataset=dataset,
+            metrics=[_faithfulness, _answer_relevancy],
+            llm=llm,
+            embeddings=embeddings,
         )
-        samples.append(sample)
-
-    dataset = EvaluationDataset(samples=samples)
-    results = ragas_evaluate(
-        dataset=dataset,
-        metrics=[_faithfulness, _answer_relevancy],
-        llm=llm,
-        embeddings=embeddings,
-    )
+        df = evaluation.to_pandas()
 
-    return results
+        scores[context_format] = {
+            "faithfulness": float(df["faithfulness"].mean()),
+            "answer_relevancy": float(df["answer_relevancy"].mean()),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in pipeline_results)
+            / len(pipeline_results),
+        }
+
+    return scores
 
 
 def main():
-    results = evaluate()
-    print(results)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help=f"Evaluate every question in {QUESTIONS_PATH.name}",
+    )
+    args = parser.parse_args()
+
+    questions = TEST_QUESTIONS
+    if args.all:
+        with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
+            questions = json.load(f)
+
+    scores = evaluate(questions)
+
+    print(f"{'format':<8} {'faithfulness':>13} {'relevancy':>10} {'prompt tokens':>14}")
+    for context_format, score in scores.items():
+        print(
+            f"{context_format:<8} {score['faithfulness']:>13.3f} "
+            f"{score['answer_relevancy']:>10.3f} {score['prompt_tokens']:>14.0f}"
+        )
+
+    text, table = scores["text"], scores["table"]
+    token_change = (table["prompt_tokens"] - text["prompt_tokens"]) / text[
+        "prompt_tokens"
+    ]
+    faithfulness_change = table["faithfulness"] - text["faithfulness"]
+    print(
+        f"\ntable vs text: prompt tokens {token_change:+.1%}, "
+        f"faithfulness {faithfulness_change:+.3f}"
+    )
 
 
 if __name__ == "__main__":
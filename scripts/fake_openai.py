@@ -0,0 +1,375 @@
+# Fake OpenAI API for offline runs of the ingestion scripts and benchmarks.
+#
+#   python fake_openai.py --port 8089 --latency 0.2 --error-rate 0.1
+#   OPENAI_BASE_URL=http://localhost:8089/v1 python init_qdrant.py
+#
+# Embeddings are deterministic unit vectors derived from a hash of the text,
+# so identical texts always get identical vectors. Chat completions return
+# `{}` for JSON requests (intent extraction) and a fixed-length answer
+# otherwise, streamed or not.
+#
+# With --cassette, responses are replayed from a file recorded earlier with
+# --record, which forwards every request to the real API:
+#
+#   python fake_openai.py --cassette data/cassette.json --record
+#
+# Requests that are not in the cassette get a fake response.
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+DEFAULT_DIMENSIONS = 1536
+DEFAULT_ANSWER_TOKENS = 200
+OPENAI_URL = "https://api.openai.com/v1"
+
+
+def fake_embedding(text: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+def fake_answer(tokens: int) -> list[str]:
+    words = "The land price at this point is close to the average of the ward".split()
+    return [f" {words[i % len(words)]}" for i in range(tokens)]
+
+
+class Cassette:
+    """
+    Recorded responses, keyed by a hash of the request path and body. Each
+    entry keeps the raw response body, so streamed responses are replayed as
+    they were recorded.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(path: str, body: dict) -> str:
+        content = json.dumps([path, body], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self.entries[key] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency: float = 0.0
+    chat_latency: Optional[float] = None
+    error_rate: float = 0.0
+    answer_tokens: int = DEFAULT_ANSWER_TOKENS
+    cassette: Optional[Cassette] = None
+    record: bool = False
+    recorded_latency: bool = False
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        is_chat = self.path.rstrip("/").endswith("/chat/completions")
+
+        if self.cassette is not None:
+            key = self.cassette.key(self.path, body)
+            if self.record:
+                self.forward(key, body)
+                return
+
+            entry = self.cassette.get(key)
+            if entry is not None:
+                if self.recorded_latency:
+                    time.sleep(entry["elapsed_seconds"])
+                else:
+                    self.sleep(is_chat)
+                self.send_raw(entry["status"], entry["content_type"], entry["body"])
+                return
+
+        self.sleep(is_chat)
+
+        if random.random() < self.error_rate:
+            self.send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                {"retry-after": "0.1"},
+            )
+            return
+
+        if self.path.rstrip("/").endswith("/embeddings"):
+            self.send_json(200, self.embeddings(body))
+        elif is_chat and body.get("stream"):
+            self.send_stream(self.chat_completion_chunks(body))
+        elif is_chat:
+            self.send_json(200, self.chat_completion(body))
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def sleep(self, is_chat: bool):
+        latency = self.latency
+        if is_chat and self.chat_latency is not None:
+            latency = self.chat_latency
+        time.sleep(random.expovariate(1 / latency) if latency else 0)
+
+    def forward(self, key: str, body: dict):
+        """
+        Send the request to the real API and record a successful response.
+        """
+        request = urllib.request.Request(
+            OPENAI_URL + self.path.removeprefix("/v1"),
+            data=json.dumps(body).encode(),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": self.headers["Authorization"],
+            },
+            method="POST",
+        )
+
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                status = response.status
+                content_type = response.headers["Content-Type"]
+                data = response.read().decode()
+        except urllib.error.HTTPError as e:
+            self.send_raw(e.code, e.headers["Content-Type"], e.read().decode())
+            return
+
+        self.cassette.put(
+            key,
+            {
+                "status": status,
+                "content_type": content_type,
+                "body": data,
+                "elapsed_seconds": round(time.perf_counter() - start, 3),
+            },
+        )
+        self.send_raw(status, content_type, data)
+
+    def embeddings(self, body: dict) -> dict:
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = body.get("dimensions", DEFAULT_DIMENSIONS)
+
+        data = []
+        for idx, text in enumerate(texts):
+            vector = fake_embedding(text, dimensions)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": idx, "embedding": embedding})
+
+        tokens = sum(len(text) for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def chat_completion(self, body: dict) -> dict:
+        content, prompt_tokens, completion_tokens = self.chat_content(body)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(content)},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def chat_completion_chunks(self, body: dict) -> list[dict]:
+        content, prompt_tokens, completion_tokens = self.chat_content(body)
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body["model"],
+        }
+
+        chunks = [
+            {
+                **chunk,
+                "choices": [{"index": 0, "delta": {"content": token}}],
+            }
+            for token in content
+        ]
+        chunks.append(
+            {**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        )
+        if body.get("stream_options", {}).get("include_usage"):
+            chunks.append(
+                {
+                    **chunk,
+                    "choices": [],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                }
+            )
+        return chunks
+
+    def chat_content(self, body: dict) -> tuple[list[str], int, int]:
+        prompt = "".join(str(m["content"]) for m in body["messages"])
+        # Intent extraction asks for JSON; no filter is the safe answer
+        if body.get("response_format", {}).get("type") == "json_object":
+            content = ["{}"]
+        else:
+            content = fake_answer(self.answer_tokens)
+        return content, len(prompt) // 4, len(content)
+
+    def send_json(self, status: int, data: dict, headers: dict | None = None):
+        self.send_raw(status, "application/json", json.dumps(data), headers)
+
+    def send_raw(
+        self,
+        status: int,
+        content_type: str,
+        data: str,
+        headers: dict | None = None,
+    ):
+        payload = data.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_stream(self, chunks: list[dict]):
+        self.send_raw(
+            200,
+            "text/event-stream",
+            "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks)
+            + "data: [DONE]\n\n",
+        )
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_server(
+    port: int = 0,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    chat_latency: Optional[float] = None,
+    answer_tokens: int = DEFAULT_ANSWER_TOKENS,
+    cassette: Optional[Cassette] = None,
+    record: bool = False,
+    recorded_latency: bool = False,
+) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Start the server on a background thread and return it with its base URL
+    (pass it as base_url to OpenAI()).
+    """
+    handler = type(
+        "Handler",
+        (FakeOpenAIHandler,),
+        {
+            "latency": latency,
+            "chat_latency": chat_latency,
+            "error_rate": error_rate,
+            "answer_tokens": answer_tokens,
+            "cassette": cassette,
+            "record": record,
+            "recorded_latency": recorded_latency,
+        },
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Mean response latency (s)"
+    )
+    parser.add_argument(
+        "--chat-latency",
+        type=float,
+        default=None,
+        help="Mean latency of chat completions (s), if different",
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 429 responses"
+    )
+    parser.add_argument("--answer-tokens", type=int, default=DEFAULT_ANSWER_TOKENS)
+    parser.add_argument("--cassette", type=Path, default=None)
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Forward requests to the real API and save them to the cassette",
+    )
+    parser.add_argument(
+        "--recorded-latency",
+        action="store_true",
+        help="Replay cassette entries with the latency they were recorded with",
+    )
+    args = parser.parse_args()
+
+    if args.record and args.cassette is None:
+        parser.error("--record requires --cassette")
+
+    server, base_url = start_fake_server(
+        args.port,
+        args.latency,
+        args.error_rate,
+        chat_latency=args.chat_latency,
+        answer_tokens=args.answer_tokens,
+        cassette=Cassette(args.cassette) if args.cassette else None,
+        record=args.record,
+        recorded_latency=args.recorded_latency,
+    )
+    print(f"Fake OpenAI API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
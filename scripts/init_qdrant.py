@@ -1,15 +1,30 @@
 import argparse
+import hashlib
+import heapq
+import itertools
 import os
 import json
+import resource
+import sys
+import time
+import uuid
 import numpy as np
 from qdrant_client import models, QdrantClient
 from openai import OpenAI
 from dotenv import load_dotenv
-from typing import TypedDict
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional, TypedDict
 from tqdm import tqdm
+from embedding_scheduler import EmbeddingScheduler
+from embedding_store import EmbeddingStore
 import mapclassify
 import math
 import re
+from pathlib import Path
+
+# The embedding settings are shared with the server
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from server.src.core.embedding import EMBED_DIMENSIONS, EMBED_MODEL  # noqa: E402
 
 
 class KnowledgeDict(TypedDict):
@@ -25,36 +40,204 @@ class KnowledgeDict(TypedDict):
     distance_to_station_tier: int
 
 
-parser = argparse.ArgumentParser()
-parser.add_argument("--env", choices=["localstack", "prod"], default="localstack")
-args = parser.parse_args()
-
-env = args.env
-
-# Load environment variables
-if env == "localstack":
-    load_dotenv(".env.localstack")
-else:
-    load_dotenv(".env.prod")
-
 # Configuration
+# The server queries COLLECTION_NAME, an alias of the current version of the
+# collection. A rebuild creates a new version (VERSION_PREFIX + UTC timestamp),
+# warms it up and repoints the alias in one request.
 COLLECTION_NAME = "tokyo_landprice_rag"
-GEOJSON_PATH = "data/L01-25_13.geojson"
-EMBED_MODEL = "text-embedding-3-small"
-VECTOR_SIZE = 1536
+VERSION_PREFIX = f"{COLLECTION_NAME}_v"
+KEEP_VERSIONS = 2
+WARMUP_QUERIES = 20
+READY_TIMEOUT_SECONDS = 600
+# Answers cached by the server (server/src/core/answer_cache.py)
+ANSWER_CACHE_COLLECTION = "tokyo_landprice_rag_answers"
+GEOJSON_PATHS = ["data/L01-25_13.geojson"]
 BATCH_SIZE = 2048
+READ_CHUNK_SIZE = 1 << 20
+CHECKPOINT_PATH = Path(".init_qdrant_checkpoint.json")
+EMBEDDING_STORE_PATH = Path("data/embeddings")
+
+# A land point is identified by its municipality and 所在及び地番, so that a
+# refreshed dataset updates points in place instead of appending new ones.
+POINT_ID_FIELDS = ("L01_024", "L01_025")
+POINT_ID_NAMESPACE = uuid.UUID("121fc8ef-856f-4de6-86ee-5ab2c0d2407c")
+
+# Bundled with the Lambda for RETRIEVAL_BACKEND=local (server/src/core/local_index.py)
+LOCAL_INDEX_DIR = (
+    Path(__file__).resolve().parents[1] / "server" / "src" / "data" / "index"
+)
+
+# Every payload field the server filters on (server/src/core/qdrant.py)
+PAYLOAD_INDEXES = {
+    "ward": models.PayloadSchemaType.KEYWORD,
+    "station": models.PayloadSchemaType.KEYWORD,
+    "usage": models.PayloadSchemaType.KEYWORD,
+    "time_to_station": models.PayloadSchemaType.INTEGER,
+    "is_max_price": models.PayloadSchemaType.BOOL,
+    "is_min_price": models.PayloadSchemaType.BOOL,
+    "is_top_1_percent_price": models.PayloadSchemaType.BOOL,
+    "is_bottom_1_percent_price": models.PayloadSchemaType.BOOL,
+    "is_max_change_rate": models.PayloadSchemaType.BOOL,
+    "is_min_change_rate": models.PayloadSchemaType.BOOL,
+    "is_top_1_percent_change_rate": models.PayloadSchemaType.BOOL,
+    "is_bottom_1_percent_change_rate": models.PayloadSchemaType.BOOL,
+    "location": models.PayloadSchemaType.GEO,
+}
+
+
+@dataclass
+class CollectionProfile:
+    payload_indexes: bool = True
+    # int8 scalar quantization kept in RAM; the server rescores the candidates
+    # with the original vectors
+    quantization: bool = False
+    on_disk_vectors: bool = False
+    on_disk_payload: bool = False
+
+
+COLLECTION_PROFILES = {
+    # The collection as it was created before profiles existed
+    "plain": CollectionProfile(payload_indexes=False),
+    "indexed": CollectionProfile(),
+    "quantized": CollectionProfile(quantization=True, on_disk_vectors=True),
+    "on_disk": CollectionProfile(on_disk_vectors=True, on_disk_payload=True),
+}
+
+# Bundled with the Lambda for the local intent extractor (server/src/core/intent.py)
+GAZETTEER_PATH = (
+    Path(__file__).resolve().parents[1] / "server" / "src" / "data" / "gazetteer.json"
+)
+
+# Bundled with the Lambda for answers from aggregates (server/src/core/aggregates.py)
+AGGREGATES_PATH = (
+    Path(__file__).resolve().parents[1] / "server" / "src" / "data" / "aggregates.json"
+)
+AGGREGATE_TOP_N = 5
+# Payload fields kept for the top points of each group
+AGGREGATE_POINT_FIELDS = (
+    "price",
+    "price_percentile",
+    "is_top_1_percent_price",
+    "is_bottom_1_percent_price",
+    "change_rate",
+    "change_rate_percentile",
+    "is_top_1_percent_change_rate",
+    "is_bottom_1_percent_change_rate",
+    "ward",
+    "address",
+    "station",
+    "usage",
+    "time_to_station",
+    "location",
+)
+# Ranking name -> (payload field, 1 for the highest values, -1 for the lowest)
+AGGREGATE_RANKINGS = {
+    "top_price": ("price", 1),
+    "bottom_price": ("price", -1),
+    "top_change_rate": ("change_rate", 1),
+    "bottom_change_rate": ("change_rate", -1),
+}
 
-openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-if env == "localstack":
-    client = QdrantClient(host="localhost", port=6333)
-else:
-    client = QdrantClient(
-        api_key=os.getenv("QDRANT_API_KEY"),
-        host=os.getenv("QDRANT_HOST"),
-        port=443,
-        check_compatibility=False,
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", choices=["localstack", "prod"], default="localstack")
+    parser.add_argument(
+        "--mode",
+        choices=["incremental", "rebuild"],
+        default="incremental",
+        help="incremental: only re-embed changed points and delete removed ones, "
+        "in the live collection. rebuild: ingest everything into a new version "
+        "of the collection and switch the server to it once it is warmed up.",
     )
+    parser.add_argument(
+        "--keep-versions",
+        type=int,
+        default=KEEP_VERSIONS,
+        help="Previous versions kept after a rebuild, for --rollback.",
+    )
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="Point the server back to the previous version and exit.",
+    )
+    parser.add_argument(
+        "--geojson",
+        nargs="+",
+        default=GEOJSON_PATHS,
+        help="L01 GeoJSON files to ingest, e.g. data/L01-25_*.geojson for all "
+        "prefectures. Tiers and percentiles are computed across all of them.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Embedding requests in flight at once.",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=int,
+        default=3_000,
+        help="Embeddings request budget of the API key.",
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=int,
+        default=1_000_000,
+        help="Embeddings token budget of the API key.",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(COLLECTION_PROFILES),
+        default="indexed",
+        help="Storage and index settings used when the collection is created. "
+        "Payload indexes are also added to an existing collection; the other "
+        "settings take effect with --mode rebuild.",
+    )
+    parser.add_argument(
+        "--export-index",
+        action="store_true",
+        help=f"After ingestion, export the collection to {LOCAL_INDEX_DIR} for "
+        "the server's local retrieval backend.",
+    )
+    parser.add_argument(
+        "--embedding-store",
+        type=Path,
+        default=EMBEDDING_STORE_PATH,
+        help="Directory of the on-disk embedding store.",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Take every vector from the embedding store and never call OpenAI. "
+        "Fails before touching the collection if a text is not in the store.",
+    )
+    return parser.parse_args()
+
+
+def create_clients(
+    env: str, offline: bool = False
+) -> tuple[Optional[OpenAI], QdrantClient]:
+    # Load environment variables
+    if env == "localstack":
+        load_dotenv(".env.localstack")
+    else:
+        load_dotenv(".env.prod")
+
+    # Offline runs never call OpenAI, so they need no API key
+    openai = None if offline else OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    if env == "localstack":
+        client = QdrantClient(host="localhost", port=6333)
+    else:
+        client = QdrantClient(
+            api_key=os.getenv("QDRANT_API_KEY"),
+            host=os.getenv("QDRANT_HOST"),
+            port=443,
+            check_compatibility=False,
+        )
+
+    return openai, client
 
 
 def build_embedding_input(k: KnowledgeDict) -> str:
@@ -157,144 +340,918 @@ def build_embedding_input(k: KnowledgeDict) -> str:
     return "\n".join(parts)
 
 
-def embed_batch(texts: list[str]) -> list[list[float]]:
-    response = openai.embeddings.create(
-        input=texts,
-        model=EMBED_MODEL,
+def iter_features(path: str) -> Iterator[dict]:
+    """
+    Yield the features of a GeoJSON FeatureCollection one at a time, reading
+    the file in chunks instead of loading the whole document.
+    """
+    decoder = json.JSONDecoder()
+
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError(f"No features array found in {path}")
+            buffer += chunk
+            match = re.search(r'"features"\s*:\s*\[', buffer)
+            if match:
+                buffer = buffer[match.end() :]
+                break
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+
+            try:
+                feature, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The next feature is cut off by the end of the buffer
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    raise
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            yield feature
+
+            if pos > READ_CHUNK_SIZE:
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def iter_inputs(paths: list[str]) -> Iterator[dict]:
+    for path in paths:
+        yield from iter_features(path)
+
+
+@dataclass
+class IngestStats:
+    """
+    Dataset-wide statistics from the first pass, needed to prepare any
+    window of features in the second pass.
+    """
+
+    count: int
+    ids: set[str]
+    sorted_prices: np.ndarray
+    sorted_change_rates: np.ndarray
+    price_bins: np.ndarray
+    change_rate_bins: np.ndarray
+    distance_bins: np.ndarray
+    wards: set[str]
+    stations: set[str]
+    usages: set[str]
+
+
+def scan_features(features: Iterable[dict]) -> IngestStats:
+    ids: set[str] = set()
+    prices: list[float] = []
+    change_rates: list[float] = []
+    distances: list[float] = []
+    wards: set[str] = set()
+    stations: set[str] = set()
+    usages: set[str] = set()
+
+    for feature in features:
+        prop = feature["properties"]
+
+        pid = point_id(prop)
+        if pid in ids:
+            raise ValueError(
+                f"Point identity {POINT_ID_FIELDS} is not unique: "
+                f"{[prop[field] for field in POINT_ID_FIELDS]}"
+            )
+        ids.add(pid)
+
+        prices.append(prop["L01_008"])
+        change_rates.append(prop["L01_009"])
+        distances.append(prop["L01_050"])
+        wards.add(prop["L01_024"])
+        stations.add(prop["L01_048"])
+        usages.add(prop["L01_028"])
+
+    prices_array = np.array(prices)
+    change_rates_array = np.array(change_rates)
+    distances_array = np.array(distances)
+
+    # Create classifiers using Quantiles (5 classes)
+    return IngestStats(
+        count=len(ids),
+        ids=ids,
+        sorted_prices=np.sort(prices_array),
+        sorted_change_rates=np.sort(change_rates_array),
+        price_bins=mapclassify.Quantiles(prices_array, k=5).bins,
+        change_rate_bins=mapclassify.Quantiles(change_rates_array, k=5).bins,
+        distance_bins=mapclassify.Quantiles(distances_array, k=5).bins,
+        wards=wards,
+        stations=stations,
+        usages=usages,
     )
-    return [item.embedding for item in response.data]
 
 
-def main():
-    if client.collection_exists(collection_name=COLLECTION_NAME):
-        client.delete_collection(collection_name=COLLECTION_NAME)
+def write_gazetteer(stats: IngestStats) -> None:
+    gazetteer = {
+        "wards": sorted(stats.wards),
+        "stations": sorted(stats.stations),
+        "usages": sorted(stats.usages),
+    }
+
+    GAZETTEER_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(GAZETTEER_PATH, "w", encoding="utf-8") as f:
+        json.dump(gazetteer, f, ensure_ascii=False, indent=2)
+
+    print(
+        f"Wrote gazetteer with {len(gazetteer['wards'])} wards and "
+        f"{len(gazetteer['stations'])} stations to {GAZETTEER_PATH}"
+    )
+
+
+@dataclass
+class GroupAggregate:
+    prices: list[int] = field(default_factory=list)
+    change_rates: list[float] = field(default_factory=list)
+    # Min-heaps of (signed value, point id, point), AGGREGATE_TOP_N each
+    rankings: dict[str, list[tuple[float, str, dict]]] = field(
+        default_factory=lambda: {name: [] for name in AGGREGATE_RANKINGS}
+    )
+
+    def add(self, pid: str, payload: dict, point: dict) -> None:
+        self.prices.append(payload["price"])
+        self.change_rates.append(payload["change_rate"])
+
+        for name, (key, sign) in AGGREGATE_RANKINGS.items():
+            heap = self.rankings[name]
+            item = (sign * payload[key], pid, point)
+            if len(heap) < AGGREGATE_TOP_N:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+
+    def to_dict(self) -> dict:
+        prices = np.array(self.prices)
+        change_rates = np.array(self.change_rates)
+        p10, p90 = np.percentile(change_rates, [10, 90])
+
+        return {
+            "count": len(prices),
+            "price": {
+                "mean": float(prices.mean()),
+                "median": float(np.median(prices)),
+                "min": int(prices.min()),
+                "max": int(prices.max()),
+            },
+            "change_rate": {
+                "mean": float(change_rates.mean()),
+                "median": float(np.median(change_rates)),
+                "min": float(change_rates.min()),
+                "max": float(change_rates.max()),
+                "p10": float(p10),
+                "p90": float(p90),
+                "rising": int((change_rates > 0).sum()),
+                "falling": int((change_rates < 0).sum()),
+            },
+            **{
+                name: [pid for _, pid, _ in sorted(heap, reverse=True)]
+                for name, heap in self.rankings.items()
+            },
+        }
+
+
+@dataclass
+class AggregateBuilder:
+    """
+    Per-ward, per-station and overall statistics, built from the prepared
+    payloads one window at a time. Only the top points of every group are
+    kept, so memory grows with the number of points by a few numbers each.
+    """
+
+    overall: GroupAggregate = field(default_factory=GroupAggregate)
+    wards: dict[str, GroupAggregate] = field(default_factory=dict)
+    stations: dict[str, GroupAggregate] = field(default_factory=dict)
+
+    def add(self, pid: str, payload: dict) -> None:
+        point = {key: payload.get(key) for key in AGGREGATE_POINT_FIELDS}
+        self.overall.add(pid, payload, point)
+        self.wards.setdefault(payload["ward"], GroupAggregate()).add(
+            pid, payload, point
+        )
+        self.stations.setdefault(payload["station"], GroupAggregate()).add(
+            pid, payload, point
+        )
+
+    def to_dict(self) -> dict:
+        groups = [self.overall, *self.wards.values(), *self.stations.values()]
+        points = {
+            pid: point
+            for group in groups
+            for heap in group.rankings.values()
+            for _, pid, point in heap
+        }
+
+        return {
+            "overall": self.overall.to_dict(),
+            "wards": {
+                ward: group.to_dict() for ward, group in sorted(self.wards.items())
+            },
+            "stations": {
+                station: group.to_dict()
+                for station, group in sorted(self.stations.items())
+            },
+            "points": points,
+        }
+
+
+def write_aggregates(aggregates: AggregateBuilder) -> None:
+    AGGREGATES_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(AGGREGATES_PATH, "w", encoding="utf-8") as f:
+        json.dump(aggregates.to_dict(), f, ensure_ascii=False)
+
+    print(
+        f"Wrote aggregates for {len(aggregates.wards)} wards and "
+        f"{len(aggregates.stations)} stations to {AGGREGATES_PATH}"
+    )
+
+
+def point_id(prop: dict) -> str:
+    identity = "|".join(str(prop[field]) for field in POINT_ID_FIELDS)
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, identity))
+
+
+def content_hash(payload: dict) -> str:
+    # The model and the dimensions are part of the hash so that switching
+    # either re-embeds everything.
+    content = json.dumps(
+        {"model": EMBED_MODEL, "dimensions": EMBED_DIMENSIONS, "payload": payload},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def text_hash(text: str) -> str:
+    """
+    Hash of the embedding input alone. The payload also holds dataset-wide
+    fields (percentiles, tiers, top 1% flags) that shift for most points when
+    a single feature is added or removed; those changes only rewrite the
+    payload, and a point is embedded again only when its text hash changes.
+    """
+    content = json.dumps(
+        {"model": EMBED_MODEL, "dimensions": EMBED_DIMENSIONS, "text": text},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def fetch_content_hashes(
+    client: QdrantClient, collection_name: str = COLLECTION_NAME
+) -> dict[str, tuple[Optional[str], Optional[str]]]:
+    """
+    (content_hash, text_hash) of every point in the collection.
+    """
+    hashes: dict[str, tuple[Optional[str], Optional[str]]] = {}
+    offset = None
+
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=["content_hash", "text_hash"],
+            with_vectors=False,
+        )
+        for record in records:
+            payload = record.payload or {}
+            hashes[str(record.id)] = (
+                payload.get("content_hash"),
+                payload.get("text_hash"),
+            )
+
+        if offset is None:
+            return hashes
+
+
+def export_index(client: QdrantClient, directory: Path = LOCAL_INDEX_DIR) -> int:
+    """
+    Write every point of the collection as a float32 vector matrix
+    (vectors.npy, memory-mapped by the server) and one array per payload
+    field (payload.npz). Nested fields such as location.lat are flattened.
+    """
+    ids: list[str] = []
+    vectors: list[list[float]] = []
+    columns: dict[str, list] = {}
+    offset = None
+
+    while True:
+        records, offset = client.scroll(
+            collection_name=COLLECTION_NAME,
+            limit=1000,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for record in records:
+            ids.append(str(record.id))
+            vectors.append(record.vector)
+            for key, value in (record.payload or {}).items():
+                if isinstance(value, dict):
+                    for field, v in value.items():
+                        columns.setdefault(f"{key}.{field}", []).append(v)
+                else:
+                    columns.setdefault(key, []).append(value)
+
+        if offset is None:
+            break
+
+    matrix = np.array(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    directory.mkdir(parents=True, exist_ok=True)
+    np.save(directory / "vectors.npy", matrix)
+    np.savez(
+        directory / "payload.npz",
+        id=np.array(ids),
+        **{key: np.array(values) for key, values in columns.items()},
+    )
+
+    return len(ids)
+
+
+def load_checkpoint(plan_id: str) -> tuple[int, Optional[str]]:
+    """
+    Number of windows of this plan that were already upserted by an
+    interrupted run and the collection they went to, or (0, None) if the
+    checkpoint belongs to another plan.
+    """
+    if not CHECKPOINT_PATH.exists():
+        return 0, None
+
+    with open(CHECKPOINT_PATH, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+
+    if checkpoint.get("plan_id") != plan_id:
+        return 0, None
+
+    return checkpoint["completed_windows"], checkpoint.get("collection_name")
+
+
+def save_checkpoint(plan_id: str, completed_windows: int, collection_name: str) -> None:
+    with open(CHECKPOINT_PATH, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "plan_id": plan_id,
+                "completed_windows": completed_windows,
+                "collection_name": collection_name,
+            },
+            f,
+        )
+
+
+def plan_signature(mode: str, paths: list[str], window_size: int) -> str:
+    """
+    Identifies a run over the same inputs, so a checkpoint is only resumed
+    by a run that would process the same windows.
+    """
+    plan = hashlib.sha256(f"{mode}:{window_size}".encode())
+    for path in paths:
+        stat = os.stat(path)
+        plan.update(
+            f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        )
+    return plan.hexdigest()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def create_collection(
+    client: QdrantClient,
+    profile: CollectionProfile,
+    collection_name: str = COLLECTION_NAME,
+    metadata: Optional[dict] = None,
+) -> None:
+    quantization_config = None
+    if profile.quantization:
+        quantization_config = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True,
+            )
+        )
 
     client.create_collection(
-        collection_name=COLLECTION_NAME,
+        collection_name=collection_name,
         vectors_config=models.VectorParams(
-            size=VECTOR_SIZE,
+            size=EMBED_DIMENSIONS,
             distance=models.Distance.COSINE,
+            on_disk=profile.on_disk_vectors,
         ),
+        on_disk_payload=profile.on_disk_payload,
+        quantization_config=quantization_config,
+        metadata=metadata,
     )
 
-    with open(GEOJSON_PATH, "r", encoding="utf-8") as f:
-        geojson = json.load(f)
 
-    features = geojson["features"]
-    print(f"Processing {len(features)} features...")
+def collection_dimensions(
+    client: QdrantClient, collection_name: str = COLLECTION_NAME
+) -> int:
+    params = client.get_collection(collection_name=collection_name).config.params
+    return params.vectors.size
+
+
+def create_payload_indexes(
+    client: QdrantClient, collection_name: str = COLLECTION_NAME
+) -> None:
+    existing = client.get_collection(collection_name=collection_name).payload_schema
+
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        if field_name in existing:
+            continue
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=field_schema,
+            wait=True,
+        )
+
+
+def version_name() -> str:
+    return f"{VERSION_PREFIX}{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+
+
+def live_collection(client: QdrantClient) -> Optional[str]:
+    """
+    The collection the server queries: the version COLLECTION_NAME is an
+    alias of, COLLECTION_NAME itself while it is still a plain collection
+    (before the first versioned rebuild), or None.
+    """
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == COLLECTION_NAME:
+            return alias.collection_name
+
+    if client.collection_exists(collection_name=COLLECTION_NAME):
+        return COLLECTION_NAME
+    return None
+
+
+def list_versions(client: QdrantClient) -> list[str]:
+    # Oldest first, since the timestamps have a fixed width
+    return sorted(
+        collection.name
+        for collection in client.get_collections().collections
+        if collection.name.startswith(VERSION_PREFIX)
+    )
+
+
+def is_ready(client: QdrantClient, collection_name: str) -> bool:
+    # Only versions that passed warm_up() are marked ready; the others are
+    # interrupted or failed builds
+    metadata = client.get_collection(collection_name=collection_name).config.metadata
+    return bool((metadata or {}).get("ready"))
+
+
+def wait_until_indexed(
+    client: QdrantClient,
+    collection_name: str,
+    timeout_seconds: float = READY_TIMEOUT_SECONDS,
+) -> None:
+    """
+    Wait for the optimizers to finish indexing the uploaded points, so that
+    the first queries after the swap do not fall back to full scans.
+    """
+    deadline = time.monotonic() + timeout_seconds
+
+    while True:
+        status = client.get_collection(collection_name=collection_name).status
+        if status == models.CollectionStatus.RED:
+            raise SystemExit(f"Optimizing {collection_name} failed.")
+        if status != models.CollectionStatus.YELLOW:
+            return
+        if time.monotonic() > deadline:
+            raise SystemExit(
+                f"{collection_name} was still being indexed after "
+                f"{timeout_seconds:.0f}s."
+            )
+        time.sleep(1)
+
+
+def warm_up(
+    client: QdrantClient,
+    collection_name: str,
+    expected_points: int,
+    queries: int = WARMUP_QUERIES,
+) -> None:
+    """
+    Check a new version before the server is switched to it, querying it the
+    way the server does so that its vectors and payload indexes are loaded:
+    every point must be there, and the first points must be found by their
+    own vectors, with and without a ward filter.
+    """
+    count = client.count(collection_name=collection_name, exact=True).count
+    if count != expected_points:
+        raise SystemExit(
+            f"{collection_name} holds {count} points instead of {expected_points}."
+        )
+
+    records, _ = client.scroll(
+        collection_name=collection_name,
+        limit=queries,
+        with_payload=["ward"],
+        with_vectors=True,
+    )
+    for record in records:
+        ward_filter = models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="ward",
+                    match=models.MatchValue(value=(record.payload or {}).get("ward")),
+                )
+            ]
+        )
+        for query_filter in (None, ward_filter):
+            hits = client.query_points(
+                collection_name=collection_name,
+                query=record.vector,
+                query_filter=query_filter,
+                limit=5,
+                with_payload=False,
+            ).points
+            if str(record.id) not in {str(hit.id) for hit in hits}:
+                raise SystemExit(
+                    f"Point {record.id} is not found by its own vector in "
+                    f"{collection_name}."
+                )
+
+
+def swap_alias(client: QdrantClient, collection_name: str) -> Optional[str]:
+    """
+    Point COLLECTION_NAME at collection_name in a single request, and return
+    the collection it pointed at before.
+    """
+    previous = live_collection(client)
+    operations: list = [
+        models.CreateAliasOperation(
+            create_alias=models.CreateAlias(
+                collection_name=collection_name, alias_name=COLLECTION_NAME
+            )
+        )
+    ]
+
+    if previous == COLLECTION_NAME:
+        # Only once, when moving from the plain collection: an alias cannot
+        # have the name of a collection, so it is deleted right before the
+        # alias is created and queries fail in between.
+        client.delete_collection(collection_name=COLLECTION_NAME)
+    elif previous is not None:
+        operations.insert(
+            0,
+            models.DeleteAliasOperation(
+                delete_alias=models.DeleteAlias(alias_name=COLLECTION_NAME)
+            ),
+        )
+
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return previous
+
+
+def prune_versions(client: QdrantClient, keep: int) -> list[str]:
+    """
+    Delete every version but the live one and the `keep` newest ready
+    versions before it, i.e. also failed builds and versions that were
+    rolled back from.
+    """
+    live = live_collection(client)
+    previous = [
+        version
+        for version in list_versions(client)
+        if live is not None and version < live and is_ready(client, version)
+    ]
+    kept = {live, *(previous[-keep:] if keep > 0 else [])}
+
+    pruned = [version for version in list_versions(client) if version not in kept]
+    for version in pruned:
+        client.delete_collection(collection_name=version)
+    return pruned
+
+
+def rollback(client: QdrantClient) -> None:
+    live = live_collection(client)
+    if live is None or not live.startswith(VERSION_PREFIX):
+        raise SystemExit(f"{COLLECTION_NAME} is not an alias of a version.")
 
+    previous = [
+        version
+        for version in list_versions(client)
+        if version < live and is_ready(client, version)
+    ]
+    if not previous:
+        raise SystemExit(f"No version before {live} to roll back to.")
+
+    swap_alias(client, previous[-1])
+    print(f"{COLLECTION_NAME} now points to {previous[-1]} (was {live}).")
+
+
+def percentile_rank(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Percentage of all values strictly below each value, i.e.
+    (all_values < v).sum() / n * 100, in O(log n) per value.
+    """
+    below = np.searchsorted(sorted_values, values, side="left")
+    return below / len(sorted_values) * 100
+
+
+def prepare_payloads(features: list[dict], stats: IngestStats) -> list[dict]:
     # @see: https://nlftp.mlit.go.jp/ksj/gml/datalist/KsjTmplt-L01-2025.html
+    props = [f["properties"] for f in features]
+    coordinates = np.array([f["geometry"]["coordinates"] for f in features])
 
     # Prepare data
-    prices = np.array([f["properties"]["L01_008"] for f in features])
-    change_rates = np.array([f["properties"]["L01_009"] for f in features])
-    distances = np.array([f["properties"]["L01_050"] for f in features])
+    prices = np.array([p["L01_008"] for p in props])
+    change_rates = np.array([p["L01_009"] for p in props])
+    distances = np.array([p["L01_050"] for p in props])
 
-    # Create classifiers using Quantiles (5 classes)
-    price_classifier = mapclassify.Quantiles(prices, k=5)
-    change_rate_classifier = mapclassify.Quantiles(change_rates, k=5)
-    distance_classifier = mapclassify.Quantiles(distances, k=5)
+    all_prices = stats.sorted_prices
+    all_change_rates = stats.sorted_change_rates
+    price_top_1, price_bottom_1 = np.percentile(all_prices, [99, 1])
+    change_rate_top_1, change_rate_bottom_1 = np.percentile(all_change_rates, [99, 1])
 
-    price_min, price_max = prices.min(), prices.max()
-    change_rate_min, change_rate_max = change_rates.min(), change_rates.max()
+    price_tiers = np.searchsorted(stats.price_bins, prices) + 1
+    change_rate_tiers = np.searchsorted(stats.change_rate_bins, change_rates) + 1
+    distance_tiers = np.searchsorted(stats.distance_bins, distances) + 1
 
-    price_top_1 = np.percentile(prices, 99)
-    price_bottom_1 = np.percentile(prices, 1)
+    columns = {
+        "price": prices,
+        "price_tier": price_tiers,
+        "price_percentile": percentile_rank(all_prices, prices),
+        "is_top_1_percent_price": prices >= price_top_1,
+        "is_bottom_1_percent_price": prices <= price_bottom_1,
+        "is_max_price": prices == all_prices[-1],
+        "is_min_price": prices == all_prices[0],
+        "change_rate": change_rates,
+        "change_rate_tier": change_rate_tiers,
+        "change_rate_percentile": percentile_rank(all_change_rates, change_rates),
+        "is_top_1_percent_change_rate": change_rates >= change_rate_top_1,
+        "is_bottom_1_percent_change_rate": change_rates <= change_rate_bottom_1,
+        "is_max_change_rate": change_rates == all_change_rates[-1],
+        "is_min_change_rate": change_rates == all_change_rates[0],
+        "ward": [p["L01_024"] for p in props],
+        "address": [p["L01_025"] for p in props],
+        "station": [p["L01_048"] for p in props],
+        "usage": [p["L01_028"] for p in props],
+        "distance_to_station": distances,
+        "distance_to_station_tier": distance_tiers,
+        "time_to_station": np.ceil(distances / 80).astype(int),
+    }
 
-    change_rate_top_1 = np.percentile(change_rates, 99)
-    change_rate_bottom_1 = np.percentile(change_rates, 1)
+    # tolist() converts NumPy scalars into plain Python values for the payload
+    rows = zip(
+        *(
+            column.tolist() if isinstance(column, np.ndarray) else column
+            for column in columns.values()
+        )
+    )
+    lons, lats = coordinates[:, 0].tolist(), coordinates[:, 1].tolist()
 
     data_items = []
 
-    for idx, feature in enumerate(tqdm(features, desc="Preparing data")):
-        prop = feature["properties"]
-        lon, lat = feature["geometry"]["coordinates"]
-        price = prop["L01_008"]
-        change_rate = prop["L01_009"]
-        ward = prop["L01_024"]
-        usage = prop["L01_028"]
-        station = prop["L01_048"]
-        distance_to_station = prop["L01_050"]
-
-        price_tier = int(price_classifier.yb[idx]) + 1
-        change_rate_tier = int(change_rate_classifier.yb[idx]) + 1
-        distance_tier = int(distance_classifier.yb[idx]) + 1
-
-        knowledge = {
-            "price": price,
-            "price_tier": price_tier,
-            "change_rate_tier": change_rate_tier,
-            "address": prop["L01_025"],
-            "usage": usage,
-            "usage_detail": prop["L01_029"],
-            "surrounding_detail": prop["L01_047"],
-            "station": station,
-            "distance_to_station": distance_to_station,
-            "distance_to_station_tier": distance_tier,
-        }
+    for prop, row, lat, lon in zip(props, rows, lats, lons):
+        payload = dict(zip(columns, row))
+        payload["location"] = {"lat": lat, "lon": lon}
+        payload["semantic_text"] = build_embedding_input(
+            {
+                "price": payload["price"],
+                "price_tier": payload["price_tier"],
+                "change_rate_tier": payload["change_rate_tier"],
+                "address": prop["L01_025"],
+                "usage": payload["usage"],
+                "usage_detail": prop["L01_029"],
+                "surrounding_detail": prop["L01_047"],
+                "station": payload["station"],
+                "distance_to_station": payload["distance_to_station"],
+                "distance_to_station_tier": payload["distance_to_station_tier"],
+            }
+        )
+        data_items.append(payload)
 
-        embedding_input = build_embedding_input(knowledge)
-
-        payload = {
-            "price": price,
-            "price_tier": knowledge["price_tier"],
-            "price_percentile": float((prices < price).sum() / len(prices) * 100),
-            "is_top_1_percent_price": bool(price >= price_top_1),
-            "is_bottom_1_percent_price": bool(price <= price_bottom_1),
-            "is_max_price": bool(price == price_max),
-            "is_min_price": bool(price == price_min),
-            "change_rate": change_rate,
-            "change_rate_tier": knowledge["change_rate_tier"],
-            "change_rate_percentile": float(
-                (change_rates < change_rate).sum() / len(change_rates) * 100
-            ),
-            "is_top_1_percent_change_rate": bool(change_rate >= change_rate_top_1),
-            "is_bottom_1_percent_change_rate": bool(
-                change_rate <= change_rate_bottom_1
-            ),
-            "is_max_change_rate": bool(change_rate == change_rate_max),
-            "is_min_change_rate": bool(change_rate == change_rate_min),
-            "ward": ward,
-            "station": station,
-            "usage": usage,
-            "distance_to_station": distance_to_station,
-            "distance_to_station_tier": knowledge["distance_to_station_tier"],
-            "time_to_station": int(math.ceil(distance_to_station / 80)),
-            "location": {"lat": lat, "lon": lon},
-            "semantic_text": embedding_input,
-        }
+    return data_items
 
-        data_items.append(payload)
 
-    # Batch embedding inputs
-    all_vectors = []
+def main():
+    args = parse_args()
+    openai, client = create_clients(args.env, args.offline)
+    paths = args.geojson
+
+    if args.rollback:
+        rollback(client)
+        return
+
+    # First pass: only the columns needed for dataset-wide statistics
+    stats = scan_features(tqdm(iter_inputs(paths), desc="Scanning features"))
+    print(f"Processing {stats.count} features from {len(paths)} file(s)...")
+
+    write_gazetteer(stats)
 
-    embedding_inputs = [item["semantic_text"] for item in data_items]
-    for i in tqdm(
-        range(0, len(embedding_inputs), BATCH_SIZE), desc="Embedding batches"
+    # An incremental run updates the live collection in place; a rebuild, or
+    # the first run, fills a new version that the server is switched to at
+    # the end, so it keeps querying the live one until then.
+    live = live_collection(client)
+    new_version = args.mode == "rebuild" or live is None
+
+    existing: dict[str, tuple[Optional[str], Optional[str]]] = {}
+    if not new_version:
+        dimensions = collection_dimensions(client, live)
+        if dimensions != EMBED_DIMENSIONS:
+            raise SystemExit(
+                f"The collection holds {dimensions}-d vectors but EMBED_DIMENSIONS "
+                f"is {EMBED_DIMENSIONS}; run with --mode rebuild."
+            )
+        existing = fetch_content_hashes(client, live)
+
+    stale = sorted(set(existing) - stats.ids)
+
+    # Each window holds enough texts to keep every concurrent request busy
+    window_size = BATCH_SIZE * args.concurrency
+    scheduler = None
+    if openai is not None:
+        scheduler = EmbeddingScheduler(
+            openai,
+            model=EMBED_MODEL,
+            dimensions=EMBED_DIMENSIONS,
+            batch_size=BATCH_SIZE,
+            max_concurrency=args.concurrency,
+            requests_per_minute=args.requests_per_minute,
+            tokens_per_minute=args.tokens_per_minute,
+        )
+
+    store = EmbeddingStore(args.embedding_store, EMBED_MODEL, EMBED_DIMENSIONS)
+    if args.offline:
+        missing = sum(
+            store.count_missing(
+                [p["semantic_text"] for p in prepare_payloads(list(window), stats)]
+            )
+            for window in itertools.batched(iter_inputs(paths), window_size)
+        )
+        if missing:
+            raise SystemExit(
+                f"{missing} texts are not in the embedding store; "
+                "run without --offline to embed them."
+            )
+
+    plan_id = plan_signature(args.mode, paths, window_size)
+    completed_windows, collection_name = load_checkpoint(plan_id)
+    if not new_version:
+        collection_name = live
+    elif collection_name is None or not client.collection_exists(
+        collection_name=collection_name
     ):
-        batch_texts = embedding_inputs[i : i + BATCH_SIZE]
-        vectors = embed_batch(batch_texts)
-        all_vectors.extend(vectors)
-
-    # Create points with embeddings and payloads
-    points = []
-
-    for idx, payload in enumerate(tqdm(data_items, desc="Creating points")):
-        vector = all_vectors[idx]
-        point = models.PointStruct(
-            id=idx,
-            vector=vector,
-            payload=payload,
+        collection_name, completed_windows = version_name(), 0
+
+    if completed_windows:
+        print(
+            f"Resuming {collection_name} after {completed_windows} completed windows."
+        )
+
+    profile = COLLECTION_PROFILES[args.profile]
+    if not client.collection_exists(collection_name=collection_name):
+        create_collection(client, profile, collection_name, metadata={"ready": False})
+
+    # Indexing before the upsert lets Qdrant build them while points arrive
+    if profile.payload_indexes:
+        create_payload_indexes(client, collection_name)
+
+    # Second pass: prepare, embed and upsert one window at a time
+    upserted = 0
+    payload_updated = 0
+    aggregates = AggregateBuilder()
+    windows = itertools.batched(iter_inputs(paths), window_size)
+
+    for window_idx, window in enumerate(
+        tqdm(
+            windows,
+            total=math.ceil(stats.count / window_size),
+            desc="Embedding and upserting windows",
         )
-        points.append(point)
+    ):
+        payloads = prepare_payloads(list(window), stats)
+        ids = [point_id(feature["properties"]) for feature in window]
+
+        # Windows completed by an earlier run are still aggregated
+        for pid, payload in zip(ids, payloads):
+            aggregates.add(pid, payload)
+
+        if window_idx < completed_windows:
+            continue
+
+        for payload in payloads:
+            payload["text_hash"] = text_hash(payload["semantic_text"])
+            payload["content_hash"] = content_hash(payload)
+
+        # New or changed texts are embedded and upserted; points whose text
+        # did not change keep their vector and only get the new payload.
+        pending: list[int] = []
+        payload_only: list[int] = []
+        for idx, (pid, payload) in enumerate(zip(ids, payloads)):
+            stored_content_hash, stored_text_hash = existing.get(pid, (None, None))
+            if stored_content_hash == payload["content_hash"]:
+                continue
+            if stored_text_hash == payload["text_hash"]:
+                payload_only.append(idx)
+            else:
+                pending.append(idx)
+
+        for batch in itertools.batched(payload_only, BATCH_SIZE):
+            client.batch_update_points(
+                collection_name=collection_name,
+                update_operations=[
+                    models.OverwritePayloadOperation(
+                        overwrite_payload=models.SetPayload(
+                            payload=payloads[idx], points=[ids[idx]]
+                        )
+                    )
+                    for idx in batch
+                ],
+                wait=True,
+            )
+        payload_updated += len(payload_only)
 
-    print(f"Uploading {len(points)} points to Qdrant...")
-    client.upload_points(
-        collection_name=COLLECTION_NAME,
-        points=points,
+        if pending:
+            texts = [payloads[idx]["semantic_text"] for idx in pending]
+            vectors, missing = store.get(texts)
+            if missing:
+                embedded = scheduler.embed([texts[i] for i in missing])
+                vectors[missing] = embedded
+                store.put([texts[i] for i in missing], embedded)
+            client.upload_points(
+                collection_name=collection_name,
+                points=[
+                    models.PointStruct(
+                        id=ids[idx], vector=vector.tolist(), payload=payloads[idx]
+                    )
+                    for idx, vector in zip(pending, vectors)
+                ],
+                wait=True,
+            )
+            upserted += len(pending)
+
+        save_checkpoint(plan_id, window_idx + 1, collection_name)
+
+    write_aggregates(aggregates)
+
+    if stale:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(points=stale),
+            wait=True,
+        )
+
+    if new_version:
+        wait_until_indexed(client, collection_name)
+        warm_up(client, collection_name, len(stats.ids))
+        client.update_collection(
+            collection_name=collection_name, metadata={"ready": True}
+        )
+        previous = swap_alias(client, collection_name)
+        print(f"{COLLECTION_NAME} now points to {collection_name} (was {previous}).")
+
+        pruned = prune_versions(client, args.keep_versions)
+        if pruned:
+            print(f"Deleted the previous versions {', '.join(pruned)}.")
+
+    # Cached answers are keyed on content hashes and cannot match changed
+    # points anyway; dropping them keeps the cache from filling with dead keys.
+    if (upserted or payload_updated or stale) and client.collection_exists(
+        collection_name=ANSWER_CACHE_COLLECTION
+    ):
+        client.delete_collection(collection_name=ANSWER_CACHE_COLLECTION)
+
+    if scheduler is not None:
+        scheduler.close()
+    CHECKPOINT_PATH.unlink(missing_ok=True)
+    print(
+        f"Embedding store hit rate: {store.hit_rate:.1%} "
+        f"({store.hits} of {store.hits + store.misses} texts)"
+    )
+    if scheduler is not None:
+        print(f"Embedding requests retried: {scheduler.retries}")
+    print(
+        f"Successfully upserted {upserted} points, updated the payload of "
+        f"{payload_updated} points and deleted {len(stale)} points in Qdrant."
     )
-    print(f"Successfully uploaded {len(points)} points to Qdrant.")
+    if args.export_index:
+        exported = export_index(client)
+        print(f"Exported {exported} points to {LOCAL_INDEX_DIR}")
+
+    print(f"Peak RSS: {peak_rss_mb():.1f} MB")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+import hashlib
+import itertools
+import json
+import sys
+from types import SimpleNamespace
+import pytest
+from qdrant_client import QdrantClient
+import init_qdrant
+
+WARDS = ["千代田区", "港区", "新宿区", "府中市"]
+STATIONS = ["半蔵門", "新宿", "府中"]
+USAGES = ["住宅", "店舗", "事務所"]
+
+
+def feature(i: int, **properties) -> dict:
+    """
+    An L01 feature, varied by i; properties override its fields.
+    """
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [139.3 + i * 0.01, 35.6 + i * 0.005],
+        },
+        "properties": {
+            "L01_008": 100_000 * (i + 1),
+            "L01_009": float(i % 7 - 2),
+            "L01_024": WARDS[i % len(WARDS)],
+            "L01_025": f"東京都　テスト{i}丁目{i}番",
+            "L01_028": USAGES[i % len(USAGES)],
+            "L01_029": "住宅",
+            "L01_047": "住宅地域",
+            "L01_048": STATIONS[i % len(STATIONS)],
+            "L01_050": 100 * (i + 1),
+            **properties,
+        },
+    }
+
+
+class FakeOpenAI:
+    """
+    Embeddings derived from a hash of each text, recording every text sent.
+    """
+
+    def __init__(self):
+        self.embeddings = self
+        self.texts: list[str] = []
+        self.dimensions: set[int] = set()
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, input, model, dimensions):
+        self.texts += input
+        self.dimensions.add(dimensions)
+        data = []
+        for i, text in enumerate(input):
+            seed = hashlib.sha256(text.encode("utf-8")).digest()
+            vector = [seed[j % len(seed)] / 255 + 0.01 for j in range(dimensions)]
+            data.append(SimpleNamespace(index=i, embedding=vector))
+        return SimpleNamespace(data=data)
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    """
+    Runs init_qdrant.py on the given features, with its arguments, against
+    an in-memory Qdrant. The client and the fake OpenAI are kept across runs.
+    """
+    monkeypatch.chdir(tmp_path)
+    client = QdrantClient(":memory:")
+    openai = FakeOpenAI()
+    versions = itertools.count(1)
+
+    monkeypatch.setattr(
+        init_qdrant,
+        "create_clients",
+        lambda env, offline=False: (None if offline else openai, client),
+    )
+    # One version per run, even within the same second
+    monkeypatch.setattr(
+        init_qdrant,
+        "version_name",
+        lambda: f"{init_qdrant.VERSION_PREFIX}{next(versions):014d}",
+    )
+    monkeypatch.setattr(init_qdrant, "GAZETTEER_PATH", tmp_path / "gazetteer.json")
+    monkeypatch.setattr(init_qdrant, "AGGREGATES_PATH", tmp_path / "aggregates.json")
+    monkeypatch.setattr(init_qdrant, "LOCAL_INDEX_DIR", tmp_path / "index")
+
+    def run(features: list[dict], *args: str) -> None:
+        path = tmp_path / "L01.geojson"
+        path.write_text(
+            json.dumps({"type": "FeatureCollection", "features": features}),
+            encoding="utf-8",
+        )
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["init_qdrant.py", "--geojson", str(path), *args],
+        )
+        init_qdrant.main()
+
+    yield SimpleNamespace(run=run, client=client, openai=openai)
+    client.close()
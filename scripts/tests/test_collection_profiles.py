@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+import pytest
+from init_qdrant import (
+    COLLECTION_PROFILES,
+    PAYLOAD_INDEXES,
+    create_collection,
+    create_payload_indexes,
+)
+from server.src.core.qdrant import build_filter, build_geo_filter, build_radius_filter
+
+
+class RecordingClient:
+    """
+    The local Qdrant ignores payload indexes, quantization and on-disk
+    payload, so the requests are checked instead.
+    """
+
+    def __init__(self, payload_schema: dict | None = None):
+        self.payload_schema = payload_schema or {}
+        self.collections: list[dict] = []
+        self.indexes: list[str] = []
+
+    def create_collection(self, **kwargs):
+        self.collections.append(kwargs)
+
+    def get_collection(self, collection_name):
+        return SimpleNamespace(payload_schema=self.payload_schema)
+
+    def create_payload_index(self, collection_name, field_name, field_schema, wait):
+        self.indexes.append(field_name)
+
+
+def test_every_filtered_field_is_indexed():
+    intent = {
+        "ward": "港区",
+        "station": "新宿",
+        "usage": "住宅",
+        "time_to_station_max": 10,
+        **{
+            f"require_{kind}_{target}": True
+            for kind in ("max", "min", "top_1_percent", "bottom_1_percent")
+            for target in ("price", "change_rate")
+        },
+    }
+    filters = [
+        build_filter(intent),
+        build_geo_filter(35.6, 139.7),
+        build_radius_filter(35.6, 139.7, 500),
+    ]
+
+    keys = {condition.key for f in filters for condition in f.must}
+
+    assert keys == set(PAYLOAD_INDEXES)
+
+
+@pytest.mark.parametrize(
+    "name, on_disk_vectors, on_disk_payload, quantized",
+    [
+        ("plain", False, False, False),
+        ("indexed", False, False, False),
+        ("quantized", True, False, True),
+        ("on_disk", True, True, False),
+    ],
+)
+def test_profiles(name, on_disk_vectors, on_disk_payload, quantized):
+    client = RecordingClient()
+
+    create_collection(client, COLLECTION_PROFILES[name], "collection")
+
+    (request,) = client.collections
+    assert request["vectors_config"].on_disk is on_disk_vectors
+    assert request["on_disk_payload"] is on_disk_payload
+    assert (request["quantization_config"] is not None) is quantized
+    if quantized:
+        assert request["quantization_config"].scalar.always_ram
+
+
+def test_existing_payload_indexes_are_kept():
+    client = RecordingClient(payload_schema={"ward": object(), "location": object()})
+
+    create_payload_indexes(client, "collection")
+
+    assert client.indexes == [
+        field for field in PAYLOAD_INDEXES if field not in ("ward", "location")
+    ]
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from conftest import feature
+import init_qdrant
+from bench_dimensions import truncate
+from init_qdrant import EMBED_DIMENSIONS, collection_dimensions, live_collection
+
+
+def test_vectors_have_the_shared_dimensions(ingest):
+    ingest.run([feature(i) for i in range(12)])
+
+    assert ingest.openai.dimensions == {EMBED_DIMENSIONS}
+    collection = live_collection(ingest.client)
+    assert collection_dimensions(ingest.client, collection) == EMBED_DIMENSIONS
+
+
+def test_incremental_run_refuses_another_size(ingest, monkeypatch):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+
+    monkeypatch.setattr(init_qdrant, "EMBED_DIMENSIONS", 256)
+    with pytest.raises(SystemExit, match="--mode rebuild"):
+        ingest.run(features)
+
+    ingest.run(features, "--mode", "rebuild")
+    collection = live_collection(ingest.client)
+    assert collection_dimensions(ingest.client, collection) == 256
+
+
+def test_text_hash_includes_dimensions(monkeypatch):
+    full = init_qdrant.text_hash("text")
+    monkeypatch.setattr(init_qdrant, "EMBED_DIMENSIONS", 256)
+
+    assert init_qdrant.text_hash("text") != full
+
+
+def test_truncate():
+    vectors = np.array([[3.0, 4.0, 12.0], [1.0, 0.0, 5.0]], dtype=np.float32)
+
+    shortened = truncate(vectors, 2)
+
+    np.testing.assert_allclose(shortened, [[0.6, 0.8], [1.0, 0.0]])
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+from embedding_scheduler import EmbeddingScheduler
+
+
+class FakeOpenAI:
+    """
+    Embeds a text as [len(text)], listing the data of a response in reverse,
+    which the API is free to do.
+    """
+
+    def __init__(self):
+        self.embeddings = self
+        self.requests = 0
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create(self, input, model, dimensions):
+        self.requests += 1
+        data = [
+            SimpleNamespace(index=i, embedding=[float(len(text))])
+            for i, text in enumerate(input)
+        ]
+        return SimpleNamespace(data=data[::-1])
+
+
+def test_embeddings_keep_the_input_order():
+    openai = FakeOpenAI()
+    scheduler = EmbeddingScheduler(openai, "model", 1, batch_size=2)
+    texts = ["a" * n for n in range(1, 6)]
+
+    vectors = scheduler.embed(texts)
+    scheduler.close()
+
+    assert vectors[:, 0].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert openai.requests == 3
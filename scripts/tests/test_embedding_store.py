@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from conftest import feature
+from embedding_store import EmbeddingStore
+from init_qdrant import list_versions
+
+
+def vectors(n: int, dimensions: int = 4) -> np.ndarray:
+    return np.arange(n * dimensions, dtype=np.float32).reshape(n, dimensions)
+
+
+def test_put_and_get(tmp_path):
+    store = EmbeddingStore(tmp_path, "model", 4)
+    store.put(["a", "b"], vectors(2))
+
+    # Another run, with a new instance
+    store = EmbeddingStore(tmp_path, "model", 4)
+    found, missing = store.get(["b", "c", "a"])
+
+    assert missing == [1]
+    np.testing.assert_array_equal(found, [vectors(2)[1], np.zeros(4), vectors(2)[0]])
+    assert (store.hits, store.misses) == (2, 1)
+
+
+def test_texts_are_stored_once(tmp_path):
+    store = EmbeddingStore(tmp_path, "model", 4)
+    store.put(["a", "a"], vectors(2))
+    store.put(["a", "b"], vectors(2))
+
+    assert len(store.index) == 2
+    assert (tmp_path / "model-4" / "keys.bin").stat().st_size == 2 * 32
+    np.testing.assert_array_equal(store.get(["a", "b"])[0], vectors(2))
+
+
+def test_models_and_dimensions_are_kept_apart(tmp_path):
+    EmbeddingStore(tmp_path, "model", 4).put(["a"], vectors(1))
+
+    assert EmbeddingStore(tmp_path, "model", 2).get(["a"])[1] == [0]
+    assert EmbeddingStore(tmp_path, "other", 4).get(["a"])[1] == [0]
+
+
+@pytest.mark.parametrize(
+    "vector_bytes, key_bytes",
+    [
+        # A vector written without its key
+        (16, 0),
+        # Half a vector, or half a key
+        (7, 0),
+        (16, 9),
+    ],
+)
+def test_torn_rows_are_truncated(tmp_path, vector_bytes, key_bytes):
+    store = EmbeddingStore(tmp_path, "model", 4)
+    store.put(["a"], vectors(1))
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\x01" * vector_bytes)
+    with open(store.keys_path, "ab") as f:
+        f.write(b"\x01" * key_bytes)
+
+    store = EmbeddingStore(tmp_path, "model", 4)
+    store.put(["b"], vectors(2)[1:])
+
+    found, missing = EmbeddingStore(tmp_path, "model", 4).get(["a", "b"])
+    assert missing == []
+    np.testing.assert_array_equal(found, vectors(2))
+
+
+def test_offline_run_needs_every_text(ingest):
+    features = [feature(i) for i in range(12)]
+
+    with pytest.raises(SystemExit, match="not in the embedding store"):
+        ingest.run(features, "--offline")
+    assert not ingest.client.get_collections().collections
+
+    ingest.run(features)
+    # Without an OpenAI client
+    ingest.run(features, "--mode", "rebuild", "--offline")
+
+    assert len(list_versions(ingest.client)) == 2
@@ -0,0 +1,91 @@
+import json
+import urllib.request
+import numpy as np
+import pytest
+from openai import OpenAI
+from fake_openai import Cassette, fake_embedding, start_fake_server
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(**kwargs) -> OpenAI:
+        server, base_url = start_fake_server(**kwargs)
+        servers.append(server)
+        return OpenAI(api_key="test", base_url=base_url, max_retries=0)
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def post(client: OpenAI, path: str, body: dict) -> dict:
+    request = urllib.request.Request(
+        f"{client.base_url}{path.removeprefix('/')}",
+        data=json.dumps(body).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def test_embeddings_are_deterministic(serve):
+    client = serve()
+
+    response = client.embeddings.create(
+        input=["a", "b", "a"], model="text-embedding-3-small", dimensions=8
+    )
+
+    vectors = [np.array(d.embedding) for d in response.data]
+    assert [d.index for d in response.data] == [0, 1, 2]
+    np.testing.assert_allclose(vectors[0], vectors[2])
+    np.testing.assert_allclose(vectors[1], fake_embedding("b", 8), rtol=1e-6)
+    assert np.linalg.norm(vectors[0]) == pytest.approx(1.0, rel=1e-5)
+
+
+def test_chat_completions(serve):
+    client = serve(answer_tokens=5)
+    messages = [{"role": "user", "content": "q"}]
+
+    intent = client.chat.completions.create(
+        model="gpt", messages=messages, response_format={"type": "json_object"}
+    )
+    stream = client.chat.completions.create(
+        model="gpt",
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    chunks = list(stream)
+
+    assert intent.choices[0].message.content == "{}"
+    content = [c.choices[0].delta.content for c in chunks if c.choices]
+    assert len([token for token in content if token]) == 5
+    assert chunks[-1].usage.completion_tokens == 5
+
+
+def test_cassette_replays_recorded_responses(serve, tmp_path):
+    body = {"model": "gpt", "messages": [{"role": "user", "content": "q"}]}
+    recorded = {"id": "recorded", "choices": []}
+    cassette = Cassette(tmp_path / "cassette.json")
+    cassette.put(
+        Cassette.key("/v1/chat/completions", body),
+        {
+            "status": 200,
+            "content_type": "application/json",
+            "body": json.dumps(recorded),
+            "elapsed_seconds": 0.5,
+        },
+    )
+
+    # Another run, reading the file
+    cassette = Cassette(tmp_path / "cassette.json")
+    client = serve(cassette=cassette)
+
+    assert post(client, "/chat/completions", body) == recorded
+    other = {**body, "messages": [{"role": "user", "content": "other"}]}
+    assert post(client, "/chat/completions", other)["id"] == "chatcmpl-fake"
+    assert (cassette.hits, cassette.misses) == (1, 1)
@@ -0,0 +1,170 @@
+import pytest
+from conftest import feature
+from qdrant_client import models
+from init_qdrant import (
+    ANSWER_CACHE_COLLECTION,
+    COLLECTION_NAME,
+    VERSION_PREFIX,
+    is_ready,
+    list_versions,
+    live_collection,
+)
+
+
+def points(client) -> dict:
+    records, _ = client.scroll(
+        collection_name=COLLECTION_NAME, limit=100, with_vectors=True
+    )
+    return {record.payload["address"]: record for record in records}
+
+
+def test_unchanged_points_are_skipped(ingest, capsys):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+    sent = len(ingest.openai.texts)
+
+    ingest.run(features)
+
+    assert sent == 12
+    assert len(ingest.openai.texts) == sent
+    assert (
+        "upserted 0 points, updated the payload of 0 points" in capsys.readouterr().out
+    )
+
+
+def test_only_changed_texts_are_embedded(ingest, capsys):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+    before = points(ingest.client)
+    ingest.openai.texts.clear()
+
+    # The location is not part of the text; the usage detail is
+    moved = feature(0)
+    moved["geometry"]["coordinates"] = [139.9, 35.9]
+    features[0] = moved
+    features[1] = feature(1, L01_029="店舗")
+    ingest.run(features)
+    after = points(ingest.client)
+
+    assert len(ingest.openai.texts) == 1
+    assert "具体的には店舗として" in ingest.openai.texts[0]
+    assert (
+        "upserted 1 points, updated the payload of 1 points" in capsys.readouterr().out
+    )
+
+    address = feature(0)["properties"]["L01_025"]
+    assert after[address].payload["location"] == {"lat": 35.9, "lon": 139.9}
+    assert after[address].vector == before[address].vector
+    address = feature(1)["properties"]["L01_025"]
+    assert after[address].vector != before[address].vector
+
+
+def test_removed_points_are_deleted(ingest, capsys):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+
+    ingest.run(features[1:])
+
+    assert len(points(ingest.client)) == 11
+    assert "deleted 1 points" in capsys.readouterr().out
+
+
+def test_rebuild_swaps_the_alias(ingest):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+    first = live_collection(ingest.client)
+
+    ingest.run(features, "--mode", "rebuild")
+    second = live_collection(ingest.client)
+
+    assert first.startswith(VERSION_PREFIX)
+    assert second.startswith(VERSION_PREFIX)
+    assert first < second
+    assert list_versions(ingest.client) == [first, second]
+    assert is_ready(ingest.client, second)
+    # The server queries the alias
+    assert ingest.client.count(collection_name=COLLECTION_NAME).count == 12
+
+
+def test_rollback(ingest, capsys):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+    ingest.run(features, "--mode", "rebuild")
+    first, second = list_versions(ingest.client)
+
+    ingest.run(features, "--rollback")
+
+    assert live_collection(ingest.client) == first
+    assert f"now points to {first} (was {second})" in capsys.readouterr().out
+    with pytest.raises(SystemExit, match="No version before"):
+        ingest.run(features, "--rollback")
+
+
+def test_rollback_skips_failed_builds(ingest):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+    ingest.run(features, "--mode", "rebuild")
+    first = list_versions(ingest.client)[0]
+    # Between the two, as if a build had failed before the last one
+    ingest.client.create_collection(
+        collection_name=f"{first}_failed",
+        vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE),
+    )
+
+    ingest.run(features, "--rollback")
+
+    assert live_collection(ingest.client) == first
+
+
+def test_prune_versions(ingest):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+    for _ in range(3):
+        ingest.run(features, "--mode", "rebuild", "--keep-versions", "1")
+
+    assert len(list_versions(ingest.client)) == 2
+    assert list_versions(ingest.client)[-1] == live_collection(ingest.client)
+
+
+def test_prune_versions_deletes_failed_builds(ingest):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+    first = live_collection(ingest.client)
+    failed = f"{first}_failed"
+    ingest.client.create_collection(
+        collection_name=failed,
+        vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE),
+    )
+
+    ingest.run(features, "--mode", "rebuild")
+
+    assert failed not in list_versions(ingest.client)
+    assert first in list_versions(ingest.client)
+
+
+def test_plain_collection_becomes_an_alias(ingest):
+    ingest.client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE),
+    )
+    assert live_collection(ingest.client) == COLLECTION_NAME
+
+    ingest.run([feature(i) for i in range(12)], "--mode", "rebuild")
+
+    assert live_collection(ingest.client).startswith(VERSION_PREFIX)
+    assert ingest.client.count(collection_name=COLLECTION_NAME).count == 12
+
+
+def test_changes_drop_the_answer_cache(ingest):
+    features = [feature(i) for i in range(12)]
+    ingest.run(features)
+    ingest.client.create_collection(
+        collection_name=ANSWER_CACHE_COLLECTION,
+        vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE),
+    )
+
+    ingest.run(features)
+    assert ingest.client.collection_exists(collection_name=ANSWER_CACHE_COLLECTION)
+
+    ingest.run(features[1:])
+    assert not ingest.client.collection_exists(collection_name=ANSWER_CACHE_COLLECTION)
@@ -0,0 +1,48 @@
+import json
+import numpy as np
+from conftest import feature
+from init_qdrant import percentile_rank, prepare_payloads, scan_features
+
+
+def test_percentile_rank_counts_values_strictly_below():
+    values = np.array([300, 100, 200, 200, 500, 100])
+
+    ranks = percentile_rank(np.sort(values), values)
+
+    expected = [(values < v).sum() / len(values) * 100 for v in values]
+    assert ranks.tolist() == expected
+
+
+def test_windows_use_dataset_wide_statistics():
+    # Repeated prices, as in the real data
+    features = [feature(i, L01_008=100_000 * (i % 40 + 1)) for i in range(200)]
+    stats = scan_features(features)
+
+    whole = prepare_payloads(features, stats)
+    windows = [
+        payload
+        for start in range(0, len(features), 64)
+        for payload in prepare_payloads(features[start : start + 64], stats)
+    ]
+
+    assert windows == whole
+
+
+def test_payload_fields():
+    features = [feature(i) for i in range(200)]
+    prices = np.array([f["properties"]["L01_008"] for f in features])
+
+    payloads = prepare_payloads(features, scan_features(features))
+
+    for price, payload in zip(prices, payloads):
+        assert payload["price"] == price
+        assert payload["price_percentile"] == (prices < price).sum() / 200 * 100
+        assert payload["is_top_1_percent_price"] == (price >= np.percentile(prices, 99))
+        assert payload["is_max_price"] == (price == prices.max())
+        assert 1 <= payload["price_tier"] <= 5
+        assert payload["time_to_station"] == -(-payload["distance_to_station"] // 80)
+    assert sum(payload["is_top_1_percent_price"] for payload in payloads) == 2
+    # Plain Python values only, so that the payload can be serialized
+    json.dumps(payloads)
+    assert type(payloads[0]["price"]) is int
+    assert type(payloads[0]["is_max_price"]) is bool
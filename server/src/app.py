@@ -0,0 +1,219 @@
+"""
+ASGI entry point for running the API as a long-lived local server, e.g.
+
+    uvicorn app:app --app-dir src --port 3001
+
+Besides the endpoints served by the Lambda handlers, it exposes
+POST /messages/stream, which sends the answer as server-sent events.
+POST /messages/batch is served when an answer_batch function is given.
+"""
+
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional
+from pydantic import ValidationError
+from core.cors import CORS_HEADERS
+from core.logger import logger
+from messages.model import (
+    PostMessageRequest,
+    PostMessageResponse,
+    PostMessagesBatchRequest,
+    PostMessagesBatchResponse,
+)
+from messages.service import answer_message, stream_message_service
+from messages.service_batch import answer_messages
+
+Receive = Callable[[], Awaitable[dict]]
+Send = Callable[[dict], Awaitable[None]]
+
+
+def encode_headers(headers: dict[str, str]) -> list[tuple[bytes, bytes]]:
+    return [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+
+
+def encode_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+async def read_body(receive: Receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_json(send: Send, status: int, data: dict | str) -> None:
+    body = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": encode_headers(
+                {**CORS_HEADERS, "Content-Type": "application/json"}
+            ),
+        }
+    )
+    await send({"type": "http.response.body", "body": body.encode()})
+
+
+async def iterate_in_thread(tokens: Iterator[str]) -> AsyncIterator[str]:
+    try:
+        while (token := await asyncio.to_thread(next, tokens, None)) is not None:
+            yield token
+    finally:
+        tokens.close()
+
+
+async def send_stream(send: Send, tokens: AsyncIterator[str]) -> None:
+    start = time.perf_counter()
+    time_to_first_byte = None
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": encode_headers(
+                {
+                    **CORS_HEADERS,
+                    "Content-Type": "text/event-stream",
+                    "Cache-Control": "no-cache",
+                }
+            ),
+        }
+    )
+
+    response = ""
+
+    try:
+        async for token in tokens:
+            response += token
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": encode_event("token", {"token": token}),
+                    "more_body": True,
+                }
+            )
+            if time_to_first_byte is None:
+                time_to_first_byte = round((time.perf_counter() - start) * 1000, 1)
+
+        event = encode_event("done", {"response": response})
+    except Exception:
+        event = encode_event("error", {"message": "Internal Server Error"})
+    finally:
+        await tokens.aclose()
+
+    await send({"type": "http.response.body", "body": event})
+
+    logger.info(
+        {
+            "event": "stream_message",
+            "time_to_first_byte_ms": time_to_first_byte,
+            "total_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+    )
+
+
+async def send_batch(
+    receive: Receive,
+    send: Send,
+    answer_batch: Callable[
+        [PostMessagesBatchRequest], Awaitable[PostMessagesBatchResponse]
+    ],
+) -> None:
+    try:
+        body = PostMessagesBatchRequest.model_validate_json(await read_body(receive))
+    except ValidationError as e:
+        await send_json(send, 400, {"message": str(e)})
+        return
+
+    logger.info(
+        {
+            "event": "validate_post_messages_batch_request",
+            "messages": len(body.messages),
+        }
+    )
+
+    try:
+        response = await answer_batch(body)
+    except Exception:
+        logger.exception("Failed to post a batch of messages")
+        await send_json(send, 500, {"message": "Internal Server Error"})
+        return
+
+    await send_json(send, 200, response.model_dump_json())
+
+
+def create_app(
+    answer: Callable[[PostMessageRequest], Awaitable[PostMessageResponse]],
+    stream: Callable[[PostMessageRequest], AsyncIterator[str]],
+    shutdown: Optional[Callable[[], Awaitable[None]]] = None,
+    answer_batch: Optional[
+        Callable[[PostMessagesBatchRequest], Awaitable[PostMessagesBatchResponse]]
+    ] = None,
+):
+    async def app(scope: dict, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    if shutdown is not None:
+                        await shutdown()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        method = scope["method"]
+        path = scope["path"].rstrip("/")
+
+        if method == "OPTIONS":
+            await send_json(send, 204, "")
+            return
+
+        if method == "GET" and path == "/health":
+            logger.info({"event": "health_check"})
+            await send_json(send, 200, {"message": "pong"})
+            return
+
+        if method == "POST" and path == "/messages/batch" and answer_batch:
+            await send_batch(receive, send, answer_batch)
+            return
+
+        if method != "POST" or path not in ("/messages", "/messages/stream"):
+            await send_json(send, 404, {"message": "Not Found"})
+            return
+
+        try:
+            body = PostMessageRequest.model_validate_json(await read_body(receive))
+        except ValidationError as e:
+            await send_json(send, 400, {"message": str(e)})
+            return
+
+        logger.info({"event": "validate_post_message_request", "body": body})
+
+        if path == "/messages/stream":
+            await send_stream(send, stream(body))
+            return
+
+        try:
+            response = await answer(body)
+        except Exception:
+            logger.exception("Failed to post a message")
+            await send_json(send, 500, {"message": "Internal Server Error"})
+            return
+
+        await send_json(send, 200, response.model_dump_json())
+
+    return app
+
+
+# The sync pipeline runs in worker threads
+app = create_app(
+    answer=lambda body: asyncio.to_thread(answer_message, body),
+    stream=lambda body: iterate_in_thread(stream_message_service(body)),
+    answer_batch=lambda body: asyncio.to_thread(answer_messages, body),
+)
@@ -0,0 +1,25 @@
+"""
+ASGI entry point for long-running deployments next to Qdrant, e.g. on
+Fly.io (fly.toml):
+
+    uvicorn app_async:app --app-dir src --port 8080
+
+Same endpoints as app.py, but the pipeline runs on the event loop
+(messages/service_async.py) instead of in worker threads: the OpenAI and
+Qdrant clients keep pooled HTTP/2 connections open across requests, and the
+embeddings of concurrent requests are sent as one batch. The connections are
+closed on shutdown.
+"""
+
+from app import create_app
+from messages.service_async import (
+    answer_message_async,
+    close_clients,
+    stream_message_async,
+)
+
+app = create_app(
+    answer=answer_message_async,
+    stream=stream_message_async,
+    shutdown=close_clients,
+)
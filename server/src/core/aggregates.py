@@ -0,0 +1,235 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from qdrant_client.http.models import ScoredPoint
+from .context import render_contexts
+from .logger import logger
+from .qdrant import RetrievalResult, SearchIntent
+
+# Written by scripts/init_qdrant.py at ingest time.
+AGGREGATES_PATH = Path(
+    os.getenv(
+        "AGGREGATES_PATH",
+        str(Path(__file__).resolve().parents[1] / "data" / "aggregates.json"),
+    )
+)
+
+# Groups with fewer points are left out of rankings, so that a station with a
+# single expensive point does not top "which station is the most expensive".
+MIN_RANKED_GROUP_SIZE = 3
+RANKED_GROUPS = 5
+
+# Filters the aggregates cannot apply; questions with them are searched.
+UNSUPPORTED_FIELDS = ("usage", "time_to_station_max")
+
+WARD_GROUP_PATTERN = re.compile(
+    r"どの(?:区|市|町|村|自治体|エリア|地域)"
+    r"|(?:区|市区町村|自治体|エリア|地域)(?:はどこ|別|ごと)"
+    r"|\b(?:which|what) (?:wards?|areas?|cities|municipalit(?:y|ies)|districts?"
+    r"|neighbou?rhoods?|regions?)\b",
+    re.IGNORECASE,
+)
+STATION_GROUP_PATTERN = re.compile(
+    r"どの駅|駅(?:別|ごと)|\b(?:which|what) stations?\b", re.IGNORECASE
+)
+STATISTICS_PATTERN = re.compile(
+    r"平均|中央値|相場|傾向|動向|推移|統計|いくら|どのくらい|どれくらい"
+    r"|average|median|typical|trend|statistic|how much|price level",
+    re.IGNORECASE,
+)
+# Statistics of all of Tokyo are only given when the question asks for them;
+# "the typical price near a park" is left to the search. Landmarks named
+# after Tokyo do not count.
+TOKYO_PATTERN = re.compile(
+    r"東京都|都内|都全体|東京(?!駅|タワー|ドーム|湾|スカイツリー)"
+    r"|\bTokyo\b(?![ -](?:Tower|Station|Dome|Bay|Skytree))",
+    re.IGNORECASE,
+)
+
+GROUP_HEADER = (
+    "{label}|地点数|平均地価(円/㎡)|中央値|最高|最低"
+    "|平均変動率(%)|変動率10〜90%|上昇地点|下落地点"
+)
+
+
+@dataclass
+class Aggregates:
+    overall: dict
+    wards: dict[str, dict]
+    stations: dict[str, dict]
+    points: dict[str, dict]
+
+
+@lru_cache(maxsize=1)
+def load_aggregates() -> Optional[Aggregates]:
+    try:
+        with open(AGGREGATES_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.warning({"event": "aggregates_not_found", "path": str(AGGREGATES_PATH)})
+        return None
+
+    return Aggregates(**data)
+
+
+def superlative(intent: SearchIntent) -> Optional[tuple[str, Optional[str]]]:
+    """
+    (ranking, flag) for the require_* field of the intent, e.g.
+    ("top_price", "is_top_1_percent_price"); flag is None for max / min.
+    """
+    for target in ("price", "change_rate"):
+        if intent.get(f"require_max_{target}"):
+            return f"top_{target}", None
+        if intent.get(f"require_min_{target}"):
+            return f"bottom_{target}", None
+        if intent.get(f"require_top_1_percent_{target}"):
+            return f"top_{target}", f"is_top_1_percent_{target}"
+        if intent.get(f"require_bottom_1_percent_{target}"):
+            return f"bottom_{target}", f"is_bottom_1_percent_{target}"
+    return None
+
+
+def named_only_as_tokyo(question: str, name: str) -> bool:
+    """
+    Whether every mention of name in the question is part of a mention of
+    Tokyo, like 東京 in 東京都 (which an intent may read as 東京 station).
+    """
+    tokyo = [match.span() for match in TOKYO_PATTERN.finditer(question)]
+    mentions = [match.span() for match in re.finditer(re.escape(name), question)]
+    return bool(mentions) and all(
+        any(start <= begin and end <= stop for start, stop in tokyo)
+        for begin, end in mentions
+    )
+
+
+def render_group(name: str, stats: dict) -> str:
+    price, change_rate = stats["price"], stats["change_rate"]
+    return "|".join(
+        [
+            name,
+            str(stats["count"]),
+            f"{price['mean']:,.0f}",
+            f"{price['median']:,.0f}",
+            f"{price['max']:,}",
+            f"{price['min']:,}",
+            f"{change_rate['mean']:+.1f}",
+            f"{change_rate['p10']:+.1f}〜{change_rate['p90']:+.1f}",
+            str(change_rate["rising"]),
+            str(change_rate["falling"]),
+        ]
+    )
+
+
+def top_points(
+    aggregates: Aggregates, stats: dict, ranking: str, flag: Optional[str] = None
+) -> list[ScoredPoint]:
+    key = "price" if ranking.endswith("price") else "change_rate"
+    hits = []
+    for pid in stats[ranking]:
+        point = aggregates.points[pid]
+        if flag is None or point.get(flag):
+            hits.append(
+                ScoredPoint(id=pid, version=0, score=float(point[key]), payload=point)
+            )
+    return hits
+
+
+def rank_groups(
+    groups: dict[str, dict], label: str, ranking: str
+) -> Optional[list[str]]:
+    key = "price" if ranking.endswith("price") else "change_rate"
+    ranked = sorted(
+        (
+            (name, stats)
+            for name, stats in groups.items()
+            if stats["count"] >= MIN_RANKED_GROUP_SIZE
+        ),
+        key=lambda item: item[1][key]["mean"],
+        reverse=ranking.startswith("top"),
+    )[:RANKED_GROUPS]
+    if not ranked:
+        return None
+
+    order = "高い" if ranking.startswith("top") else "低い"
+    metric = "平均地価" if key == "price" else "平均変動率"
+    rows = [render_group(name, stats) for name, stats in ranked]
+    return [
+        "\n".join(
+            [f"{label}別 {metric}の{order}順", GROUP_HEADER.format(label=label), *rows]
+        )
+    ]
+
+
+def retrieve_aggregates(
+    question: str, intent: SearchIntent
+) -> Optional[RetrievalResult]:
+    """
+    Contexts for questions the aggregates computed at ingest time answer
+    without a vector search:
+
+    - rankings of wards or stations ("which ward has the highest prices"),
+    - superlatives within Tokyo, a ward or a station ("the cheapest land in
+      Setagaya"), from the top points of the group,
+    - statistics of Tokyo, a ward or a station ("average price in Minato");
+      Tokyo only when the question names it.
+
+    Returns None for anything else, including questions with filters the
+    aggregates cannot apply (usage, walking time).
+    """
+    aggregates = load_aggregates()
+    if aggregates is None:
+        return None
+    if any(intent.get(key) for key in UNSUPPORTED_FIELDS):
+        return None
+
+    ward, station = intent.get("ward"), intent.get("station")
+    if station and named_only_as_tokyo(question, station):
+        station = None
+    if ward and station:
+        return None
+
+    wanted = superlative(intent)
+
+    if not ward and not station and wanted is not None:
+        if WARD_GROUP_PATTERN.search(question):
+            contexts = rank_groups(aggregates.wards, "区市町村", wanted[0])
+            return RetrievalResult(contexts=contexts, hits=[]) if contexts else None
+        if STATION_GROUP_PATTERN.search(question):
+            contexts = rank_groups(aggregates.stations, "最寄駅", wanted[0])
+            return RetrievalResult(contexts=contexts, hits=[]) if contexts else None
+
+    if ward:
+        name, stats = ward, aggregates.wards.get(ward)
+    elif station:
+        name, stats = station, aggregates.stations.get(station)
+    else:
+        name, stats = "東京都", aggregates.overall
+    if stats is None:
+        return None
+
+    if wanted is not None:
+        hits = top_points(aggregates, stats, *wanted)
+        if not hits:
+            return None
+        # Always a table: the aggregates do not keep semantic_text
+        return RetrievalResult(contexts=render_contexts(hits, "table"), hits=hits)
+
+    if STATISTICS_PATTERN.search(question):
+        if not ward and not station and not TOKYO_PATTERN.search(question):
+            return None
+
+        hits = top_points(aggregates, stats, "top_price")
+        label = "最寄駅" if station else "区市町村"
+        summary = "\n".join(
+            [GROUP_HEADER.format(label=label), render_group(name, stats)]
+        )
+        points = [
+            f"地価上位の地点\n{table}" for table in render_contexts(hits, "table")
+        ]
+        return RetrievalResult(contexts=[summary, *points], hits=hits)
+
+    return None
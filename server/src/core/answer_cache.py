@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional, Protocol
+import numpy as np
+from qdrant_client import QdrantClient, models
+from qdrant_client.http.models import Filter, ScoredPoint
+from .logger import logger
+from .telemetry import add
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+# Dropped by scripts/init_qdrant.py whenever ingestion changes the data.
+ANSWER_CACHE_COLLECTION = "tokyo_landprice_rag_answers"
+
+
+def bucket_key(
+    query_filter: Optional[Filter], hits: list[ScoredPoint], language: Optional[str]
+) -> str:
+    """
+    Answers can only be reused for the same filter, language and retrieved
+    points. The content hash of each point is part of the key, so an answer
+    is never reused once ingestion changed one of its contexts.
+    """
+    points = sorted(
+        f"{hit.id}:{(hit.payload or {}).get('content_hash')}" for hit in hits
+    )
+    content = {
+        "filter": query_filter.model_dump(mode="json", exclude_none=True)
+        if query_filter is not None
+        else None,
+        "points": points,
+        "language": language,
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+class AnswerCacheBackend(Protocol):
+    def search(
+        self, bucket: str, vector: list[float], threshold: float
+    ) -> Optional[tuple[float, str]]: ...
+
+    def add(self, bucket: str, vector: list[float], answer: str) -> None: ...
+
+
+MAX_BUCKET_ENTRIES = 32
+
+
+class MemoryAnswerBackend:
+    """
+    Per-container store. Buckets are evicted least recently used first once
+    there are more than max_buckets of them, and keep their
+    MAX_BUCKET_ENTRIES most recent questions.
+    """
+
+    def __init__(self, max_buckets: int, ttl_seconds: float):
+        self.max_buckets = max_buckets
+        self.ttl_seconds = ttl_seconds
+        self._buckets: OrderedDict[str, list[tuple[float, np.ndarray, str]]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def search(
+        self, bucket: str, vector: list[float], threshold: float
+    ) -> Optional[tuple[float, str]]:
+        query = np.asarray(vector, dtype=np.float32)
+        now = time.time()
+
+        with self._lock:
+            entries = self._buckets.get(bucket)
+            if not entries:
+                return None
+
+            entries[:] = [entry for entry in entries if entry[0] > now]
+            self._buckets.move_to_end(bucket)
+
+            best: Optional[tuple[float, str]] = None
+            for _, cached_vector, answer in entries:
+                score = cosine_similarity(query, cached_vector)
+                if score >= threshold and (best is None or score > best[0]):
+                    best = (score, answer)
+
+            return best
+
+    def add(self, bucket: str, vector: list[float], answer: str) -> None:
+        entry = (
+            time.time() + self.ttl_seconds,
+            np.asarray(vector, dtype=np.float32),
+            answer,
+        )
+        with self._lock:
+            entries = self._buckets.setdefault(bucket, [])
+            entries.append(entry)
+            del entries[:-MAX_BUCKET_ENTRIES]
+            self._buckets.move_to_end(bucket)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+
+
+class QdrantAnswerBackend:
+    """
+    Shared store in a separate Qdrant collection, created on first use.
+    Expired points are filtered out on search; the collection itself is
+    dropped by ingestion.
+    """
+
+    def __init__(self, get_client: Callable[[], QdrantClient], ttl_seconds: float):
+        self.get_client = get_client
+        self.ttl_seconds = ttl_seconds
+        self._ready = False
+
+    def _ensure_collection(self, vector_size: int) -> None:
+        if self._ready:
+            return
+
+        if not self.get_client().collection_exists(
+            collection_name=ANSWER_CACHE_COLLECTION
+        ):
+            self.get_client().create_collection(
+                collection_name=ANSWER_CACHE_COLLECTION,
+                vectors_config=models.VectorParams(
+                    size=vector_size,
+                    distance=models.Distance.COSINE,
+                ),
+            )
+            self.get_client().create_payload_index(
+                collection_name=ANSWER_CACHE_COLLECTION,
+                field_name="bucket",
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+        self._ready = True
+
+    def search(
+        self, bucket: str, vector: list[float], threshold: float
+    ) -> Optional[tuple[float, str]]:
+        self._ensure_collection(len(vector))
+        hits = (
+            self.get_client()
+            .query_points(
+                collection_name=ANSWER_CACHE_COLLECTION,
+                query=vector,
+                query_filter=Filter(
+                    must=[
+                        models.FieldCondition(
+                            key="bucket", match=models.MatchValue(value=bucket)
+                        ),
+                        models.FieldCondition(
+                            key="expires_at", range=models.Range(gt=time.time())
+                        ),
+                    ]
+                ),
+                score_threshold=threshold,
+                limit=1,
+                with_payload=["answer"],
+                with_vectors=False,
+            )
+            .points
+        )
+
+        if not hits:
+            return None
+        return hits[0].score, hits[0].payload["answer"]
+
+    def add(self, bucket: str, vector: list[float], answer: str) -> None:
+        self._ensure_collection(len(vector))
+        self.get_client().upsert(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            points=[
+                models.PointStruct(
+                    id=str(uuid.uuid4()),
+                    vector=vector,
+                    payload={
+                        "bucket": bucket,
+                        "answer": answer,
+                        "expires_at": time.time() + self.ttl_seconds,
+                    },
+                )
+            ],
+        )
+
+
+class AnswerCache:
+    def __init__(self, backend: Optional[AnswerCacheBackend], threshold: float):
+        self.backend = backend
+        self.threshold = threshold
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, bucket: str, vector: list[float]) -> Optional[str]:
+        if self.backend is None:
+            return None
+
+        found = None
+        try:
+            found = self.backend.search(bucket, vector, self.threshold)
+        except Exception as e:
+            logger.warning({"event": "answer_cache_error", "error": str(e)})
+
+        self.stats["hits" if found else "misses"] += 1
+        add(**{"hits" if found else "misses": 1})
+        lookups = self.stats["hits"] + self.stats["misses"]
+        logger.info(
+            {
+                "event": "answer_cache",
+                "result": "hit" if found else "miss",
+                "score": found[0] if found else None,
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 3),
+            }
+        )
+        return found[1] if found else None
+
+    def set(self, bucket: str, vector: list[float], answer: str) -> None:
+        if self.backend is None:
+            return
+
+        try:
+            self.backend.add(bucket, vector, answer)
+        except Exception as e:
+            logger.warning({"event": "answer_cache_error", "error": str(e)})
+
+
+def create_answer_cache(get_client: Callable[[], QdrantClient]) -> AnswerCache:
+    ttl_seconds = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(DEFAULT_TTL_SECONDS)))
+    threshold = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+    backend_name = os.getenv("ANSWER_CACHE_BACKEND", "memory")
+    backend: Optional[AnswerCacheBackend] = None
+
+    if backend_name == "memory":
+        backend = MemoryAnswerBackend(
+            max_buckets=int(os.getenv("ANSWER_CACHE_SIZE", "1024")),
+            ttl_seconds=ttl_seconds,
+        )
+    elif backend_name == "qdrant":
+        backend = QdrantAnswerBackend(get_client, ttl_seconds)
+    elif backend_name != "none":
+        raise ValueError(f"Invalid ANSWER_CACHE_BACKEND value: {backend_name}")
+
+    return AnswerCache(backend=backend, threshold=threshold)
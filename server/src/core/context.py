@@ -0,0 +1,99 @@
+import os
+import re
+from qdrant_client.http.models import ScoredPoint
+
+# table: one dense row per point, rendered from the payload
+# text: the semantic_text that was embedded, as before
+CONTEXT_FORMAT = os.getenv("CONTEXT_FORMAT", "table")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+TABLE_HEADER = "区市町村|所在地|最寄駅|徒歩(分)|用途|地価(円/㎡)|地価順位|変動率(%)"
+
+# The payload fields each format reads, so that retrieval fetches only those
+CONTEXT_FIELDS = {
+    "table": [
+        "ward",
+        "address",
+        "station",
+        "time_to_station",
+        "usage",
+        "price",
+        "price_percentile",
+        "change_rate",
+    ],
+    "text": ["semantic_text"],
+}
+
+
+def context_fields(context_format: str = CONTEXT_FORMAT) -> list[str]:
+    if context_format not in CONTEXT_FIELDS:
+        raise ValueError(f"Invalid CONTEXT_FORMAT value: {context_format}")
+    return CONTEXT_FIELDS[context_format]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer: about 4 ASCII characters per
+    token, and one token per Japanese character.
+    """
+    ascii_chars = sum(ch.isascii() for ch in text)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def short_address(address: str, ward: str) -> str:
+    """
+    東京都　千代田区富士見１丁目８番６ → 富士見１丁目
+    """
+    address = "".join(address.split()).removeprefix("東京都").removeprefix(ward)
+    if "丁目" in address:
+        return re.sub(r"(.*?丁目).*", r"\1", address)
+    return re.split(r"[0-9０-９]", address, maxsplit=1)[0]
+
+
+def render_row(payload: dict) -> str:
+    ward = payload.get("ward", "")
+    top_percent = max(1, round(100 - payload["price_percentile"]))
+    return "|".join(
+        [
+            ward,
+            short_address(payload.get("address", ""), ward),
+            payload["station"],
+            str(payload["time_to_station"]),
+            payload["usage"],
+            f"{payload['price']:,}",
+            f"上位{top_percent}%",
+            f"{payload['change_rate']:+.1f}",
+        ]
+    )
+
+
+def render_contexts(
+    hits: list[ScoredPoint],
+    context_format: str = CONTEXT_FORMAT,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+) -> list[str]:
+    """
+    Contexts for the answer prompt, in order of the hits. Points that would
+    render the same are only kept once, and points are dropped from the end
+    once the token budget is used up (the first one is always kept).
+    """
+    if context_format == "table":
+        entries = [render_row(hit.payload) for hit in hits]
+        used = estimate_tokens(TABLE_HEADER)
+    elif context_format == "text":
+        entries = [hit.payload["semantic_text"] for hit in hits]
+        used = 0
+    else:
+        raise ValueError(f"Invalid CONTEXT_FORMAT value: {context_format}")
+
+    kept: list[str] = []
+    for entry in dict.fromkeys(entries):
+        tokens = estimate_tokens(entry)
+        if kept and used + tokens > token_budget:
+            break
+        kept.append(entry)
+        used += tokens
+
+    if context_format == "table" and kept:
+        return ["\n".join([TABLE_HEADER, *kept])]
+    return kept
@@ -0,0 +1,20 @@
+from functools import lru_cache
+from .env import environment
+
+
+@lru_cache(maxsize=None)
+def dynamodb_table(table_name: str):
+    import boto3
+
+    # localstack
+    if environment == "localstack":
+        resource = boto3.resource(
+            "dynamodb",
+            region_name="ap-northeast-1",
+            endpoint_url="http://localstack-tokyo-landprice-rag:4566",
+        )
+    # prod
+    else:
+        resource = boto3.resource("dynamodb", region_name="ap-northeast-1")
+
+    return resource.Table(table_name)
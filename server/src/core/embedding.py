@@ -0,0 +1,13 @@
+# The embedding model and its dimensionality, shared by the ingestion
+# (scripts/init_qdrant.py), the collection schema and query embedding, so
+# that the stored and the query vectors always match.
+#
+# text-embedding-3-small returns shortened vectors for any `dimensions` up to
+# 1536; scripts/bench_dimensions.py measures what smaller vectors cost in
+# recall. Changing this requires `init_qdrant.py --mode rebuild`.
+EMBED_MODEL = "text-embedding-3-small"
+EMBED_DIMENSIONS = 1536
+
+# Identifies the vectors in caches, so that cached vectors of another size are
+# never returned
+EMBED_VERSION = f"{EMBED_MODEL}-{EMBED_DIMENSIONS}"
@@ -0,0 +1,83 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Optional
+from .logger import logger
+from .telemetry import record
+
+EmbedBatch = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+
+class EmbeddingBatcher:
+    """
+    Gathers the embed() calls of concurrent requests on the async server and
+    sends them as one embeddings request: a batch is sent max_wait_ms after
+    its first text arrived, or as soon as it holds max_batch_size texts.
+    Identical texts in a batch are embedded once.
+
+    A failed request fails every caller in its batch.
+    """
+
+    def __init__(
+        self,
+        embed_batch: EmbedBatch,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5,
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self._pending: dict[str, list[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Keeps the running batches from being garbage collected
+        self._batches: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[tuple[list[float], int]] = loop.create_future()
+        self._pending.setdefault(text, []).append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+
+        vector, batch_size = await future
+        record(batch_size=batch_size)
+        return vector
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        # A fresh context, so that the batch is not attributed to the span of
+        # whichever request happened to fill it
+        batch = asyncio.create_task(self._send(pending), context=contextvars.Context())
+        self._batches.add(batch)
+        batch.add_done_callback(self._batches.discard)
+
+    async def _send(self, pending: dict[str, list[asyncio.Future]]) -> None:
+        texts = list(pending)
+        callers = sum(len(futures) for futures in pending.values())
+
+        try:
+            vectors = await self.embed_batch(texts)
+        except Exception as e:
+            logger.warning(
+                {"event": "embed_batch_error", "texts": len(texts), "error": str(e)}
+            )
+            for futures in pending.values():
+                for future in futures:
+                    # Callers that were cancelled meanwhile are skipped
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for text, vector in zip(texts, vectors):
+            for future in pending[text]:
+                if not future.done():
+                    future.set_result((vector, callers))
@@ -0,0 +1,290 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Protocol
+from .dynamodb import dynamodb_table
+from .logger import logger
+from .telemetry import add
+from .text import normalize_question
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def cache_key(model: str, text: str) -> str:
+    normalized = normalize_question(text)
+    return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[list[float]]: ...
+
+    def set(self, key: str, vector: list[float]) -> None: ...
+
+
+class LRUCache:
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._items: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[list[float]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+
+            expires_at, vector = item
+            if expires_at <= time.time():
+                del self._items[key]
+                return None
+
+            self._items.move_to_end(key)
+            return vector
+
+    def set(self, key: str, vector: list[float]) -> None:
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl_seconds, vector)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class SqliteCacheBackend:
+    """
+    File-backed stand-in for the shared backend, used for local runs and tests.
+    Entries are evicted by TTL and, beyond max_entries, least recently used first.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_accessed_at "
+            "ON embeddings (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[list[float]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._conn.execute(
+                "UPDATE embeddings SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+
+        return unpack_vector(row[0])
+
+    def set(self, key: str, vector: list[float]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                (key, pack_vector(vector), now + self.ttl_seconds, now),
+            )
+            self._conn.execute("DELETE FROM embeddings WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                """
+                DELETE FROM embeddings WHERE key IN (
+                    SELECT key FROM embeddings
+                    ORDER BY accessed_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+
+class DynamoDBCacheBackend:
+    """
+    Shared backend that survives Lambda cold starts. DynamoDB TTL removes
+    expired items (with some delay, so expiry is also checked on read), which
+    keeps the table bounded without an explicit size limit.
+    """
+
+    def __init__(self, table_name: str, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.table_name = table_name
+
+    def _table(self):
+        # boto3 is only imported once the table is used
+        return dynamodb_table(self.table_name)
+
+    def get(self, key: str) -> Optional[list[float]]:
+        item = self._table().get_item(Key={"key": key}).get("Item")
+        if item is None or int(item["expires_at"]) <= time.time():
+            return None
+
+        return unpack_vector(item["vector"].value)
+
+    def set(self, key: str, vector: list[float]) -> None:
+        self._table().put_item(
+            Item={
+                "key": key,
+                "vector": pack_vector(vector),
+                "expires_at": int(time.time() + self.ttl_seconds),
+            }
+        )
+
+
+class EmbeddingCache:
+    def __init__(self, memory: LRUCache, shared: Optional[CacheBackend] = None):
+        self.memory = memory
+        self.shared = shared
+        self.stats = {"memory_hits": 0, "shared_hits": 0, "misses": 0}
+
+    def get_or_compute(
+        self, model: str, text: str, compute: Callable[[str], list[float]]
+    ) -> list[float]:
+        key = cache_key(model, text)
+
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+
+        return self._store(key, compute(text))
+
+    def get_or_compute_many(
+        self,
+        model: str,
+        texts: list[str],
+        compute: Callable[[list[str]], list[list[float]]],
+    ) -> list[list[float]]:
+        """
+        get_or_compute() for many texts, with a single compute() call for
+        every text that is not cached.
+        """
+        vectors = [self._lookup(cache_key(model, text)) for text in texts]
+
+        missing = list(
+            dict.fromkeys(
+                text for text, vector in zip(texts, vectors) if vector is None
+            )
+        )
+        if not missing:
+            return vectors
+
+        computed = {
+            text: self._store(cache_key(model, text), vector)
+            for text, vector in zip(missing, compute(missing))
+        }
+        return [
+            vector if vector is not None else computed[text]
+            for text, vector in zip(texts, vectors)
+        ]
+
+    async def get_or_compute_async(
+        self,
+        model: str,
+        text: str,
+        compute: Callable[[str], Awaitable[list[float]]],
+    ) -> list[float]:
+        """
+        get_or_compute() for the async server. The tiers are still read
+        synchronously; only the memory tier is expected there.
+        """
+        key = cache_key(model, text)
+
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+
+        return self._store(key, await compute(text))
+
+    def _lookup(self, key: str) -> Optional[list[float]]:
+        vector = self.memory.get(key)
+        if vector is not None:
+            return self._record("memory_hits", vector)
+
+        if self.shared is not None:
+            try:
+                vector = self.shared.get(key)
+            except Exception as e:
+                logger.warning({"event": "embedding_cache_error", "error": str(e)})
+
+            if vector is not None:
+                self.memory.set(key, vector)
+                return self._record("shared_hits", vector)
+
+        return None
+
+    def _store(self, key: str, vector: list[float]) -> list[float]:
+        self.memory.set(key, vector)
+
+        if self.shared is not None:
+            try:
+                self.shared.set(key, vector)
+            except Exception as e:
+                logger.warning({"event": "embedding_cache_error", "error": str(e)})
+
+        return self._record("misses", vector)
+
+    def _record(self, result: str, vector: list[float]) -> list[float]:
+        self.stats[result] += 1
+        add(**{f"cache_{result}": 1})
+        # The counts of every request are on its trace; this is for local runs
+        logger.debug({"event": "embedding_cache", "result": result, **self.stats})
+        return vector
+
+
+def create_embedding_cache() -> EmbeddingCache:
+    ttl_seconds = float(
+        os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(DEFAULT_TTL_SECONDS))
+    )
+    memory = LRUCache(
+        max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")),
+        ttl_seconds=ttl_seconds,
+    )
+
+    backend = os.getenv("EMBEDDING_CACHE_BACKEND")
+    shared: Optional[CacheBackend] = None
+
+    if backend == "sqlite":
+        shared = SqliteCacheBackend(
+            path=os.getenv("EMBEDDING_CACHE_PATH", "/tmp/embedding_cache.sqlite3"),
+            max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")),
+            ttl_seconds=ttl_seconds,
+        )
+    elif backend == "dynamodb":
+        shared = DynamoDBCacheBackend(
+            table_name=os.environ["EMBEDDING_CACHE_TABLE"],
+            ttl_seconds=ttl_seconds,
+        )
+    elif backend:
+        raise ValueError(f"Invalid EMBEDDING_CACHE_BACKEND value: {backend}")
+
+    return EmbeddingCache(memory=memory, shared=shared)
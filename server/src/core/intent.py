@@ -0,0 +1,326 @@
+import json
+import os
+import re
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from .logger import logger
+from .qdrant import SearchIntent
+from .text import normalize_question
+
+# Written by scripts/init_qdrant.py from the values found in the GeoJSON.
+GAZETTEER_PATH = Path(
+    os.getenv(
+        "GAZETTEER_PATH",
+        str(Path(__file__).resolve().parents[1] / "data" / "gazetteer.json"),
+    )
+)
+
+ADMINISTRATIVE_SUFFIXES = ("区", "市", "町", "村")
+
+# Suffixes tried for a name stored without one (L01_024 holds 港, 北, 多摩...).
+# Tokyo's wards and cities; 町 and 村 are left out because 港町, 中央町 or 北町
+# are place names of their own.
+BARE_NAME_SUFFIXES = ("区", "市")
+
+# Names that are also common words or part of other names (中央線, 多摩川,
+# 千代田線), matched only with their suffix, like single characters (港, 北).
+SUFFIX_REQUIRED_NAMES = {"中央", "多摩", "千代田"}
+
+# Stations matched only as "<name>駅": a bare 東京 (or 東京都) means Tokyo.
+SUFFIX_REQUIRED_STATIONS = {"東京"}
+
+# Same vocabulary as the extract_intent prompt, used when the gazetteer has
+# not been generated yet.
+USAGES = [
+    "住宅",
+    "店舗",
+    "事務所",
+    "銀行",
+    "旅館",
+    "給油所",
+    "工場",
+    "倉庫",
+    "農地",
+    "山林",
+    "医院",
+    "空地",
+    "作業所",
+    "原野",
+    "用材",
+    "雑林",
+]
+
+ENGLISH_USAGES = {
+    "residential": "住宅",
+    "housing": "住宅",
+    "house": "住宅",
+    "homes": "住宅",
+    "shop": "店舗",
+    "store": "店舗",
+    "retail": "店舗",
+    "commercial": "店舗",
+    "office": "事務所",
+    "bank": "銀行",
+    "ryokan": "旅館",
+    "inn": "旅館",
+    "gas station": "給油所",
+    "factory": "工場",
+    "warehouse": "倉庫",
+    "farmland": "農地",
+    "forest": "山林",
+    "clinic": "医院",
+    "vacant": "空地",
+}
+
+TIME_TO_STATION_PATTERNS = [
+    re.compile(r"徒歩\s*(\d+)\s*分"),
+    re.compile(r"駅から\s*(\d+)\s*分"),
+    re.compile(r"(\d+)\s*分以内"),
+    re.compile(r"within\s+(?:a\s+)?(\d+)[\s-]*min(?:ute)?s?", re.IGNORECASE),
+    re.compile(r"(\d+)[\s-]*min(?:ute)?s?\s+(?:walk|on foot)", re.IGNORECASE),
+]
+
+CHANGE_RATE_PATTERN = re.compile(
+    r"変動率|上昇率|下落率|値上がり|値下がり|伸び"
+    r"|change rate|growth|increas|decreas|ris(?:e|ing)|fall|declin|appreciat",
+    re.IGNORECASE,
+)
+TOP_1_PERCENT_PATTERN = re.compile(r"上位\s*1\s*%|top\s*1\s*%", re.IGNORECASE)
+BOTTOM_1_PERCENT_PATTERN = re.compile(r"下位\s*1\s*%|bottom\s*1\s*%", re.IGNORECASE)
+MAX_PATTERN = re.compile(
+    r"(?:最も|一番)[^、。]{0,6}?(?:高|上昇)|最高"
+    r"|highest|most expensive|biggest|largest|fastest",
+    re.IGNORECASE,
+)
+MIN_PATTERN = re.compile(
+    r"(?:最も|一番)[^、。]{0,6}?(?:安|低|下落)|最安|最低"
+    r"|lowest|cheapest|least expensive|smallest|slowest",
+    re.IGNORECASE,
+)
+
+# Capitalized words that are not place names we could resolve. Anything else
+# capitalized in the middle of a sentence is likely a romanized place name
+# (e.g. "Shibuya") that the gazetteer cannot match, so the LLM should decide.
+KNOWN_CAPITALIZED_WORDS = {"I", "Tokyo", "Japan", "JR"}
+CAPITALIZED_WORD_PATTERN = re.compile(r"(?<![.?!]\s)(?<!^)\b[A-Z][a-zA-Z]+\b")
+
+# "駅" after a name, to spot stations that are missing from the gazetteer.
+STATION_SUFFIX_PATTERN = re.compile(r"(?<=[一-鿿゠-ヿぁ-ゟ])駅")
+
+
+class AhoCorasick:
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[str]] = [[]]
+
+        for pattern in patterns:
+            self._add(pattern)
+
+        self._build()
+
+    def _add(self, pattern: str) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[tuple[int, int, str]]:
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern in self._output[state]:
+                yield i - len(pattern) + 1, i + 1, pattern
+
+    def find_longest(self, text: str) -> list[tuple[int, int, str]]:
+        """
+        Leftmost-longest, non-overlapping matches, so that "府中本町" wins
+        over "府中" and "新宿区" over "新宿".
+        """
+        matches = sorted(self.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+
+        selected: list[tuple[int, int, str]] = []
+        end = 0
+        for match in matches:
+            if match[0] >= end:
+                selected.append(match)
+                end = match[1]
+
+        return selected
+
+
+def fold_suffix(name: str) -> str:
+    if len(name) > 1 and name.endswith(ADMINISTRATIVE_SUFFIXES):
+        return name[:-1]
+    return name
+
+
+@dataclass
+class Gazetteer:
+    matcher: AhoCorasick
+    entities: dict[str, set[tuple[str, str]]]
+
+    @classmethod
+    def from_vocabulary(
+        cls, wards: list[str], stations: list[str], usages: list[str]
+    ) -> "Gazetteer":
+        entities: dict[str, set[tuple[str, str]]] = {}
+
+        def add(surface: str, kind: str, value: str) -> None:
+            entities.setdefault(surface, set()).add((kind, value))
+
+        for ward in wards:
+            folded = fold_suffix(ward)
+            if folded != ward:
+                add(ward, "ward", ward)
+            else:
+                for suffix in BARE_NAME_SUFFIXES:
+                    add(folded + suffix, "ward", ward)
+            # A bare 港 (港区) or 中央 (中央区) matches too much
+            if len(folded) > 1 and folded not in SUFFIX_REQUIRED_NAMES:
+                add(folded, "ward", ward)
+
+        for station in stations:
+            if station not in SUFFIX_REQUIRED_STATIONS:
+                add(station, "station", station)
+            add(station + "駅", "station", station)
+
+        for usage in usages:
+            add(usage, "usage", usage)
+
+        return cls(matcher=AhoCorasick(entities), entities=entities)
+
+
+@lru_cache(maxsize=1)
+def load_gazetteer() -> Optional[Gazetteer]:
+    try:
+        with open(GAZETTEER_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.warning({"event": "gazetteer_not_found", "path": str(GAZETTEER_PATH)})
+        return None
+
+    return Gazetteer.from_vocabulary(
+        wards=data["wards"],
+        stations=data["stations"],
+        usages=data.get("usages") or USAGES,
+    )
+
+
+def extract_intent_local(question: str) -> tuple[SearchIntent, float]:
+    """
+    Rule-based counterpart of extract_intent(). Returns the intent and a
+    confidence in [0, 1]; callers fall back to the LLM when it is low.
+    """
+    gazetteer = load_gazetteer()
+    if gazetteer is None:
+        return {}, 0.0
+
+    text = normalize_question(question)
+    intent: SearchIntent = {}
+    confidence = 1.0
+
+    wards: set[str] = set()
+    stations: set[str] = set()
+    usages: set[str] = set()
+    station_ends: set[int] = set()
+    ambiguous = False
+
+    for _, end, surface in gazetteer.matcher.find_longest(text):
+        candidates = gazetteer.entities[surface]
+        kinds = {kind for kind, _ in candidates}
+
+        if kinds == {"ward", "station"}:
+            # e.g. "新宿" is both 新宿区 and 新宿駅
+            if text[end : end + 1] == "駅" or text[end:].lower().startswith(" station"):
+                kinds = {"station"}
+            else:
+                ambiguous = True
+                kinds = {"ward"}
+
+        for kind, value in candidates:
+            if kind not in kinds:
+                continue
+            if kind == "ward":
+                wards.add(value)
+            elif kind == "station":
+                stations.add(value)
+                station_ends.update((end, end - 1))
+            else:
+                usages.add(value)
+
+    lowered = text.lower()
+    for word, usage in ENGLISH_USAGES.items():
+        if re.search(rf"\b{word}s?\b", lowered):
+            usages.add(usage)
+
+    # SearchIntent holds a single value per field; comparisons between
+    # several places are left to the LLM.
+    if ambiguous or len(wards) > 1 or len(stations) > 1 or len(usages) > 1:
+        confidence -= 0.5
+
+    if wards:
+        intent["ward"] = min(wards)
+    if stations:
+        intent["station"] = min(stations)
+    if usages:
+        intent["usage"] = min(usages)
+
+    for pattern in TIME_TO_STATION_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            intent["time_to_station_max"] = int(match.group(1))
+            break
+
+    is_change_rate = bool(CHANGE_RATE_PATTERN.search(text))
+    target = "change_rate" if is_change_rate else "price"
+
+    if TOP_1_PERCENT_PATTERN.search(text):
+        intent[f"require_top_1_percent_{target}"] = True
+    elif BOTTOM_1_PERCENT_PATTERN.search(text):
+        intent[f"require_bottom_1_percent_{target}"] = True
+    elif MAX_PATTERN.search(text):
+        intent[f"require_max_{target}"] = True
+    elif MIN_PATTERN.search(text):
+        intent[f"require_min_{target}"] = True
+
+    unknown_places = [
+        word
+        for word in CAPITALIZED_WORD_PATTERN.findall(text)
+        if word not in KNOWN_CAPITALIZED_WORDS
+    ]
+    unknown_stations = [
+        match.start()
+        for match in STATION_SUFFIX_PATTERN.finditer(text)
+        if match.start() not in station_ends
+    ]
+    if unknown_places or unknown_stations:
+        confidence -= 0.5
+
+    return intent, max(confidence, 0.0)
@@ -0,0 +1,222 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from qdrant_client.http.models import FieldCondition, Filter, ScoredPoint
+from .embedding import EMBED_DIMENSIONS
+from .logger import logger
+
+# Exported by scripts/init_qdrant.py --export-index and bundled with the Lambda.
+LOCAL_INDEX_DIR = Path(
+    os.getenv(
+        "LOCAL_INDEX_DIR",
+        str(Path(__file__).resolve().parents[1] / "data" / "index"),
+    )
+)
+
+VECTORS_FILE = "vectors.npy"
+PAYLOAD_FILE = "payload.npz"
+
+EARTH_RADIUS_METERS = 6_371_000
+
+
+def haversine_meters(
+    lat: float, lon: float, lats: np.ndarray, lons: np.ndarray
+) -> np.ndarray:
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(a))
+
+
+@dataclass
+class LocalIndex:
+    """
+    Brute-force vector index over a memory-mapped matrix of normalized float32
+    vectors, with the payload stored column by column. Qdrant filters are
+    evaluated as boolean masks over the columns.
+    """
+
+    ids: np.ndarray
+    vectors: np.ndarray
+    columns: dict[str, np.ndarray]
+
+    @classmethod
+    def load(cls, directory: Path) -> "LocalIndex":
+        vectors = np.load(directory / VECTORS_FILE, mmap_mode="r")
+        with np.load(directory / PAYLOAD_FILE) as payload:
+            columns = {name: payload[name] for name in payload.files}
+        ids = columns.pop("id")
+        return cls(ids=ids, vectors=vectors, columns=columns)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def condition_mask(self, condition: FieldCondition) -> np.ndarray:
+        if condition.match is not None:
+            return self.columns[condition.key] == condition.match.value
+
+        if condition.range is not None:
+            column = self.columns[condition.key]
+            mask = np.ones(len(self), dtype=bool)
+            if condition.range.lt is not None:
+                mask &= column < condition.range.lt
+            if condition.range.lte is not None:
+                mask &= column <= condition.range.lte
+            if condition.range.gt is not None:
+                mask &= column > condition.range.gt
+            if condition.range.gte is not None:
+                mask &= column >= condition.range.gte
+            return mask
+
+        lats = self.columns[f"{condition.key}.lat"]
+        lons = self.columns[f"{condition.key}.lon"]
+
+        if condition.geo_bounding_box is not None:
+            top_left = condition.geo_bounding_box.top_left
+            bottom_right = condition.geo_bounding_box.bottom_right
+            return (
+                (lats <= top_left.lat)
+                & (lats >= bottom_right.lat)
+                & (lons >= top_left.lon)
+                & (lons <= bottom_right.lon)
+            )
+
+        if condition.geo_radius is not None:
+            center = condition.geo_radius.center
+            distances = haversine_meters(center.lat, center.lon, lats, lons)
+            return distances <= condition.geo_radius.radius
+
+        raise ValueError(f"Unsupported condition for the local index: {condition}")
+
+    def filter_mask(self, query_filter: Optional[Filter]) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        if query_filter is None:
+            return mask
+
+        # build_filter() and build_geo_filter() only produce `must` conditions
+        if query_filter.should or query_filter.must_not or query_filter.min_should:
+            raise ValueError("Only `must` filters are supported by the local index")
+
+        must = query_filter.must or []
+        for condition in must if isinstance(must, list) else [must]:
+            if not isinstance(condition, FieldCondition):
+                raise ValueError(
+                    f"Unsupported condition for the local index: {condition}"
+                )
+            mask &= self.condition_mask(condition)
+
+        return mask
+
+    def payload(self, row: int, fields: Optional[list[str]] = None) -> dict:
+        """
+        The payload of a row, with only the top-level fields if given.
+        """
+        payload: dict = {}
+        for name, column in self.columns.items():
+            key, _, field = name.partition(".")
+            if fields is not None and key not in fields:
+                continue
+            value = column[row].item()
+            if field:
+                payload.setdefault(key, {})[field] = value
+            else:
+                payload[name] = value
+        return payload
+
+    def point(
+        self, row: int, score: float, fields: Optional[list[str]] = None
+    ) -> ScoredPoint:
+        return ScoredPoint(
+            id=self.ids[row].item(),
+            version=0,
+            score=score,
+            payload=self.payload(row, fields),
+        )
+
+    def query(
+        self,
+        vector: list[float],
+        query_filter: Optional[Filter],
+        limit: int,
+        fields: Optional[list[str]] = None,
+    ) -> list[ScoredPoint]:
+        rows = np.flatnonzero(self.filter_mask(query_filter))
+        if len(rows) == 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / np.linalg.norm(query)
+
+        # Stored vectors are normalized, so the dot product is the cosine
+        scores = (
+            self.vectors @ query
+            if len(rows) == len(self)
+            else self.vectors[rows] @ query
+        )
+
+        if len(rows) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return [self.point(rows[i], float(scores[i]), fields) for i in top]
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        radii_meters: list[float],
+        min_hits: int,
+        limit: int,
+        fields: Optional[list[str]] = None,
+    ) -> tuple[float, list[ScoredPoint]]:
+        """
+        Points within the smallest of the increasing radii_meters that
+        contains at least min_hits points (or the largest one), nearest
+        first, and that radius. The score is the distance in meters.
+        """
+        distances = haversine_meters(
+            lat, lon, self.columns["location.lat"], self.columns["location.lon"]
+        )
+
+        radius_meters = radii_meters[-1]
+        for radius in radii_meters:
+            if np.count_nonzero(distances <= radius) >= min_hits:
+                radius_meters = radius
+                break
+
+        rows = np.flatnonzero(distances <= radius_meters)
+        if len(rows) > limit:
+            rows = rows[np.argpartition(distances[rows], limit)[:limit]]
+        rows = rows[np.argsort(distances[rows], kind="stable")]
+
+        return radius_meters, [
+            self.point(row, float(distances[row]), fields) for row in rows
+        ]
+
+
+@lru_cache(maxsize=1)
+def load_local_index() -> LocalIndex:
+    index = LocalIndex.load(LOCAL_INDEX_DIR)
+    if index.vectors.shape[1] != EMBED_DIMENSIONS:
+        raise ValueError(
+            f"The local index holds {index.vectors.shape[1]}-d vectors but "
+            f"EMBED_DIMENSIONS is {EMBED_DIMENSIONS}; export it again with "
+            "init_qdrant.py --export-index"
+        )
+    logger.info(
+        {
+            "event": "load_local_index",
+            "path": str(LOCAL_INDEX_DIR),
+            "points": len(index),
+            "dimensions": EMBED_DIMENSIONS,
+        }
+    )
+    return index
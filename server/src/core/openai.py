@@ -1,23 +1,105 @@
 import json
-from openai import OpenAI
-from .secret import secrets
+import os
+from functools import lru_cache
+from typing import AsyncIterator, Iterator, Optional
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
+from openai.types import CompletionUsage
+from .secret import get_secrets
 from .qdrant import SearchIntent
 from .logger import logger
+from .embedding import EMBED_DIMENSIONS, EMBED_MODEL, EMBED_VERSION
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache, create_embedding_cache
+from .intent import extract_intent_local
+from .telemetry import add, record
 
+LOCAL_INTENT_MIN_CONFIDENCE = float(os.getenv("LOCAL_INTENT_MIN_CONFIDENCE", "0.8"))
 
-openai = OpenAI(api_key=secrets["OPENAI_API_KEY"])
+# Async server only (app_async.py)
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "32"))
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "64"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+
+
+# Keyed on the API key, so that a rotated secret gets a new client
+@lru_cache(maxsize=1)
+def create_openai(api_key: str) -> OpenAI:
+    return OpenAI(api_key=api_key)
+
+
+def get_openai() -> OpenAI:
+    return create_openai(get_secrets()["OPENAI_API_KEY"])
+
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> EmbeddingCache:
+    return create_embedding_cache()
 
 
 def embed(text: str) -> list[float]:
-    response = openai.embeddings.create(
+    return get_embedding_cache().get_or_compute(EMBED_VERSION, text, embed_uncached)
+
+
+def embed_uncached(text: str) -> list[float]:
+    response = get_openai().embeddings.create(
         input=text,
-        model="text-embedding-3-small",
+        model=EMBED_MODEL,
+        dimensions=EMBED_DIMENSIONS,
     )
+    if response.usage is not None:
+        add(prompt_tokens=response.usage.prompt_tokens)
     return response.data[0].embedding
 
 
+def embed_many(texts: list[str]) -> list[list[float]]:
+    return get_embedding_cache().get_or_compute_many(
+        EMBED_VERSION, texts, embed_many_uncached
+    )
+
+
+def embed_many_uncached(texts: list[str]) -> list[list[float]]:
+    response = get_openai().embeddings.create(
+        input=texts,
+        model=EMBED_MODEL,
+        dimensions=EMBED_DIMENSIONS,
+    )
+    if response.usage is not None:
+        add(prompt_tokens=response.usage.prompt_tokens)
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
 def extract_intent(question: str) -> SearchIntent:
-    prompt = f"""
+    intent = confident_local_intent(question)
+    if intent is not None:
+        return intent
+    return extract_intent_llm(question)
+
+
+def confident_local_intent(question: str) -> Optional[SearchIntent]:
+    """
+    The rule-based intent, or None when it is not confident enough and the
+    LLM has to extract it.
+    """
+    intent, confidence = extract_intent_local(question)
+    logger.info(
+        {
+            "event": "extract_intent_local",
+            "intent": intent,
+            "confidence": confidence,
+        }
+    )
+
+    if confidence >= LOCAL_INTENT_MIN_CONFIDENCE:
+        record(intent_source="local", intent_confidence=confidence)
+        return intent
+
+    record(intent_source="llm", intent_confidence=confidence)
+    return None
+
+
+def build_intent_prompt(question: str) -> str:
+    return f"""
         Extract search filters from the following user question as a JSON object.
         Return only valid JSON. Do not include explanations or markdown.
 
@@ -50,26 +132,39 @@ def extract_intent(question: str) -> SearchIntent:
         {question}
         """.strip()
 
-    resp = openai.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-        response_format={"type": "json_object"},
-    )
-
-    content = resp.choices[0].message.content
 
+def parse_intent(content: Optional[str]) -> SearchIntent:
     try:
         return json.loads(content)
-    except json.JSONDecodeError as e:
+    except (TypeError, json.JSONDecodeError) as e:
         logger.error(
             {"event": "json_decode_error", "content": content, "error": str(e)}
         )
         return {}
 
 
-def generate_with_llm(question: str, contexts: list[str]) -> str:
-    prompt = f"""
+def extract_intent_llm(question: str) -> SearchIntent:
+    resp = get_openai().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": build_intent_prompt(question)}],
+        temperature=0.3,
+        response_format={"type": "json_object"},
+    )
+    record_usage(resp.usage)
+
+    return parse_intent(resp.choices[0].message.content)
+
+
+def record_usage(usage: Optional[CompletionUsage]) -> None:
+    if usage is not None:
+        add(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+        )
+
+
+def build_answer_prompt(question: str, contexts: list[str]) -> str:
+    return f"""
         System:
         You are a land price analysis assistant.
 
@@ -90,10 +185,138 @@ def generate_with_llm(question: str, contexts: list[str]) -> str:
         {question}
         """.strip()
 
-    resp = openai.chat.completions.create(
+
+def generate_with_llm(question: str, contexts: list[str]) -> str:
+    resp = get_openai().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": build_answer_prompt(question, contexts)}],
+        temperature=0.3,
+    )
+    record_usage(resp.usage)
+
+    return resp.choices[0].message.content
+
+
+def generate_with_llm_stream(question: str, contexts: list[str]) -> Iterator[str]:
+    stream = get_openai().chat.completions.create(
         model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
+        messages=[{"role": "user", "content": build_answer_prompt(question, contexts)}],
         temperature=0.3,
+        stream=True,
+        # The last chunk has no choices, only the token usage
+        stream_options={"include_usage": True},
+    )
+
+    for chunk in stream:
+        record_usage(chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+# The functions below are the async counterparts used by the long-running
+# server (app_async.py). They share the prompts and the parsing above.
+
+
+@lru_cache(maxsize=1)
+def create_async_openai(api_key: str) -> AsyncOpenAI:
+    # Concurrent requests are multiplexed over the pooled HTTP/2 connections
+    return AsyncOpenAI(
+        api_key=api_key,
+        http_client=DefaultAsyncHttpxClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=OPENAI_POOL_SIZE,
+                max_keepalive_connections=OPENAI_POOL_SIZE,
+            ),
+        ),
+    )
+
+
+def get_async_openai() -> AsyncOpenAI:
+    return create_async_openai(get_secrets()["OPENAI_API_KEY"])
+
+
+async def close_async_openai() -> None:
+    if create_async_openai.cache_info().currsize:
+        await get_async_openai().close()
+        create_async_openai.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def get_embedding_batcher() -> EmbeddingBatcher:
+    return EmbeddingBatcher(
+        embed_batch_async,
+        max_batch_size=EMBED_BATCH_MAX_SIZE,
+        max_wait_ms=EMBED_BATCH_WAIT_MS,
     )
 
+
+async def embed_async(text: str) -> list[float]:
+    return await get_embedding_cache().get_or_compute_async(
+        EMBED_VERSION, text, get_embedding_batcher().embed
+    )
+
+
+async def embed_batch_async(texts: list[str]) -> list[list[float]]:
+    response = await get_async_openai().embeddings.create(
+        input=texts,
+        model=EMBED_MODEL,
+        dimensions=EMBED_DIMENSIONS,
+    )
+    # Shared by the requests of the batch, so logged once instead of being
+    # added to their spans
+    logger.info(
+        {
+            "event": "embed_batch",
+            "texts": len(texts),
+            "prompt_tokens": response.usage.prompt_tokens if response.usage else None,
+        }
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+async def extract_intent_async(question: str) -> SearchIntent:
+    intent = confident_local_intent(question)
+    if intent is not None:
+        return intent
+    return await extract_intent_llm_async(question)
+
+
+async def extract_intent_llm_async(question: str) -> SearchIntent:
+    resp = await get_async_openai().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": build_intent_prompt(question)}],
+        temperature=0.3,
+        response_format={"type": "json_object"},
+    )
+    record_usage(resp.usage)
+
+    return parse_intent(resp.choices[0].message.content)
+
+
+async def generate_with_llm_async(question: str, contexts: list[str]) -> str:
+    resp = await get_async_openai().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": build_answer_prompt(question, contexts)}],
+        temperature=0.3,
+    )
+    record_usage(resp.usage)
+
     return resp.choices[0].message.content
+
+
+async def generate_with_llm_stream_async(
+    question: str, contexts: list[str]
+) -> AsyncIterator[str]:
+    stream = await get_async_openai().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": build_answer_prompt(question, contexts)}],
+        temperature=0.3,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+
+    async for chunk in stream:
+        record_usage(chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
@@ -1,43 +1,155 @@
+import os
 from dataclasses import dataclass
-from qdrant_client import QdrantClient
+from functools import lru_cache
+import httpx
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http.models import (
     Filter,
     FieldCondition,
+    FormulaQuery,
     MatchValue,
     Range,
     GeoBoundingBox,
+    GeoDistance,
+    GeoDistanceParams,
     GeoPoint,
+    GeoRadius,
+    NegExpression,
+    Prefetch,
+    QuantizationSearchParams,
+    QueryRequest,
+    QueryResponse,
     ScoredPoint,
+    SearchParams,
 )
 from typing import TypedDict, Optional
-from .secret import secrets
+from .secret import get_secrets
 from .env import environment
+from .context import context_fields, render_contexts
+from .local_index import haversine_meters, load_local_index
+from .telemetry import record
+
+
+# Transport of both clients: gRPC on QDRANT_GRPC_PORT instead of REST, and
+# the timeout of every request in seconds
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false") == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT_SECONDS = int(os.getenv("QDRANT_TIMEOUT_SECONDS", "5"))
+
+
+# Keyed on the connection settings, so that a rotated secret gets a new client
+@lru_cache(maxsize=1)
+def create_client(host: str, port: int, api_key: Optional[str]) -> QdrantClient:
+    if api_key is None:
+        return QdrantClient(
+            host=host,
+            port=port,
+            grpc_port=QDRANT_GRPC_PORT,
+            prefer_grpc=QDRANT_PREFER_GRPC,
+            timeout=QDRANT_TIMEOUT_SECONDS,
+        )
+    return QdrantClient(
+        api_key=api_key,
+        host=host,
+        port=port,
+        grpc_port=QDRANT_GRPC_PORT,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        timeout=QDRANT_TIMEOUT_SECONDS,
+        check_compatibility=False,
+    )
 
-# script
-if environment is None:
-    client = QdrantClient(host="localhost", port=6333)
-# localstack
-elif environment == "localstack":
-    client = QdrantClient(host="host.docker.internal", port=6333)
-# prod
-else:
-    client = QdrantClient(
-        api_key=secrets["QDRANT_API_KEY"],
-        host=secrets["QDRANT_HOST"],
-        port=443,
+
+def get_client() -> QdrantClient:
+    # script
+    if environment is None:
+        return create_client("localhost", 6333, None)
+    # localstack
+    if environment == "localstack":
+        return create_client("host.docker.internal", 6333, None)
+    # prod
+    secrets = get_secrets()
+    return create_client(secrets["QDRANT_HOST"], 443, secrets["QDRANT_API_KEY"])
+
+
+# Async server only (app_async.py). It reaches Qdrant by URL, e.g. over the
+# Fly.io private network, and keeps its connections open between requests:
+# AsyncQdrantClient does not keep connections alive unless limits are given.
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "32"))
+
+
+@lru_cache(maxsize=1)
+def create_async_client(url: str, api_key: Optional[str]) -> AsyncQdrantClient:
+    # HTTP/2 is negotiated over TLS only; plain http URLs stay on HTTP/1.1
+    return AsyncQdrantClient(
+        url=url,
+        api_key=api_key,
+        http2=True,
+        grpc_port=QDRANT_GRPC_PORT,
+        prefer_grpc=QDRANT_PREFER_GRPC,
+        timeout=QDRANT_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=QDRANT_POOL_SIZE,
+            max_keepalive_connections=QDRANT_POOL_SIZE,
+        ),
         check_compatibility=False,
     )
 
-COLLECTION_NAME = "tokyo_landprice_rag"
+
+def get_async_client() -> AsyncQdrantClient:
+    return create_async_client(QDRANT_URL, os.getenv("QDRANT_API_KEY") or None)
+
+
+async def close_async_client() -> None:
+    if create_async_client.cache_info().currsize:
+        await get_async_client().close()
+        create_async_client.cache_clear()
+
+
+# An alias that scripts/init_qdrant.py repoints to every new version of the
+# collection. Qdrant resolves it on each request, so a reindex is picked up
+# without a redeploy; set it to a version name to pin one.
+COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "tokyo_landprice_rag")
+
+# qdrant: query the Qdrant collection
+# local: query the index bundled with the function (core/local_index.py)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "qdrant")
+
+# Upper bound on the points per radius of a nearby search that Qdrant ranks
+# by distance; only the nearest few are returned. The radii used for map
+# clicks rarely contain more points than this in the Tokyo dataset, since a
+# larger radius is only used when the smaller one is sparse.
+NEARBY_CANDIDATES = 1024
 
 METERS_PER_DEG_LAT = 111000
 METERS_PER_DEG_LON = 91000
 
+# Payload fields returned with each hit: those the contexts are rendered from,
+# and the content hash the answer cache keys on. Vectors are never returned.
+SEARCH_PAYLOAD = [*context_fields(), "content_hash"]
+NEARBY_PAYLOAD = [*SEARCH_PAYLOAD, "location"]
+
+# Only used when the collection is quantized (scripts/init_qdrant.py --profile):
+# fetch more candidates with the int8 vectors, then rescore them with the
+# original ones.
+SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(
+        rescore=True,
+        oversampling=float(os.getenv("QDRANT_OVERSAMPLING", "2.0")),
+    )
+)
+
 
 @dataclass
 class RetrievalResult:
     contexts: list[str]
     hits: list[ScoredPoint]
+    # Set by retrieve_contexts()
+    query_vector: Optional[list[float]] = None
+    query_filter: Optional[Filter] = None
+    # Set by retrieve_nearby()
+    radius_meters: Optional[float] = None
 
 
 class SearchIntent(TypedDict, total=False):
@@ -149,15 +261,254 @@ def build_geo_filter(lat: float, lon: float, bbox_size_meters: float = 500) -> F
     )
 
 
+def build_radius_filter(lat: float, lon: float, radius_meters: float) -> Filter:
+    return Filter(
+        must=[
+            FieldCondition(
+                key="location",
+                geo_radius=GeoRadius(
+                    center=GeoPoint(lat=lat, lon=lon), radius=radius_meters
+                ),
+            ),
+        ]
+    )
+
+
+def retrieve_nearby(
+    lat: float,
+    lon: float,
+    radii_meters: list[float],
+    min_hits: int = 1,
+    limit: int = 5,
+    payload_fields: Optional[list[str]] = NEARBY_PAYLOAD,
+) -> RetrievalResult:
+    """
+    Nearest land points by haversine distance, without a query vector, within
+    the smallest of the increasing radii_meters that contains at least
+    min_hits points (or the largest one). All radii are searched in a single
+    request, which returns the nearest few points of each. The score of each
+    hit is its distance in meters.
+
+    Hits carry payload_fields (which must include location), or the whole
+    payload if it is None.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        radius_meters, hits = load_local_index().nearest(
+            lat, lon, radii_meters, min_hits, limit, payload_fields
+        )
+        record(hits=len(hits), radius_meters=radius_meters)
+        contexts = render_contexts(hits)
+        return RetrievalResult(
+            contexts=contexts, hits=hits, radius_meters=radius_meters
+        )
+
+    responses = get_client().query_batch_points(
+        collection_name=COLLECTION_NAME,
+        requests=nearby_requests(
+            lat, lon, radii_meters, min_hits, limit, payload_fields
+        ),
+    )
+    return nearby_result(lat, lon, radii_meters, min_hits, limit, responses)
+
+
+def nearby_requests(
+    lat: float,
+    lon: float,
+    radii_meters: list[float],
+    min_hits: int,
+    limit: int,
+    payload_fields: Optional[list[str]],
+) -> list[QueryRequest]:
+    # Qdrant ranks the candidates of each radius by distance, so that only
+    # the nearest few of each come back with their payload
+    nearest = FormulaQuery(
+        formula=NegExpression(
+            neg=GeoDistance(
+                geo_distance=GeoDistanceParams(
+                    origin=GeoPoint(lat=lat, lon=lon), to="location"
+                )
+            )
+        )
+    )
+    return [
+        QueryRequest(
+            prefetch=Prefetch(
+                filter=build_radius_filter(lat, lon, radius),
+                limit=NEARBY_CANDIDATES,
+            ),
+            query=nearest,
+            limit=max(limit, min_hits),
+            with_payload=payload_fields if payload_fields is not None else True,
+            with_vector=False,
+        )
+        for radius in radii_meters
+    ]
+
+
+def nearby_result(
+    lat: float,
+    lon: float,
+    radii_meters: list[float],
+    min_hits: int,
+    limit: int,
+    responses: list[QueryResponse],
+) -> RetrievalResult:
+    radius_meters = radii_meters[-1]
+    records: dict = {}
+    for radius, response in zip(radii_meters, responses):
+        # Points of the smaller radii are kept, in case the candidates of
+        # this one were cut off at NEARBY_CANDIDATES.
+        records.update({point.id: point for point in response.points})
+        if len(response.points) >= min_hits:
+            radius_meters = radius
+            break
+
+    points = list(records.values())
+    distances = haversine_meters(
+        lat,
+        lon,
+        np.array([p.payload["location"]["lat"] for p in points]),
+        np.array([p.payload["location"]["lon"] for p in points]),
+    )
+    hits = [
+        ScoredPoint(
+            id=points[i].id,
+            version=0,
+            score=float(distances[i]),
+            payload=points[i].payload,
+        )
+        for i in np.argsort(distances, kind="stable")[:limit]
+        if distances[i] <= radius_meters
+    ]
+    record(hits=len(hits), radius_meters=radius_meters)
+
+    contexts = render_contexts(hits)
+    return RetrievalResult(contexts=contexts, hits=hits, radius_meters=radius_meters)
+
+
 def retrieve_contexts(
-    vector: list[float], query_filter: Optional[Filter], limit: int = 5
+    vector: list[float],
+    query_filter: Optional[Filter],
+    limit: int = 5,
+    payload_fields: Optional[list[str]] = SEARCH_PAYLOAD,
 ) -> RetrievalResult:
-    hits = client.query_points(
+    """
+    Hits carry payload_fields, or the whole payload if it is None.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        hits = load_local_index().query(vector, query_filter, limit, payload_fields)
+    else:
+        hits = (
+            get_client()
+            .query_points(
+                collection_name=COLLECTION_NAME,
+                query=vector,
+                query_filter=query_filter,
+                search_params=SEARCH_PARAMS,
+                limit=limit,
+                with_payload=payload_fields if payload_fields is not None else True,
+                with_vectors=False,
+            )
+            .points
+        )
+    return search_result(vector, query_filter, hits)
+
+
+def retrieve_contexts_batch(
+    vectors: list[list[float]],
+    query_filters: list[Optional[Filter]],
+    limit: int = 5,
+    payload_fields: Optional[list[str]] = SEARCH_PAYLOAD,
+) -> list[RetrievalResult]:
+    """
+    retrieve_contexts() for many queries, in a single Qdrant request.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        index = load_local_index()
+        hits_per_query = [
+            index.query(vector, query_filter, limit, payload_fields)
+            for vector, query_filter in zip(vectors, query_filters)
+        ]
+    else:
+        responses = get_client().query_batch_points(
+            collection_name=COLLECTION_NAME,
+            requests=[
+                QueryRequest(
+                    query=vector,
+                    filter=query_filter,
+                    params=SEARCH_PARAMS,
+                    limit=limit,
+                    with_payload=payload_fields if payload_fields is not None else True,
+                    with_vector=False,
+                )
+                for vector, query_filter in zip(vectors, query_filters)
+            ],
+        )
+        hits_per_query = [response.points for response in responses]
+
+    record(queries=len(vectors), hits=sum(len(hits) for hits in hits_per_query))
+    return [
+        RetrievalResult(
+            contexts=render_contexts(hits),
+            hits=hits,
+            query_vector=vector,
+            query_filter=query_filter,
+        )
+        for vector, query_filter, hits in zip(vectors, query_filters, hits_per_query)
+    ]
+
+
+def search_result(
+    vector: list[float], query_filter: Optional[Filter], hits: list[ScoredPoint]
+) -> RetrievalResult:
+    record(hits=len(hits), top_score=hits[0].score if hits else None)
+
+    contexts = render_contexts(hits)
+    return RetrievalResult(
+        contexts=contexts,
+        hits=hits,
+        query_vector=vector,
+        query_filter=query_filter,
+    )
+
+
+async def retrieve_nearby_async(
+    lat: float,
+    lon: float,
+    radii_meters: list[float],
+    min_hits: int = 1,
+    limit: int = 5,
+    payload_fields: Optional[list[str]] = NEARBY_PAYLOAD,
+) -> RetrievalResult:
+    # The local index is searched in-process, in well under a millisecond
+    if RETRIEVAL_BACKEND == "local":
+        return retrieve_nearby(lat, lon, radii_meters, min_hits, limit, payload_fields)
+
+    responses = await get_async_client().query_batch_points(
+        collection_name=COLLECTION_NAME,
+        requests=nearby_requests(
+            lat, lon, radii_meters, min_hits, limit, payload_fields
+        ),
+    )
+    return nearby_result(lat, lon, radii_meters, min_hits, limit, responses)
+
+
+async def retrieve_contexts_async(
+    vector: list[float],
+    query_filter: Optional[Filter],
+    limit: int = 5,
+    payload_fields: Optional[list[str]] = SEARCH_PAYLOAD,
+) -> RetrievalResult:
+    if RETRIEVAL_BACKEND == "local":
+        return retrieve_contexts(vector, query_filter, limit, payload_fields)
+
+    response = await get_async_client().query_points(
         collection_name=COLLECTION_NAME,
         query=vector,
         query_filter=query_filter,
+        search_params=SEARCH_PARAMS,
         limit=limit,
-    ).points
-
-    contexts = [hit.payload["semantic_text"] for hit in hits]
-    return RetrievalResult(contexts=contexts, hits=hits)
+        with_payload=payload_fields if payload_fields is not None else True,
+        with_vectors=False,
+    )
+    return search_result(vector, query_filter, response.points)
@@ -1,8 +1,15 @@
 import json
+import os
+import threading
+import time
 from functools import lru_cache
-from typing import TypedDict
+from typing import Optional, TypedDict
 from .env import environment
 
+# Secrets are fetched on first use and refreshed after this many seconds, so
+# a rotated key reaches warm containers without a redeploy.
+SECRETS_TTL_SECONDS = float(os.getenv("SECRETS_TTL_SECONDS", "3600"))
+
 
 class SecretDict(TypedDict):
     OPENAI_API_KEY: str
@@ -11,15 +18,28 @@ class SecretDict(TypedDict):
 
 
 @lru_cache(maxsize=1)
-def get_secret() -> SecretDict:
-    secret_name = f"tokyo-landprice-rag-{environment}"
+def get_secrets_manager_client():
+    import boto3
+
     service_name = "secretsmanager"
     region_name = "ap-northeast-1"
 
+    # localstack
+    if environment == "localstack":
+        return boto3.client(
+            service_name=service_name,
+            region_name=region_name,
+            endpoint_url="http://localstack-tokyo-landprice-rag:4566",
+        )
+    # prod
+    return boto3.client(service_name=service_name, region_name=region_name)
+
+
+def get_secret() -> SecretDict:
+    secret_name = f"tokyo-landprice-rag-{environment}"
+
     # script
     if environment is None:
-        import os
-
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY must be set when running scripts")
@@ -30,22 +50,7 @@ def get_secret() -> SecretDict:
             "QDRANT_HOST": "",
         }
 
-    import boto3
-
-    # localstack
-    if environment == "localstack":
-        client = boto3.client(
-            service_name=service_name,
-            region_name=region_name,
-            endpoint_url="http://localstack-tokyo-landprice-rag:4566",
-        )
-    # prod
-    else:
-        client = boto3.client(
-            service_name=service_name,
-            region_name=region_name,
-        )
-
+    client = get_secrets_manager_client()
     response = client.get_secret_value(SecretId=secret_name)
     secret_string = response["SecretString"]
 
@@ -55,4 +60,14 @@ def get_secret() -> SecretDict:
         return {"error": str(e)}
 
 
-secrets = get_secret()
+_cached: Optional[tuple[float, SecretDict]] = None
+_lock = threading.Lock()
+
+
+def get_secrets() -> SecretDict:
+    global _cached
+
+    with _lock:
+        if _cached is None or _cached[0] <= time.monotonic():
+            _cached = (time.monotonic() + SECRETS_TTL_SECONDS, get_secret())
+        return _cached[1]
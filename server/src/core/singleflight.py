@@ -0,0 +1,219 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Optional, Protocol
+from .dynamodb import dynamodb_table
+from .logger import logger
+
+
+class SingleFlight(Protocol):
+    def do(self, key: str, func: Callable[[], str]) -> str: ...
+
+
+class NoSingleFlight:
+    def do(self, key: str, func: Callable[[], str]) -> str:
+        return func()
+
+
+class LocalSingleFlight:
+    """
+    Coalesces concurrent calls with the same key within one process, e.g. the
+    long-running ASGI server. The first caller runs func; the others wait for
+    its result, or its exception.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], str]) -> str:
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not is_leader:
+            logger.info({"event": "singleflight", "role": "follower"})
+            return future.result()
+
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    LocalSingleFlight for coroutines on the event loop of the async server.
+    The first caller starts func as a task that every caller awaits, so a
+    caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[str]]) -> str:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            logger.info({"event": "singleflight", "role": "follower"})
+
+        return await asyncio.shield(task)
+
+
+class NoAsyncSingleFlight:
+    async def do(self, key: str, func: Callable[[], Awaitable[str]]) -> str:
+        return await func()
+
+
+class DynamoDBSingleFlight:
+    """
+    Coalesces calls across Lambda containers with a lock item in DynamoDB.
+    The caller that creates the item runs func and writes the result back
+    for result_ttl_seconds; the others poll the item until the result is
+    there. If the leader fails or its lock expires, followers run func
+    themselves, so a lost lock only costs a duplicate call.
+
+    Both timeouts stay below API Gateway's 29 s: a leader killed by the
+    Lambda timeout never deletes its lock, and a follower that waits for it
+    past max_wait_seconds still has time to answer on its own. The Lambda
+    timeout must not exceed lock_ttl_seconds, or a slow leader loses its
+    lock while it is still running and a second one starts.
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        lock_ttl_seconds: float = 25,
+        max_wait_seconds: float = 15,
+        result_ttl_seconds: float = 10,
+        poll_interval_seconds: float = 0.2,
+    ):
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.table_name = table_name
+
+    def _table(self):
+        # boto3 is only imported once the table is used
+        return dynamodb_table(self.table_name)
+
+    def do(self, key: str, func: Callable[[], str]) -> str:
+        item_key = f"singleflight:{key}"
+
+        try:
+            is_leader = self._acquire(item_key)
+        except Exception as e:
+            logger.warning({"event": "singleflight_error", "error": str(e)})
+            return func()
+
+        if not is_leader:
+            logger.info({"event": "singleflight", "role": "follower"})
+            try:
+                result = self._wait(item_key)
+            except Exception as e:
+                logger.warning({"event": "singleflight_error", "error": str(e)})
+                result = None
+            if result is not None:
+                return result
+            logger.info({"event": "singleflight", "role": "fallback"})
+            return func()
+
+        try:
+            result = func()
+        except Exception:
+            # The lock expires on its own; the error of func is the one to raise
+            try:
+                self._table().delete_item(Key={"key": item_key})
+            except Exception as e:
+                logger.warning({"event": "singleflight_error", "error": str(e)})
+            raise
+
+        try:
+            self._table().put_item(
+                Item={
+                    "key": item_key,
+                    "status": "done",
+                    "result": result,
+                    "expires_at": int(time.time() + self.result_ttl_seconds),
+                }
+            )
+        except Exception as e:
+            logger.warning({"event": "singleflight_error", "error": str(e)})
+
+        return result
+
+    def _acquire(self, item_key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        now = time.time()
+        try:
+            self._table().put_item(
+                Item={
+                    "key": item_key,
+                    "status": "running",
+                    # Rounded up, so that the lock is never shorter than the TTL
+                    "expires_at": math.ceil(now + self.lock_ttl_seconds),
+                },
+                ConditionExpression="attribute_not_exists(#key) OR expires_at < :now",
+                ExpressionAttributeNames={"#key": "key"},
+                ExpressionAttributeValues={":now": int(now)},
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def _wait(self, item_key: str) -> Optional[str]:
+        deadline = time.time() + self.max_wait_seconds
+
+        while time.time() < deadline:
+            item = self._table().get_item(Key={"key": item_key}).get("Item")
+            if item is None or int(item["expires_at"]) < time.time():
+                return None
+            if item["status"] == "done":
+                return item["result"]
+            time.sleep(self.poll_interval_seconds)
+
+        return None
+
+
+def create_singleflight() -> SingleFlight:
+    backend = os.getenv("SINGLEFLIGHT_BACKEND", "local")
+
+    if backend == "local":
+        return LocalSingleFlight()
+    if backend == "dynamodb":
+        return DynamoDBSingleFlight(
+            table_name=os.environ["SINGLEFLIGHT_TABLE"],
+            lock_ttl_seconds=float(os.getenv("SINGLEFLIGHT_LOCK_TTL_SECONDS", "25")),
+            max_wait_seconds=float(os.getenv("SINGLEFLIGHT_MAX_WAIT_SECONDS", "15")),
+        )
+    if backend == "none":
+        return NoSingleFlight()
+
+    raise ValueError(f"Invalid SINGLEFLIGHT_BACKEND value: {backend}")
+
+
+def create_async_singleflight() -> AsyncSingleFlight | NoAsyncSingleFlight:
+    # Calls are only coalesced within the process; the DynamoDB lock is for
+    # Lambda containers, which cannot share memory
+    if os.getenv("SINGLEFLIGHT_BACKEND", "local") == "none":
+        return NoAsyncSingleFlight()
+    return AsyncSingleFlight()
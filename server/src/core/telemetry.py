@@ -0,0 +1,249 @@
+"""
+Per-request tracing and metrics for the RAG pipeline.
+
+A Trace holds one Span per stage (intent extraction, embedding, retrieval,
+generation, ...). Code running inside a span can attach token counts, hit
+counts or cache results to it with record() / add(), without knowing which
+request it serves. When the trace finishes, it is logged as one `trace`
+event and every span is emitted as CloudWatch metrics (EMF) through
+Powertools.
+
+TELEMETRY=off turns all of this into no-ops, e.g. for tests.
+"""
+
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+from aws_lambda_powertools import Metrics
+from aws_lambda_powertools.metrics import MetricUnit
+from .logger import logger
+
+T = TypeVar("T")
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY", "on") != "off"
+
+metrics = Metrics(
+    namespace=os.getenv("POWERTOOLS_METRICS_NAMESPACE", "TokyoLandpriceRag")
+)
+_metrics_lock = threading.Lock()
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("span", default=None)
+
+_listeners: list[Callable[["Trace"], None]] = []
+
+
+def elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+class Span:
+    def __init__(self, name: str, start_ms: float):
+        self.name = name
+        self.start_ms = start_ms
+        self.duration_ms: Optional[float] = None
+        self.attributes: dict[str, int | float | str | bool | None] = {}
+        self._start = time.perf_counter()
+
+    def end(self) -> None:
+        self.duration_ms = elapsed_ms(self._start)
+
+    def record(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, **counters: int) -> None:
+        for key, value in counters.items():
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def iterate(self, iterator: Iterator[T]) -> Iterator[T]:
+        """
+        Makes this the current span while each item is produced, for
+        generators that are resumed from other threads (e.g. streaming).
+        """
+        while True:
+            token = _current_span.set(self)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_span.reset(token)
+            yield item
+
+    async def aiterate(self, iterator: AsyncIterator[T]) -> AsyncIterator[T]:
+        """
+        iterate() for async generators, e.g. streaming on the async server.
+        """
+        while True:
+            token = _current_span.set(self)
+            try:
+                item = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                _current_span.reset(token)
+            yield item
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start_ms": self.start_ms,
+            "duration_ms": self.duration_ms,
+            **self.attributes,
+        }
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = str(uuid.uuid4())
+        self.spans: list[Span] = []
+        self.attributes: dict[str, int | float | str | bool | None] = {}
+        self.total_ms: Optional[float] = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self) -> float:
+        return elapsed_ms(self._start)
+
+    def start_span(self, name: str) -> Span:
+        """
+        A span that is not made current; end() it when the stage is done.
+        """
+        span = Span(name, self.elapsed_ms())
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        span = self.start_span(name)
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            span.end()
+            _current_span.reset(token)
+
+    def run(self, name: str, func: Callable[..., T], *args) -> T:
+        with self.span(name):
+            return func(*args)
+
+    async def run_async(self, name: str, func: Callable[..., Awaitable[T]], *args) -> T:
+        # Tasks copy the context when they are created, so concurrent stages
+        # each get their own current span
+        with self.span(name):
+            return await func(*args)
+
+    def record(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> None:
+        self.total_ms = self.elapsed_ms()
+        logger.info(
+            {
+                "event": "trace",
+                "trace_id": self.trace_id,
+                "name": self.name,
+                "total_ms": self.total_ms,
+                **self.attributes,
+                "spans": [span.to_dict() for span in self.spans],
+            }
+        )
+        self._emit_metrics(self.total_ms)
+        for listener in _listeners:
+            listener(self)
+
+    def _emit_metrics(self, total_ms: float) -> None:
+        with _metrics_lock:
+            metrics.add_metric(
+                name=f"{self.name}_duration",
+                unit=MetricUnit.Milliseconds,
+                value=total_ms,
+            )
+            add_attribute_metrics(self.name, self.attributes)
+            for span in self.spans:
+                if span.duration_ms is not None:
+                    metrics.add_metric(
+                        name=f"{span.name}_duration",
+                        unit=MetricUnit.Milliseconds,
+                        value=span.duration_ms,
+                    )
+                add_attribute_metrics(span.name, span.attributes)
+            metrics.flush_metrics()
+
+
+def add_attribute_metrics(prefix: str, attributes: dict) -> None:
+    for key, value in attributes.items():
+        # Only numbers become metrics; other attributes stay in the log
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if key.endswith("_ms"):
+            unit = MetricUnit.Milliseconds
+        elif isinstance(value, int):
+            unit = MetricUnit.Count
+        else:
+            unit = MetricUnit.NoUnit
+        metrics.add_metric(name=f"{prefix}_{key}", unit=unit, value=value)
+
+
+class NoopSpan(Span):
+    def record(self, **attributes) -> None:
+        pass
+
+    def add(self, **counters: int) -> None:
+        pass
+
+    def iterate(self, iterator: Iterator[T]) -> Iterator[T]:
+        return iterator
+
+    def aiterate(self, iterator: AsyncIterator[T]) -> AsyncIterator[T]:
+        return iterator
+
+
+class NoopTrace(Trace):
+    def start_span(self, name: str) -> Span:
+        return NoopSpan(name, 0)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        yield NoopSpan(name, 0)
+
+    def record(self, **attributes) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+def add_listener(listener: Callable[[Trace], None]) -> None:
+    """
+    Call listener with every finished trace, e.g. to collect stage timings
+    in a benchmark.
+    """
+    _listeners.append(listener)
+
+
+def start_trace(name: str) -> Trace:
+    return Trace(name) if TELEMETRY_ENABLED else NoopTrace(name)
+
+
+def record(**attributes) -> None:
+    """
+    Attach attributes to the current span, if any.
+    """
+    span = _current_span.get()
+    if span is not None:
+        span.record(**attributes)
+
+
+def add(**counters: int) -> None:
+    """
+    Increment counters on the current span, if any.
+    """
+    span = _current_span.get()
+    if span is not None:
+        span.add(**counters)
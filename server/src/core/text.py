@@ -0,0 +1,8 @@
+import unicodedata
+
+
+def normalize_question(text: str) -> str:
+    # NFKC folds full-width letters, digits and the ideographic space
+    # (e.g. "Ｓｈｉｂｕｙａ　駅" → "Shibuya 駅"), then whitespace is collapsed.
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split())
@@ -1,12 +1,11 @@
 import json
 from aws_lambda_powertools.utilities.typing import LambdaContext
-from aws_lambda_powertools.utilities.parser.models import APIGatewayProxyEventModel
+from core.cors import CORS_HEADERS
 from core.logger import dynamic_inject_lambda_context, logger
-from core.auth import CORS_HEADERS
 
 
 @dynamic_inject_lambda_context
-def lambda_handler(event: APIGatewayProxyEventModel, context: LambdaContext) -> dict:
+def lambda_handler(event: dict, context: LambdaContext) -> dict:
     logger.info({"event": "health_check"})
     return {
         "statusCode": 200,
@@ -3,7 +3,8 @@ from aws_lambda_powertools.utilities.parser import event_parser
 from aws_lambda_powertools.utilities.parser.models import APIGatewayProxyEventModel
 from core.logger import dynamic_inject_lambda_context, logger
 from messages.service import post_message_service
-from core.auth import CORS_HEADERS
+from messages.service_batch import post_messages_batch_service
+from core.cors import CORS_HEADERS
 
 
 @dynamic_inject_lambda_context
@@ -18,3 +19,17 @@ def lambda_handler(event: APIGatewayProxyEventModel, context: LambdaContext):
         "headers": CORS_HEADERS,
         "body": response.model_dump_json(),
     }
+
+
+@dynamic_inject_lambda_context
+@event_parser(model=APIGatewayProxyEventModel)
+def batch_lambda_handler(event: APIGatewayProxyEventModel, context: LambdaContext):
+    logger.info({"event": "post_messages_batch"})
+
+    response = post_messages_batch_service(event)
+
+    return {
+        "statusCode": 200,
+        "headers": CORS_HEADERS,
+        "body": response.model_dump_json(),
+    }
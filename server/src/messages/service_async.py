@@ -0,0 +1,174 @@
+"""
+The pipeline of messages/service.py on asyncio, for the long-running server
+(app_async.py): OpenAI and Qdrant are called with the async clients over
+pooled connections, and the embeddings of concurrent requests are batched.
+Everything that does not wait on the network is shared with service.py.
+"""
+
+import asyncio
+from typing import AsyncIterator
+from core.aggregates import retrieve_aggregates
+from core.intent import extract_intent_local
+from core.logger import logger
+from core.openai import (
+    LOCAL_INTENT_MIN_CONFIDENCE,
+    close_async_openai,
+    embed_async,
+    extract_intent_async,
+    generate_with_llm_async,
+    generate_with_llm_stream_async,
+)
+from core.qdrant import (
+    RetrievalResult,
+    build_filter,
+    close_async_client,
+    retrieve_contexts_async,
+    retrieve_nearby_async,
+)
+from core.singleflight import create_async_singleflight
+from core.telemetry import Trace, start_trace
+from messages.model import PostMessageRequest, PostMessageResponse
+from messages.service import (
+    AREA_RADII_METERS,
+    NEARBY_MIN_HITS,
+    POINT_RADII_METERS,
+    cached_answer,
+    coalescing_key,
+    log_aggregates,
+    log_hits,
+    log_nearby,
+    no_result_response,
+    store_answer,
+)
+
+singleflight = create_async_singleflight()
+
+
+async def answer_message_async(body: PostMessageRequest) -> PostMessageResponse:
+    response = await singleflight.do(
+        coalescing_key(body), lambda: generate_answer_async(body)
+    )
+    return PostMessageResponse(response=response)
+
+
+async def generate_answer_async(body: PostMessageRequest) -> str:
+    trace = start_trace("answer_message")
+
+    try:
+        result = await retrieve_for_message_async(body, trace)
+
+        if not result.contexts:
+            return no_result_response(body.language)
+
+        log_hits(result)
+
+        # The answer cache may be backed by the sync Qdrant client
+        cached = await asyncio.to_thread(cached_answer, body, result, trace)
+        if cached is not None:
+            return cached
+
+        response = await trace.run_async(
+            "generate_with_llm", generate_with_llm_async, body.message, result.contexts
+        )
+        logger.info({"event": "generate_with_llm", "response": response})
+        await asyncio.to_thread(store_answer, body, result, response)
+        return response
+    finally:
+        trace.finish()
+
+
+async def stream_message_async(body: PostMessageRequest) -> AsyncIterator[str]:
+    trace = start_trace("stream_message")
+
+    try:
+        result = await retrieve_for_message_async(body, trace)
+
+        if not result.contexts:
+            yield no_result_response(body.language)
+            return
+
+        log_hits(result)
+
+        cached = await asyncio.to_thread(cached_answer, body, result, trace)
+        if cached is not None:
+            yield cached
+            return
+
+        span = trace.start_span("generate_with_llm")
+        tokens: list[str] = []
+        async for token in span.aiterate(
+            generate_with_llm_stream_async(body.message, result.contexts)
+        ):
+            if not tokens:
+                trace.record(time_to_first_token_ms=trace.elapsed_ms())
+            tokens.append(token)
+            yield token
+
+        span.end()
+        response = "".join(tokens)
+        logger.info({"event": "generate_with_llm", "response": response})
+        await asyncio.to_thread(store_answer, body, result, response)
+    except Exception as e:
+        logger.exception("Failed to stream a message")
+        raise e
+    finally:
+        trace.finish()
+
+
+async def retrieve_for_message_async(
+    body: PostMessageRequest, trace: Trace
+) -> RetrievalResult:
+    message = body.message
+
+    if body.lat is not None and body.lon is not None:
+        radii_meters = POINT_RADII_METERS if body.is_point else AREA_RADII_METERS
+        result = await trace.run_async(
+            "retrieve_nearby",
+            retrieve_nearby_async,
+            body.lat,
+            body.lon,
+            radii_meters,
+            NEARBY_MIN_HITS,
+        )
+        log_nearby(body.lat, body.lon, result)
+        return result
+
+    intent, confidence = extract_intent_local(message)
+    if confidence >= LOCAL_INTENT_MIN_CONFIDENCE:
+        result = trace.run("retrieve_aggregates", retrieve_aggregates, message, intent)
+        if result is not None:
+            log_aggregates(intent)
+            return result
+
+    with trace.span("intent_and_embed"):
+        vector_task = asyncio.create_task(
+            trace.run_async("embed", embed_async, message)
+        )
+        try:
+            intent = await trace.run_async(
+                "extract_intent", extract_intent_async, message
+            )
+            logger.info({"event": "extract_intent", "intent": intent})
+
+            if confidence < LOCAL_INTENT_MIN_CONFIDENCE:
+                result = trace.run(
+                    "retrieve_aggregates", retrieve_aggregates, message, intent
+                )
+                if result is not None:
+                    log_aggregates(intent)
+                    vector_task.cancel()
+                    return result
+
+            query_filter = build_filter(intent)
+            vector = await vector_task
+        except BaseException:
+            vector_task.cancel()
+            raise
+
+    return await trace.run_async(
+        "retrieve_contexts", retrieve_contexts_async, vector, query_filter
+    )
+
+
+async def close_clients() -> None:
+    await asyncio.gather(close_async_openai(), close_async_client())
@@ -0,0 +1,214 @@
+"""
+Answers many questions in one request (POST /messages/batch), for analysts
+who run their question lists through the API. Questions that need a vector
+search share one embeddings request and one Qdrant batch query; intents and
+answers are requested per question, at most BATCH_MAX_CONCURRENCY at a time.
+A question that fails gets an error of its own, the others are still answered.
+"""
+
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from aws_lambda_powertools.utilities.parser.models import APIGatewayProxyEventModel
+from core.aggregates import retrieve_aggregates
+from core.logger import logger
+from core.openai import embed_many, extract_intent, generate_with_llm
+from core.qdrant import (
+    RetrievalResult,
+    SearchIntent,
+    build_filter,
+    retrieve_contexts_batch,
+)
+from core.telemetry import Trace, start_trace
+from messages.model import (
+    BatchMessageResult,
+    PostMessageRequest,
+    PostMessagesBatchRequest,
+    PostMessagesBatchResponse,
+)
+from messages.service import (
+    cached_answer,
+    log_aggregates,
+    log_hits,
+    no_result_response,
+    retrieve_for_click,
+    store_answer,
+)
+
+# Requests to OpenAI in flight for one batch
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Messages whose answer has not been started after this many seconds get
+# BATCH_TIMEOUT_ERROR, and so do those not answered after
+# BATCH_TIMEOUT_SECONDS, so that the batch returns before API Gateway's 29 s
+BATCH_DEADLINE_SECONDS = float(os.getenv("BATCH_DEADLINE_SECONDS", "15"))
+BATCH_TIMEOUT_SECONDS = float(os.getenv("BATCH_TIMEOUT_SECONDS", "25"))
+
+BATCH_ITEM_ERROR = "Internal Server Error"
+BATCH_TIMEOUT_ERROR = "Timed out before the message was answered"
+
+
+def post_messages_batch_service(
+    event: APIGatewayProxyEventModel,
+) -> PostMessagesBatchResponse:
+    try:
+        body = PostMessagesBatchRequest.model_validate_json(event.body)
+        logger.info(
+            {
+                "event": "validate_post_messages_batch_request",
+                "messages": len(body.messages),
+            }
+        )
+        return answer_messages(body)
+    except Exception as e:
+        logger.exception("Failed to post a batch of messages")
+        raise e
+
+
+def answer_messages(body: PostMessagesBatchRequest) -> PostMessagesBatchResponse:
+    start = time.monotonic()
+    trace = start_trace("answer_messages_batch")
+    trace.record(messages=len(body.messages))
+
+    # Per batch, so that one batch cannot starve the requests of another
+    pool = ThreadPoolExecutor(
+        max_workers=BATCH_MAX_CONCURRENCY, thread_name_prefix="batch"
+    )
+    try:
+        retrieved = retrieve_for_messages(body.messages, pool, trace)
+        futures = [
+            pool.submit(
+                answer_retrieved,
+                message,
+                result,
+                start + BATCH_DEADLINE_SECONDS,
+                trace,
+            )
+            for message, result in zip(body.messages, retrieved)
+        ]
+        results = [
+            collect_answer(future, start + BATCH_TIMEOUT_SECONDS) for future in futures
+        ]
+    finally:
+        # Answers still running after the timeout are not waited for
+        pool.shutdown(wait=False, cancel_futures=True)
+        trace.finish()
+
+    errors = sum(result.error is not None for result in results)
+    timeouts = sum(result.error == BATCH_TIMEOUT_ERROR for result in results)
+    logger.info(
+        {
+            "event": "answer_messages_batch",
+            "messages": len(results),
+            "errors": errors,
+            "timeouts": timeouts,
+        }
+    )
+    return PostMessagesBatchResponse(results=results)
+
+
+def retrieve_for_messages(
+    messages: list[PostMessageRequest], pool: ThreadPoolExecutor, trace: Trace
+) -> list[RetrievalResult | Exception]:
+    """
+    retrieve_for_message() for every message, in input order. A message that
+    failed gets its exception instead of a result.
+    """
+    planned = list(pool.map(lambda body: try_plan_retrieval(body, trace), messages))
+
+    # Intents (dicts) are left for the vector search
+    searches = [i for i, item in enumerate(planned) if isinstance(item, dict)]
+    if not searches:
+        return planned
+
+    try:
+        vectors = trace.run(
+            "embed", embed_many, [messages[i].message for i in searches]
+        )
+        query_filters = [build_filter(planned[i]) for i in searches]
+        results = trace.run(
+            "retrieve_contexts", retrieve_contexts_batch, vectors, query_filters
+        )
+    except Exception as e:
+        logger.exception("Failed to retrieve the contexts of a batch")
+        results = [e] * len(searches)
+
+    for i, result in zip(searches, results):
+        planned[i] = result
+    return planned
+
+
+def try_plan_retrieval(
+    body: PostMessageRequest, trace: Trace
+) -> RetrievalResult | SearchIntent | Exception:
+    try:
+        return plan_retrieval(body, trace)
+    except Exception as e:
+        logger.exception("Failed to retrieve a message of a batch")
+        return e
+
+
+def plan_retrieval(
+    body: PostMessageRequest, trace: Trace
+) -> RetrievalResult | SearchIntent:
+    """
+    The result of a message that needs no vector search (map clicks and
+    aggregate questions), or else the intent to filter its search with.
+    """
+    if body.lat is not None and body.lon is not None:
+        return retrieve_for_click(body, trace)
+
+    intent = trace.run("extract_intent", extract_intent, body.message)
+    logger.info({"event": "extract_intent", "intent": intent})
+
+    result = trace.run("retrieve_aggregates", retrieve_aggregates, body.message, intent)
+    if result is not None:
+        log_aggregates(intent)
+        return result
+    return intent
+
+
+def answer_retrieved(
+    body: PostMessageRequest,
+    retrieved: RetrievalResult | Exception,
+    deadline: float,
+    trace: Trace,
+) -> BatchMessageResult:
+    if isinstance(retrieved, Exception):
+        return BatchMessageResult(error=BATCH_ITEM_ERROR)
+    if time.monotonic() > deadline:
+        return BatchMessageResult(error=BATCH_TIMEOUT_ERROR)
+
+    try:
+        return BatchMessageResult(response=generate_answer_for(body, retrieved, trace))
+    except Exception:
+        logger.exception("Failed to answer a message of a batch")
+        return BatchMessageResult(error=BATCH_ITEM_ERROR)
+
+
+def collect_answer(future: Future, timeout_at: float) -> BatchMessageResult:
+    try:
+        return future.result(timeout=max(timeout_at - time.monotonic(), 0))
+    except TimeoutError:
+        return BatchMessageResult(error=BATCH_TIMEOUT_ERROR)
+
+
+def generate_answer_for(
+    body: PostMessageRequest, result: RetrievalResult, trace: Trace
+) -> str:
+    # generate_answer() once the contexts are retrieved
+    if not result.contexts:
+        return no_result_response(body.language)
+
+    log_hits(result)
+
+    cached = cached_answer(body, result, trace)
+    if cached is not None:
+        return cached
+
+    response = trace.run(
+        "generate_with_llm", generate_with_llm, body.message, result.contexts
+    )
+    logger.info({"event": "generate_with_llm", "response": response})
+    store_answer(body, result, response)
+    return response
@@ -0,0 +1,102 @@
+import uuid
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient, models
+from core import intent, local_index
+from core.intent import Gazetteer
+from core.local_index import LocalIndex
+from core.qdrant import COLLECTION_NAME
+
+# L01_024 as found in the GeoJSON: mostly without the 区/市 suffix
+WARDS = ["港", "北", "中央", "多摩", "千代田", "新宿", "府中市", "奥多摩町"]
+STATIONS = ["新宿", "府中", "東京", "浜松町"]
+
+LAND_WARDS = ["港区", "新宿区", "府中市"]
+LAND_USAGES = ["住宅", "店舗"]
+LAND_DIMENSIONS = 8
+
+
+@pytest.fixture
+def gazetteer(monkeypatch):
+    gazetteer = Gazetteer.from_vocabulary(
+        wards=WARDS, stations=STATIONS, usages=intent.USAGES
+    )
+    monkeypatch.setattr(intent, "load_gazetteer", lambda: gazetteer)
+    return gazetteer
+
+
+@pytest.fixture(scope="session")
+def land_points() -> list[models.PointStruct]:
+    """
+    Random points around central Tokyo, with the payload fields the server
+    filters on and renders.
+    """
+    rng = np.random.default_rng(0)
+    points = []
+    for i in range(300):
+        distance = int(rng.integers(0, 2000))
+        points.append(
+            models.PointStruct(
+                id=str(uuid.UUID(int=i)),
+                vector=rng.normal(size=LAND_DIMENSIONS).tolist(),
+                payload={
+                    "ward": LAND_WARDS[i % len(LAND_WARDS)],
+                    "address": f"東京都　テスト{i}丁目{i}番",
+                    "station": STATIONS[i % len(STATIONS)],
+                    "usage": LAND_USAGES[i % len(LAND_USAGES)],
+                    "time_to_station": -(-distance // 80),
+                    "is_top_1_percent_price": i % 50 == 0,
+                    "price": int(rng.integers(100_000, 10_000_000)),
+                    "price_percentile": i / 3,
+                    "change_rate": float(rng.uniform(-5, 5)),
+                    "content_hash": f"{i:064x}",
+                    "location": {
+                        "lat": float(35.6 + rng.uniform(-0.05, 0.05)),
+                        "lon": float(139.7 + rng.uniform(-0.05, 0.05)),
+                    },
+                },
+            )
+        )
+    return points
+
+
+@pytest.fixture(scope="session")
+def land_client(land_points):
+    """
+    The points in an in-memory Qdrant collection named like the server's.
+    """
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=models.VectorParams(
+            size=LAND_DIMENSIONS, distance=models.Distance.COSINE
+        ),
+    )
+    client.upsert(collection_name=COLLECTION_NAME, points=land_points)
+    yield client
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def land_index(land_points, tmp_path_factory) -> LocalIndex:
+    """
+    The points in the layout of init_qdrant.py --export-index.
+    """
+    directory = tmp_path_factory.mktemp("index")
+    vectors = np.array([point.vector for point in land_points], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.save(directory / local_index.VECTORS_FILE, vectors)
+
+    columns: dict[str, list] = {"id": [point.id for point in land_points]}
+    for point in land_points:
+        for key, value in point.payload.items():
+            if isinstance(value, dict):
+                for field, v in value.items():
+                    columns.setdefault(f"{key}.{field}", []).append(v)
+            else:
+                columns.setdefault(key, []).append(value)
+    np.savez(
+        directory / local_index.PAYLOAD_FILE,
+        **{key: np.array(values) for key, values in columns.items()},
+    )
+    return LocalIndex.load(directory)
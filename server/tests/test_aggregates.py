@@ -0,0 +1,123 @@
+import pytest
+from core import aggregates
+from core.aggregates import Aggregates, retrieve_aggregates
+from core.intent import extract_intent_local
+
+pytestmark = pytest.mark.usefixtures("gazetteer")
+
+
+def group(pid: str) -> dict:
+    return {
+        "count": 3,
+        "price": {
+            "mean": 1_000_000,
+            "median": 1_000_000,
+            "min": 500_000,
+            "max": 2_000_000,
+        },
+        "change_rate": {
+            "mean": 1.0,
+            "median": 1.0,
+            "min": -1.0,
+            "max": 3.0,
+            "p10": -0.5,
+            "p90": 2.5,
+            "rising": 2,
+            "falling": 1,
+        },
+        "top_price": [pid],
+        "bottom_price": [pid],
+        "top_change_rate": [pid],
+        "bottom_change_rate": [pid],
+    }
+
+
+@pytest.fixture(autouse=True)
+def fixture_aggregates(monkeypatch):
+    point = {
+        "price": 2_000_000,
+        "price_percentile": 99.0,
+        "change_rate": 3.0,
+        "ward": "港",
+        "address": "港区芝公園4丁目",
+        "station": "浜松町",
+        "usage": "住宅",
+        "time_to_station": 5,
+    }
+    data = Aggregates(
+        overall=group("p1"),
+        wards={"港": group("p1")},
+        stations={"浜松町": group("p1"), "東京": group("p1")},
+        points={"p1": point},
+    )
+    monkeypatch.setattr(aggregates, "load_aggregates", lambda: data)
+
+
+def ask(question: str):
+    intent, _ = extract_intent_local(question)
+    return retrieve_aggregates(question, intent)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "東京都の地価の平均は?",
+        "東京都の平均地価は？",
+        "都内の土地の相場はいくら?",
+        "What is the average land price in Tokyo?",
+    ],
+)
+def test_tokyo_statistics(question):
+    result = ask(question)
+
+    assert result is not None
+    assert result.contexts[0].splitlines()[1].startswith("東京都|")
+
+
+def test_station_statistics():
+    result = ask("東京駅の平均地価は?")
+
+    assert result is not None
+    assert result.contexts[0].splitlines()[1].startswith("東京|")
+
+
+def test_tokyo_read_as_a_station():
+    # What an LLM intent may make of 東京都
+    result = retrieve_aggregates("東京都の平均地価は?", {"station": "東京"})
+
+    assert result is not None
+    assert result.contexts[0].splitlines()[1].startswith("東京都|")
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "公園の近くの土地の相場は?",
+        "東京タワーの近くの土地はいくら?",
+        "What is the typical price near Tokyo Tower?",
+        "How much is land near the river?",
+    ],
+)
+def test_statistics_without_a_place_are_searched(question):
+    assert ask(question) is None
+
+
+def test_ward_statistics():
+    result = ask("港区の地価の相場は?")
+
+    assert result is not None
+    assert result.contexts[0].splitlines()[1].startswith("港|")
+
+
+@pytest.mark.parametrize(
+    "question", ["最も地価が高い地点は?", "東京都で最も地価が高い地点は?"]
+)
+def test_superlative_within_tokyo(question):
+    result = ask(question)
+
+    assert result is not None
+    assert [hit.id for hit in result.hits] == ["p1"]
+
+
+def test_unsupported_filters_are_searched():
+    assert ask("港区の住宅地の相場は?") is None
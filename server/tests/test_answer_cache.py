@@ -0,0 +1,99 @@
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import FieldCondition, Filter, MatchValue, ScoredPoint
+from core.answer_cache import (
+    AnswerCache,
+    MemoryAnswerBackend,
+    QdrantAnswerBackend,
+    bucket_key,
+)
+
+MINATO = Filter(must=[FieldCondition(key="ward", match=MatchValue(value="港区"))])
+
+
+def hit(pid: int, content_hash: str) -> ScoredPoint:
+    return ScoredPoint(
+        id=pid, version=0, score=0.9, payload={"content_hash": content_hash}
+    )
+
+
+def test_bucket_key_ignores_the_order_of_hits():
+    hits = [hit(1, "a"), hit(2, "b")]
+
+    assert bucket_key(MINATO, hits, "ja") == bucket_key(MINATO, hits[::-1], "ja")
+
+
+@pytest.mark.parametrize(
+    "query_filter, hits, language",
+    [
+        # Ingestion changed the payload of a retrieved point
+        (MINATO, [hit(1, "a"), hit(2, "c")], "ja"),
+        (MINATO, [hit(1, "a"), hit(3, "b")], "ja"),
+        (MINATO, [hit(1, "a")], "ja"),
+        (None, [hit(1, "a"), hit(2, "b")], "ja"),
+        (MINATO, [hit(1, "a"), hit(2, "b")], "en"),
+    ],
+)
+def test_bucket_key_changes(query_filter, hits, language):
+    assert bucket_key(MINATO, [hit(1, "a"), hit(2, "b")], "ja") != bucket_key(
+        query_filter, hits, language
+    )
+
+
+@pytest.fixture(params=["memory", "qdrant"])
+def cache(request):
+    if request.param == "memory":
+        backend = MemoryAnswerBackend(max_buckets=8, ttl_seconds=60)
+        yield AnswerCache(backend, threshold=0.95)
+    else:
+        client = QdrantClient(":memory:")
+        yield AnswerCache(QdrantAnswerBackend(lambda: client, 60), threshold=0.95)
+        client.close()
+
+
+def test_similar_question_hits(cache):
+    bucket = bucket_key(MINATO, [hit(1, "a")], "ja")
+    cache.set(bucket, [1.0, 0.0, 0.0], "answer")
+
+    assert cache.get(bucket, [0.99, 0.05, 0.0]) == "answer"
+    assert cache.get(bucket, [0.5, 0.5, 0.5]) is None
+    assert cache.stats == {"hits": 1, "misses": 1}
+
+
+def test_changed_content_misses(cache):
+    cache.set(bucket_key(MINATO, [hit(1, "a")], "ja"), [1.0, 0.0, 0.0], "answer")
+
+    bucket = bucket_key(MINATO, [hit(1, "b")], "ja")
+    assert cache.get(bucket, [1.0, 0.0, 0.0]) is None
+
+
+def test_expired_answers_miss():
+    cache = AnswerCache(MemoryAnswerBackend(8, ttl_seconds=-1), threshold=0.95)
+    cache.set("bucket", [1.0, 0.0], "answer")
+
+    assert cache.get("bucket", [1.0, 0.0]) is None
+
+
+def test_least_recently_used_bucket_is_evicted():
+    cache = AnswerCache(MemoryAnswerBackend(max_buckets=2, ttl_seconds=60), 0.95)
+    cache.set("a", [1.0, 0.0], "answer a")
+    cache.set("b", [1.0, 0.0], "answer b")
+    cache.get("a", [1.0, 0.0])
+    cache.set("c", [1.0, 0.0], "answer c")
+
+    assert cache.get("a", [1.0, 0.0]) == "answer a"
+    assert cache.get("b", [1.0, 0.0]) is None
+
+
+def test_backend_errors_are_misses():
+    class Broken:
+        def search(self, bucket, vector, threshold):
+            raise ConnectionError("down")
+
+        def add(self, bucket, vector, answer):
+            raise ConnectionError("down")
+
+    cache = AnswerCache(Broken(), threshold=0.95)
+    cache.set("bucket", [1.0, 0.0], "answer")
+
+    assert cache.get("bucket", [1.0, 0.0]) is None
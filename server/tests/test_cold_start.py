@@ -0,0 +1,75 @@
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from core import openai, secret
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+HEAVY_MODULES = ["qdrant_client", "openai", "boto3", "numpy"]
+
+
+def loaded_modules(module: str) -> set[str]:
+    """
+    The modules a fresh interpreter loads to import the module, as on a cold
+    start in production.
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {module}; print('\\n'.join(sys.modules))",
+        ],
+        cwd=SRC,
+        env={"Environment": "prod"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {name.partition(".")[0] for name in result.stdout.split()}
+
+
+@pytest.mark.parametrize("module", ["health.handler", "core.auth"])
+def test_light_handlers_skip_heavy_imports(module):
+    assert not loaded_modules(module) & set(HEAVY_MODULES)
+
+
+def test_nothing_is_fetched_at_import_time():
+    # boto3 is only needed to fetch secrets and for the shared caches
+    assert "boto3" not in loaded_modules("messages.handler")
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    fetched = []
+
+    def get_secret():
+        fetched.append(len(fetched))
+        return {
+            "OPENAI_API_KEY": f"key-{len(fetched)}",
+            "QDRANT_API_KEY": "",
+            "QDRANT_HOST": "",
+        }
+
+    monkeypatch.setattr(secret, "get_secret", get_secret)
+    monkeypatch.setattr(secret, "_cached", None)
+    return fetched
+
+
+def test_secrets_are_fetched_once(fetched):
+    secret.get_secrets()
+    secret.get_secrets()
+
+    assert len(fetched) == 1
+
+
+def test_rotated_secrets_get_a_new_client(fetched, monkeypatch):
+    monkeypatch.setattr(secret, "SECRETS_TTL_SECONDS", 0)
+    openai.create_openai.cache_clear()
+
+    first = openai.get_openai()
+    second = openai.get_openai()
+    openai.create_openai.cache_clear()
+
+    assert len(fetched) == 2
+    assert first is not second
+    assert second.api_key == "key-2"
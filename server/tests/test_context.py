@@ -0,0 +1,94 @@
+import pytest
+from qdrant_client.http.models import ScoredPoint
+from core.context import (
+    TABLE_HEADER,
+    context_fields,
+    estimate_tokens,
+    render_contexts,
+    short_address,
+)
+
+
+def hit(pid: int, **payload) -> ScoredPoint:
+    payload = {
+        "ward": "千代田区",
+        "address": "東京都　千代田区富士見１丁目８番６",
+        "station": "飯田橋",
+        "time_to_station": 4,
+        "usage": "住宅",
+        "price": 2_450_000,
+        "price_percentile": 97.6,
+        "change_rate": 6.25,
+        "semantic_text": f"地点{pid}",
+        **payload,
+    }
+    return ScoredPoint(id=pid, version=0, score=0.9, payload=payload)
+
+
+@pytest.mark.parametrize(
+    "address, ward, expected",
+    [
+        ("東京都　千代田区富士見１丁目８番６", "千代田区", "富士見１丁目"),
+        ("東京都　府中市宮町2-1", "府中市", "宮町"),
+        ("東京都 港区 芝公園", "港区", "芝公園"),
+    ],
+)
+def test_short_address(address, ward, expected):
+    assert short_address(address, ward) == expected
+
+
+def test_table():
+    contexts = render_contexts([hit(1), hit(2, price=980_000, change_rate=-0.4)])
+
+    assert contexts == [
+        "\n".join(
+            [
+                TABLE_HEADER,
+                "千代田区|富士見１丁目|飯田橋|4|住宅|2,450,000|上位2%|+6.2",
+                "千代田区|富士見１丁目|飯田橋|4|住宅|980,000|上位2%|-0.4",
+            ]
+        )
+    ]
+
+
+def test_identical_rows_are_kept_once():
+    # Two points on the same block with the same price
+    contexts = render_contexts(
+        [hit(1), hit(2, address="東京都　千代田区富士見１丁目９番")]
+    )
+
+    assert contexts[0].count("\n") == 1
+
+
+def test_token_budget_drops_the_last_points():
+    hits = [hit(i, price=1_000_000 + i) for i in range(50)]
+    row_tokens = estimate_tokens(render_contexts(hits[:1])[0]) - estimate_tokens(
+        TABLE_HEADER
+    )
+
+    contexts = render_contexts(
+        hits, token_budget=estimate_tokens(TABLE_HEADER) + 3 * row_tokens
+    )
+
+    assert contexts[0].count("\n") == 3
+    assert "1,000,000" in contexts[0]
+    # The first point is kept even over the budget
+    assert render_contexts(hits, token_budget=0)[0].count("\n") == 1
+
+
+def test_text_format():
+    contexts = render_contexts([hit(1), hit(2), hit(3, semantic_text="地点1")], "text")
+
+    assert contexts == ["地点1", "地点2"]
+    assert context_fields("text") == ["semantic_text"]
+
+
+def test_nothing_retrieved():
+    assert render_contexts([]) == []
+
+
+def test_invalid_format():
+    with pytest.raises(ValueError):
+        render_contexts([hit(1)], "html")
+    with pytest.raises(ValueError):
+        context_fields("html")
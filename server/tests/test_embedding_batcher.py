@@ -0,0 +1,67 @@
+import asyncio
+from core.embedding_batcher import EmbeddingBatcher
+
+
+class Embedder:
+    def __init__(self, error: Exception | None = None):
+        self.batches: list[list[str]] = []
+        self.error = error
+
+    async def __call__(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(texts)
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return [[float(len(text))] for text in texts]
+
+
+def run(batcher: EmbeddingBatcher, texts: list[str]):
+    async def main():
+        return await asyncio.gather(
+            *(batcher.embed(text) for text in texts), return_exceptions=True
+        )
+
+    return asyncio.run(main())
+
+
+def test_concurrent_texts_share_a_request():
+    embed = Embedder()
+
+    vectors = run(EmbeddingBatcher(embed, max_wait_ms=5), ["a", "bb", "a", "ccc"])
+
+    assert vectors == [[1.0], [2.0], [1.0], [3.0]]
+    # Identical texts are embedded once
+    assert embed.batches == [["a", "bb", "ccc"]]
+
+
+def test_full_batches_are_sent_without_waiting():
+    embed = Embedder()
+    # Long enough to time out the test if full batches waited for it
+    batcher = EmbeddingBatcher(embed, max_batch_size=2, max_wait_ms=60_000)
+
+    vectors = run(batcher, ["a", "bb", "ccc", "dddd"])
+
+    assert vectors == [[1.0], [2.0], [3.0], [4.0]]
+    assert embed.batches == [["a", "bb"], ["ccc", "dddd"]]
+
+
+def test_a_failed_request_fails_its_batch():
+    embed = Embedder(error=ConnectionError("down"))
+
+    results = run(EmbeddingBatcher(embed), ["a", "bb"])
+
+    assert [type(result) for result in results] == [ConnectionError] * 2
+    assert len(embed.batches) == 1
+
+
+def test_later_texts_start_a_new_batch():
+    embed = Embedder()
+    batcher = EmbeddingBatcher(embed, max_wait_ms=1)
+
+    async def main():
+        first = await batcher.embed("a")
+        second = await batcher.embed("a")
+        return first, second
+
+    assert asyncio.run(main()) == ([1.0], [1.0])
+    assert embed.batches == [["a"], ["a"]]
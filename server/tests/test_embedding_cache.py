@@ -0,0 +1,52 @@
+from core import embedding_cache
+from core.embedding_cache import EmbeddingCache, LRUCache, SqliteCacheBackend
+
+
+class Embedder:
+    def __init__(self):
+        self.texts: list[str] = []
+
+    def __call__(self, text: str) -> list[float]:
+        self.texts.append(text)
+        return [float(len(self.texts)), 0.5]
+
+
+def test_memory_hit(monkeypatch):
+    logged = []
+    monkeypatch.setattr(embedding_cache.logger, "info", logged.append)
+    cache = EmbeddingCache(memory=LRUCache(max_size=8, ttl_seconds=60))
+    embed = Embedder()
+
+    first = cache.get_or_compute("model", "港区の地価は?", embed)
+    second = cache.get_or_compute("model", " 港区の地価は？", embed)
+
+    assert first == second
+    assert embed.texts == ["港区の地価は?"]
+    assert cache.stats == {"memory_hits": 1, "shared_hits": 0, "misses": 1}
+    # Lookups are only logged at DEBUG level
+    assert logged == []
+
+
+def test_shared_hit_fills_memory(tmp_path):
+    shared = SqliteCacheBackend(str(tmp_path / "cache.sqlite3"), 100, 60)
+    embed = Embedder()
+    EmbeddingCache(LRUCache(8, 60), shared).get_or_compute("model", "q", embed)
+
+    # Another container, with an empty memory tier
+    cache = EmbeddingCache(LRUCache(8, 60), shared)
+    vector = cache.get_or_compute("model", "q", embed)
+    cache.get_or_compute("model", "q", embed)
+
+    assert vector == [1.0, 0.5]
+    assert embed.texts == ["q"]
+    assert cache.stats == {"memory_hits": 1, "shared_hits": 1, "misses": 0}
+
+
+def test_models_do_not_share_entries():
+    cache = EmbeddingCache(LRUCache(8, 60))
+    embed = Embedder()
+
+    cache.get_or_compute("small", "q", embed)
+    cache.get_or_compute("large", "q", embed)
+
+    assert embed.texts == ["q", "q"]
@@ -0,0 +1,90 @@
+import pytest
+from core.intent import extract_intent_local
+
+pytestmark = pytest.mark.usefixtures("gazetteer")
+
+
+@pytest.mark.parametrize(
+    "question, ward",
+    [
+        ("港区の住宅地の地価は?", "港"),
+        ("北区で最も高い地点は?", "北"),
+        ("中央区の店舗の地価", "中央"),
+        ("多摩市の住宅地", "多摩"),
+        ("千代田区の事務所", "千代田"),
+        ("府中市の住宅地", "府中市"),
+        ("府中の住宅地", "府中市"),
+        ("奥多摩の山林", "奥多摩町"),
+    ],
+)
+def test_ward(question, ward):
+    result, confidence = extract_intent_local(question)
+
+    assert result["ward"] == ward
+    assert confidence > 0
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "駅の北口にある住宅地の地価は?",
+        "線路の北側の住宅地",
+        "中央線沿いの住宅地",
+        "多摩川に近い住宅地",
+        "千代田線の駅から徒歩5分の事務所",
+        "港町の店舗",
+        "中央町の住宅地",
+    ],
+)
+def test_no_ward_from_other_words(question):
+    result, _ = extract_intent_local(question)
+
+    assert "ward" not in result
+
+
+def test_station():
+    result, confidence = extract_intent_local("新宿駅から徒歩5分以内の店舗")
+
+    assert result == {"station": "新宿", "usage": "店舗", "time_to_station_max": 5}
+    assert confidence == 1.0
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("東京都の地価の平均は?", {}),
+        ("東京都で最も地価が高い地点は?", {"require_max_price": True}),
+        ("東京の住宅地の相場は?", {"usage": "住宅"}),
+    ],
+)
+def test_tokyo_is_not_a_station(question, expected):
+    result, confidence = extract_intent_local(question)
+
+    assert result == expected
+    assert confidence == 1.0
+
+
+def test_tokyo_station():
+    result, confidence = extract_intent_local("東京駅から徒歩10分以内の事務所")
+
+    assert result == {"station": "東京", "usage": "事務所", "time_to_station_max": 10}
+    assert confidence == 1.0
+
+
+def test_ward_or_station_is_ambiguous():
+    result, confidence = extract_intent_local("新宿の住宅地")
+
+    assert result["ward"] == "新宿"
+    assert confidence < 1.0
+
+
+def test_superlative():
+    result, _ = extract_intent_local("港区で最も地価が高い地点は?")
+
+    assert result == {"ward": "港", "require_max_price": True}
+
+
+def test_unknown_place_lowers_confidence():
+    _, confidence = extract_intent_local("What is the price near Shibuya?")
+
+    assert confidence < 1.0
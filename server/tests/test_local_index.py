@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from qdrant_client.http.models import Filter
+from conftest import LAND_DIMENSIONS as DIMENSIONS
+from core import local_index
+from core.local_index import haversine_meters
+from core.qdrant import (
+    COLLECTION_NAME,
+    build_filter,
+    build_geo_filter,
+    build_radius_filter,
+)
+
+
+def test_vectors_are_memory_mapped(land_index):
+    assert isinstance(land_index.vectors, np.memmap)
+    assert len(land_index) == 300
+
+
+@pytest.mark.parametrize(
+    "query_filter",
+    [
+        None,
+        build_filter({"ward": "港区"}),
+        build_filter({"ward": "新宿区", "usage": "店舗", "time_to_station_max": 10}),
+        build_filter({"require_top_1_percent_price": True}),
+        build_geo_filter(35.6, 139.7, bbox_size_meters=3000),
+        build_radius_filter(35.62, 139.68, 2000),
+    ],
+)
+def test_query_matches_qdrant(land_index, land_client, query_filter):
+    rng = np.random.default_rng(1)
+    for _ in range(5):
+        vector = rng.normal(size=DIMENSIONS).tolist()
+        expected = land_client.query_points(
+            collection_name=COLLECTION_NAME,
+            query=vector,
+            query_filter=query_filter,
+            limit=10,
+            with_payload=True,
+        ).points
+
+        hits = land_index.query(vector, query_filter, limit=10)
+
+        assert [hit.id for hit in hits] == [hit.id for hit in expected]
+        assert [hit.score for hit in hits] == pytest.approx(
+            [hit.score for hit in expected], abs=1e-5
+        )
+        assert [hit.payload for hit in hits] == [hit.payload for hit in expected]
+
+
+def test_query_projects_the_payload(land_index):
+    hits = land_index.query(
+        [1.0] * DIMENSIONS, None, limit=3, fields=["ward", "location"]
+    )
+
+    assert len(hits) == 3
+    assert all(set(hit.payload) == {"ward", "location"} for hit in hits)
+
+
+def test_query_without_matches(land_index):
+    assert land_index.query([1.0] * DIMENSIONS, build_filter({"ward": "北区"}), 5) == []
+
+
+def test_unsupported_filters_raise(land_index):
+    query_filter = Filter(must_not=build_filter({"ward": "港区"}).must)
+
+    with pytest.raises(ValueError):
+        land_index.query([1.0] * DIMENSIONS, query_filter, limit=5)
+
+
+def test_nearest_grows_the_radius(land_index):
+    lat, lon = 35.6, 139.7
+    distances = haversine_meters(
+        lat, lon, land_index.columns["location.lat"], land_index.columns["location.lon"]
+    )
+    radii = [10.0, 1000.0, 100_000.0]
+    expected_radius = next(r for r in radii if np.count_nonzero(distances <= r) >= 3)
+
+    radius, hits = land_index.nearest(lat, lon, radii, min_hits=3, limit=5)
+
+    assert radius == expected_radius
+    assert 3 <= len(hits) <= 5
+    assert [hit.score for hit in hits] == sorted(distances[distances <= radius])[
+        : len(hits)
+    ]
+
+
+def test_load_local_index_checks_dimensions(monkeypatch, tmp_path):
+    monkeypatch.setattr(local_index, "LOCAL_INDEX_DIR", tmp_path)
+    np.save(tmp_path / local_index.VECTORS_FILE, np.ones((1, 4), dtype=np.float32))
+    np.savez(tmp_path / local_index.PAYLOAD_FILE, id=np.array(["a"]))
+    local_index.load_local_index.cache_clear()
+
+    with pytest.raises(ValueError, match="export it again"):
+        local_index.load_local_index()
+    local_index.load_local_index.cache_clear()
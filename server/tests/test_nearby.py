@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from core import qdrant
+from core.qdrant import RetrievalResult, retrieve_nearby
+from core.telemetry import NoopTrace
+from messages import service
+from messages.model import PostMessageRequest
+
+RADII = [50, 100, 250, 500, 1000]
+
+
+@pytest.fixture
+def backends(monkeypatch, land_client, land_index):
+    """
+    retrieve_nearby() on Qdrant, then on the local index, for the same click.
+    """
+
+    def qdrant_backend(*args, **kwargs):
+        monkeypatch.setattr(qdrant, "RETRIEVAL_BACKEND", "qdrant")
+        monkeypatch.setattr(qdrant, "get_client", lambda: land_client)
+        return retrieve_nearby(*args, **kwargs)
+
+    def local_backend(*args, **kwargs):
+        monkeypatch.setattr(qdrant, "RETRIEVAL_BACKEND", "local")
+        monkeypatch.setattr(qdrant, "load_local_index", lambda: land_index)
+        return retrieve_nearby(*args, **kwargs)
+
+    return qdrant_backend, local_backend
+
+
+@pytest.mark.parametrize("min_hits", [1, 3])
+def test_backends_agree(backends, min_hits):
+    rng = np.random.default_rng(2)
+    for _ in range(20):
+        lat, lon = 35.6 + rng.uniform(-0.05, 0.05), 139.7 + rng.uniform(-0.05, 0.05)
+
+        results = [backend(lat, lon, RADII, min_hits) for backend in backends]
+
+        on_qdrant, on_local = results
+        assert on_qdrant.radius_meters == on_local.radius_meters
+        assert [hit.id for hit in on_qdrant.hits] == [hit.id for hit in on_local.hits]
+        assert [hit.score for hit in on_qdrant.hits] == pytest.approx(
+            [hit.score for hit in on_local.hits]
+        )
+        assert on_qdrant.contexts == on_local.contexts
+
+
+def test_nearest_first_within_the_radius(backends):
+    for backend in backends:
+        result = backend(35.6, 139.7, RADII, min_hits=3)
+
+        scores = [hit.score for hit in result.hits]
+        assert len(scores) >= 3
+        assert scores == sorted(scores)
+        assert scores[-1] <= result.radius_meters
+        assert set(result.hits[0].payload) == set(qdrant.NEARBY_PAYLOAD)
+
+
+def test_nothing_nearby(backends):
+    for backend in backends:
+        result = backend(36.5, 138.0, RADII, min_hits=1)
+
+        assert result.radius_meters == RADII[-1]
+        assert result.hits == []
+
+
+def test_clicks_are_not_embedded(monkeypatch):
+    def unexpected(*args):
+        raise AssertionError("called for a click")
+
+    nearby = []
+    monkeypatch.setattr(service, "embed", unexpected)
+    monkeypatch.setattr(service, "extract_intent", unexpected)
+    monkeypatch.setattr(service, "extract_intent_local", unexpected)
+    monkeypatch.setattr(
+        service,
+        "retrieve_nearby",
+        lambda *args: nearby.append(args) or RetrievalResult(contexts=[], hits=[]),
+    )
+
+    point = PostMessageRequest(message="q", lat=35.6, lon=139.7, is_point=True)
+    area = PostMessageRequest(message="q", lat=35.6, lon=139.7, is_point=False)
+    service.retrieve_for_message(point, NoopTrace("test"))
+    service.retrieve_for_message(area, NoopTrace("test"))
+
+    assert [args[2] for args in nearby] == [
+        service.POINT_RADII_METERS,
+        service.AREA_RADII_METERS,
+    ]
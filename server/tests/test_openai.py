@@ -0,0 +1,23 @@
+import asyncio
+from types import SimpleNamespace
+from core import openai
+from core.openai import embed_batch_async
+
+
+class FakeEmbeddings:
+    async def create(self, input, model, dimensions):
+        # The API does not promise the order of data
+        data = [
+            SimpleNamespace(index=i, embedding=[float(len(text))])
+            for i, text in enumerate(input)
+        ]
+        return SimpleNamespace(data=data[::-1], usage=None)
+
+
+def test_embed_batch_async_keeps_the_input_order(monkeypatch):
+    client = SimpleNamespace(embeddings=FakeEmbeddings())
+    monkeypatch.setattr(openai, "get_async_openai", lambda: client)
+
+    vectors = asyncio.run(embed_batch_async(["a", "bb", "ccc"]))
+
+    assert vectors == [[1.0], [2.0], [3.0]]
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from conftest import LAND_DIMENSIONS
+from core import qdrant
+from core.qdrant import build_filter, retrieve_contexts, retrieve_contexts_batch
+from messages import service
+
+FILTERS = [None, build_filter({"ward": "港区"}), build_filter({"usage": "店舗"})]
+
+
+@pytest.fixture(params=["qdrant", "local"])
+def backend(request, monkeypatch, land_client, land_index):
+    monkeypatch.setattr(qdrant, "RETRIEVAL_BACKEND", request.param)
+    monkeypatch.setattr(qdrant, "get_client", lambda: land_client)
+    monkeypatch.setattr(qdrant, "load_local_index", lambda: land_index)
+    return request.param
+
+
+def vectors(n: int) -> list[list[float]]:
+    return np.random.default_rng(3).normal(size=(n, LAND_DIMENSIONS)).tolist()
+
+
+def test_hits_carry_only_the_rendered_fields(backend):
+    result = retrieve_contexts(vectors(1)[0], None)
+
+    assert len(result.hits) == 5
+    for hit in result.hits:
+        assert set(hit.payload) == set(qdrant.SEARCH_PAYLOAD)
+        assert hit.vector is None
+    assert result.contexts
+
+
+def test_whole_payload_on_request(backend, land_points):
+    result = retrieve_contexts(vectors(1)[0], None, payload_fields=None)
+
+    assert set(result.hits[0].payload) == set(land_points[0].payload)
+
+
+def test_batch_matches_single_queries(backend):
+    queries = vectors(len(FILTERS))
+
+    results = retrieve_contexts_batch(queries, FILTERS)
+
+    for vector, query_filter, result in zip(queries, FILTERS, results):
+        single = retrieve_contexts(vector, query_filter)
+        assert [hit.id for hit in result.hits] == [hit.id for hit in single.hits]
+        assert result.contexts == single.contexts
+        assert result.query_filter == query_filter
+
+
+@pytest.mark.parametrize("sample_rate, events", [(0.0, 0), (1.0, 1)])
+def test_hit_logs_are_sampled(monkeypatch, backend, sample_rate, events):
+    logged = []
+    monkeypatch.setattr(service.logger, "info", logged.append)
+    monkeypatch.setattr(service, "HIT_LOG_SAMPLE_RATE", sample_rate)
+    result = retrieve_contexts(vectors(1)[0], None)
+
+    service.log_hits(result)
+
+    assert len(logged) == events
+    for event in logged:
+        assert event == {
+            "event": "retrieved_hits",
+            "ids": [str(hit.id) for hit in result.hits],
+            "scores": [round(hit.score, 4) for hit in result.hits],
+        }
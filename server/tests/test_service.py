@@ -0,0 +1,52 @@
+import threading
+import pytest
+from core.telemetry import NoopTrace
+from messages import service
+from messages.model import PostMessageRequest
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """
+    Records the thread each OpenAI call runs on; no aggregates or contexts.
+    """
+    threads: dict[str, str] = {}
+
+    def embed(message):
+        threads["embed"] = threading.current_thread().name
+        return [0.0]
+
+    def extract_intent(message):
+        threads["extract_intent"] = threading.current_thread().name
+        return {}
+
+    monkeypatch.setattr(service, "extract_intent_local", lambda message: ({}, 0.0))
+    monkeypatch.setattr(service, "retrieve_aggregates", lambda message, intent: None)
+    monkeypatch.setattr(service, "embed", embed)
+    monkeypatch.setattr(service, "extract_intent", extract_intent)
+    monkeypatch.setattr(
+        service, "retrieve_contexts", lambda vector, query_filter: vector
+    )
+    return threads
+
+
+def test_embeds_on_a_worker_while_extracting_the_intent(pipeline):
+    result = service.retrieve_for_message(
+        PostMessageRequest(message="q"), NoopTrace("test")
+    )
+
+    assert result == [0.0]
+    assert pipeline["embed"].startswith("pipeline")
+    assert pipeline["extract_intent"] == threading.current_thread().name
+
+
+def test_embeds_inline_when_every_worker_is_busy(pipeline, monkeypatch):
+    monkeypatch.setattr(service, "idle_workers", threading.BoundedSemaphore(1))
+    service.idle_workers.acquire()
+
+    result = service.retrieve_for_message(
+        PostMessageRequest(message="q"), NoopTrace("test")
+    )
+
+    assert result == [0.0]
+    assert pipeline["embed"] == threading.current_thread().name
@@ -0,0 +1,46 @@
+import time
+from messages import service_batch
+from messages.model import (
+    BatchMessageResult,
+    PostMessageRequest,
+    PostMessagesBatchRequest,
+)
+from messages.service_batch import BATCH_TIMEOUT_ERROR, answer_messages
+
+
+def test_slow_answers_time_out(monkeypatch):
+    def retrieve_for_messages(messages, pool, trace):
+        return [None] * len(messages)
+
+    def answer_retrieved(body, retrieved, deadline, trace):
+        if body.message == "slow":
+            time.sleep(1)
+        return BatchMessageResult(response=body.message)
+
+    monkeypatch.setattr(service_batch, "retrieve_for_messages", retrieve_for_messages)
+    monkeypatch.setattr(service_batch, "answer_retrieved", answer_retrieved)
+    monkeypatch.setattr(service_batch, "BATCH_TIMEOUT_SECONDS", 0.2)
+    body = PostMessagesBatchRequest(
+        messages=[PostMessageRequest(message=m) for m in ("fast", "slow")]
+    )
+
+    start = time.monotonic()
+    response = answer_messages(body)
+
+    assert time.monotonic() - start < 0.5
+    assert response.results[0].response == "fast"
+    assert response.results[1].error == BATCH_TIMEOUT_ERROR
+
+
+def test_answers_are_not_started_after_the_deadline(monkeypatch):
+    def generate_answer_for(body, result, trace):
+        return body.message
+
+    monkeypatch.setattr(service_batch, "generate_answer_for", generate_answer_for)
+    body = PostMessageRequest(message="question")
+
+    late = service_batch.answer_retrieved(body, None, time.monotonic() - 1, None)
+    on_time = service_batch.answer_retrieved(body, None, time.monotonic() + 1, None)
+
+    assert late.error == BATCH_TIMEOUT_ERROR
+    assert on_time.response == "question"
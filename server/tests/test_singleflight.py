@@ -0,0 +1,81 @@
+import time
+import pytest
+from botocore.exceptions import ClientError
+from core import singleflight
+from core.singleflight import DynamoDBSingleFlight
+
+
+class FakeTable:
+    """
+    The conditional put and the reads DynamoDBSingleFlight makes.
+    """
+
+    def __init__(self):
+        self.items: dict[str, dict] = {}
+
+    def put_item(self, Item, ConditionExpression=None, **kwargs):
+        existing = self.items.get(Item["key"])
+        if (
+            ConditionExpression is not None
+            and existing is not None
+            and existing["expires_at"] >= kwargs["ExpressionAttributeValues"][":now"]
+        ):
+            raise ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"
+            )
+        self.items[Item["key"]] = Item
+
+    def get_item(self, Key):
+        item = self.items.get(Key["key"])
+        return {"Item": item} if item is not None else {}
+
+    def delete_item(self, Key):
+        self.items.pop(Key["key"], None)
+
+
+def create(monkeypatch, **kwargs) -> tuple[DynamoDBSingleFlight, FakeTable]:
+    table = FakeTable()
+    monkeypatch.setattr(singleflight, "dynamodb_table", lambda name: table)
+    return DynamoDBSingleFlight("table", poll_interval_seconds=0.01, **kwargs), table
+
+
+def test_defaults_stay_below_the_gateway_timeout(monkeypatch):
+    flight, _ = create(monkeypatch)
+
+    assert flight.lock_ttl_seconds < 29
+    assert flight.max_wait_seconds < flight.lock_ttl_seconds
+
+
+def test_leader_result_is_shared(monkeypatch):
+    flight, _ = create(monkeypatch)
+
+    assert flight.do("question", lambda: "answer") == "answer"
+    assert flight.do("question", lambda: "other") == "answer"
+
+
+def test_follower_of_a_dead_leader_answers_itself(monkeypatch):
+    flight, table = create(monkeypatch, max_wait_seconds=0.1)
+    # The lock of a leader that was killed before it could release it
+    table.items["singleflight:question"] = {
+        "key": "singleflight:question",
+        "status": "running",
+        "expires_at": int(time.time() + 25),
+    }
+
+    start = time.time()
+    assert flight.do("question", lambda: "answer") == "answer"
+    assert time.time() - start < 1
+
+
+def test_leader_error_survives_a_failed_release(monkeypatch):
+    flight, table = create(monkeypatch)
+
+    def delete_item(Key):
+        raise ClientError({"Error": {"Code": "ThrottlingException"}}, "DeleteItem")
+
+    def fail():
+        raise ValueError("answer failed")
+
+    monkeypatch.setattr(table, "delete_item", delete_item)
+    with pytest.raises(ValueError, match="answer failed"):
+        flight.do("question", fail)
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from core import telemetry
+from core.telemetry import NoopTrace, Trace, add, record
+
+
+class Metrics:
+    def __init__(self):
+        self.values: dict[str, float] = {}
+        self.flushed = 0
+
+    def add_metric(self, name, unit, value):
+        self.values[name] = value
+
+    def flush_metrics(self):
+        self.flushed += 1
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    """
+    The trace events logged, and the metrics emitted, by finished traces.
+    """
+    logged = []
+    metrics = Metrics()
+    monkeypatch.setattr(telemetry.logger, "info", logged.append)
+    monkeypatch.setattr(telemetry, "metrics", metrics)
+    monkeypatch.setattr(telemetry, "_listeners", [])
+    return logged, metrics
+
+
+def embed():
+    add(prompt_tokens=3)
+    add(prompt_tokens=4, cache_misses=1)
+    return [0.0]
+
+
+def test_stages_record_on_their_own_span(emitted):
+    logged, metrics = emitted
+    trace = Trace("message")
+
+    trace.run("embed", embed)
+    with trace.span("retrieve_contexts"):
+        record(hits=5, backend="local")
+    record(hits=1)
+    trace.record(cached=False)
+    trace.finish()
+
+    (event,) = logged
+    assert event["event"] == "trace"
+    assert event["cached"] is False
+    embed_span, retrieve_span = event["spans"]
+    assert embed_span["name"] == "embed"
+    assert embed_span["prompt_tokens"] == 7
+    assert embed_span["cache_misses"] == 1
+    assert retrieve_span["hits"] == 5
+    assert retrieve_span["duration_ms"] >= 0
+
+    assert metrics.values["embed_prompt_tokens"] == 7
+    assert metrics.values["retrieve_contexts_hits"] == 5
+    assert "message_duration" in metrics.values
+    # Only numbers become metrics
+    assert "retrieve_contexts_backend" not in metrics.values
+    assert "message_cached" not in metrics.values
+    assert metrics.flushed == 1
+
+
+def test_stages_on_worker_threads(emitted):
+    trace = Trace("message")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(trace.run, name, embed) for name in ("a", "b")]
+        [future.result() for future in futures]
+
+    assert sorted(span.name for span in trace.spans) == ["a", "b"]
+    assert [span.attributes["prompt_tokens"] for span in trace.spans] == [7, 7]
+
+
+def test_streams_count_on_their_span(emitted):
+    trace = Trace("message")
+    span = trace.start_span("generate")
+
+    def stream():
+        for token in ("a", "b", "c"):
+            add(completion_tokens=1)
+            yield token
+
+    # Resumed from another thread, as the streaming response is
+    chunks = []
+    thread = threading.Thread(target=lambda: chunks.extend(span.iterate(stream())))
+    thread.start()
+    thread.join()
+    span.end()
+
+    assert chunks == ["a", "b", "c"]
+    assert span.attributes == {"completion_tokens": 3}
+
+
+def test_concurrent_tasks_get_their_own_span(emitted):
+    trace = Trace("message")
+
+    async def stage(tokens):
+        await asyncio.sleep(0)
+        add(prompt_tokens=tokens)
+
+    async def main():
+        await asyncio.gather(
+            trace.run_async("intent", stage, 1), trace.run_async("embed", stage, 2)
+        )
+
+    asyncio.run(main())
+
+    assert {span.name: span.attributes for span in trace.spans} == {
+        "intent": {"prompt_tokens": 1},
+        "embed": {"prompt_tokens": 2},
+    }
+
+
+def test_listeners_get_every_trace(emitted):
+    traces = []
+    telemetry.add_listener(traces.append)
+
+    trace = Trace("message")
+    trace.finish()
+
+    assert traces == [trace]
+    assert trace.total_ms is not None
+
+
+def test_noop_trace(emitted):
+    logged, metrics = emitted
+    trace = NoopTrace("message")
+
+    assert trace.run("embed", embed) == [0.0]
+    trace.finish()
+
+    assert trace.spans == []
+    assert logged == []
+    assert metrics.values == {}